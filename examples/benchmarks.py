@@ -0,0 +1,148 @@
+import asyncio
+import os
+import struct
+import sys
+import time
+import tracemalloc
+
+import bitcoin.core
+from bitcoin.core.script import CScript, OP_DUP, OP_HASH160, \
+    OP_EQUALVERIFY, OP_CHECKSIG
+
+import pylibbitcoin.client
+import pylibbitcoin.header_store
+import pylibbitcoin.scan
+import pylibbitcoin.validation
+import pylibbitcoin.watch
+
+
+def synthetic_block(transactions, outputs_per_transaction=2):
+    def p2pkh(hash160):
+        return CScript(
+            [OP_DUP, OP_HASH160, hash160, OP_EQUALVERIFY, OP_CHECKSIG])
+
+    vtx = []
+    for _ in range(transactions):
+        vtx.append(bitcoin.core.CTransaction(
+            [bitcoin.core.CTxIn(
+                bitcoin.core.COutPoint(os.urandom(32), 0),
+                CScript([os.urandom(72), os.urandom(33)]))],
+            [bitcoin.core.CTxOut(1000, p2pkh(os.urandom(20)))
+             for _ in range(outputs_per_transaction)]))
+    return bitcoin.core.CBlock(vtx=vtx).serialize()
+
+
+def watch():
+    """Transactions per second scanned by a WatchSet."""
+    watched = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    block = synthetic_block(2_000)
+
+    for label, watch_set in (
+            ("set", pylibbitcoin.watch.WatchSet()),
+            ("bloom+set", pylibbitcoin.watch.WatchSet(
+                prefilter=pylibbitcoin.watch.BloomFilter(watched * 10)))):
+        for _ in range(watched):
+            watch_set.add_hash160(os.urandom(20))
+
+        rounds = 10
+        start = time.perf_counter()
+        for _ in range(rounds):
+            watch_set.scan_block(block)
+        elapsed = time.perf_counter() - start
+        print("%s, %d watched: %.0f tx/s" % (
+            label, watched, rounds * 2_000 / elapsed))
+
+
+def headers():
+    """Validation of the headers in a HeaderStore file (e.g. one synced
+    from mainnet), given as the second argument."""
+    if len(sys.argv) < 3:
+        sys.exit("Usage: %s headers <header store path>" % sys.argv[0])
+    store = pylibbitcoin.header_store.HeaderStore(sys.argv[2])
+    validator = pylibbitcoin.validation.HeaderValidator()
+
+    start = time.perf_counter()
+    error_code, height = validator.validate_store(store)
+    elapsed = time.perf_counter() - start
+    print("%d headers in %.1fs: %s" % (
+        len(store), elapsed,
+        "valid" if error_code is None else "%s at %d" % (error_code, height)))
+    store.close()
+
+
+def blocks():
+    """Time per MB and peak Python memory of receiving blocks from the block
+    stream in "header" mode, through a Client and through a subscriber which
+    copies the frames."""
+    import zmq
+    import zmq.asyncio
+
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    block = synthetic_block(4_000)
+    megabytes = count * len(block) / 1e6
+    context = zmq.asyncio.Context()
+    loop = asyncio.get_event_loop()
+
+    async def publish(endpoint):
+        publisher = context.socket(zmq.XPUB)
+        publisher.sndhwm = 0
+        publisher.bind(endpoint)
+        await publisher.recv()  # the subscription
+        for height in range(count):
+            await publisher.send_multipart(
+                [struct.pack("<H", height), struct.pack("<I", height), block])
+        publisher.close(linger=-1)
+
+    async def through_client():
+        endpoint = "inproc://benchmark-client"
+        publishing = asyncio.ensure_future(publish(endpoint))
+        settings = pylibbitcoin.client.ClientSettings(context=context)
+        client = pylibbitcoin.client.Client(
+            None, {"query": "inproc://unused", "block": endpoint}, settings)
+        queue = await client.subscribe_to_blocks("header")
+        for _ in range(count):
+            await queue.get()
+        await publishing
+        await client.stop()
+
+    async def copying():
+        endpoint = "inproc://benchmark-copying"
+        subscriber = context.socket(zmq.SUB)
+        subscriber.connect(endpoint)
+        subscriber.subscribe(b"")
+        publishing = asyncio.ensure_future(publish(endpoint))
+        for _ in range(count):
+            frame = await subscriber.recv_multipart()
+            pylibbitcoin.client.BLOCK_DECODERS["header"](frame[2])
+        await publishing
+        subscriber.close()
+
+    for label, receive in (("copying", copying), ("client", through_client)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        loop.run_until_complete(receive())
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("%s, %d blocks of %.1f MB: %.2f ms/MB, peak %.1f MB" % (
+            label, count, len(block) / 1e6, elapsed * 1e3 / megabytes,
+            peak / 1e6))
+    context.term()
+
+
+commands = {
+    "blocks": blocks,
+    "headers": headers,
+    "watch": watch,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        sys.exit("Usage: %s %s" % (sys.argv[0], "|".join(commands)))
+
+    commands[sys.argv[1]]()
+
+
+if __name__ == '__main__':
+    main()
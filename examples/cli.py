@@ -1,7 +1,6 @@
 import asyncio
 import sys
 import binascii
-import bitcoin.core
 import pylibbitcoin.client
 
 
@@ -56,6 +55,8 @@ def unsubscribe_address(client):
 
 
 def broadcast(client):
+    import bitcoin.core
+
     # Grab a raw block from https://blockchain.info/block/000000000000000000a7b4999c723ed9f308425708577c76827ade51062e135a?format=hex  # noqa: E501
     # This might seem odd but this is a sanity check a client should probably do.  # noqa: E501
     block = bitcoin.core.CBlock.deserialize(binascii.unhexlify(sys.argv[2]))
@@ -0,0 +1,127 @@
+import asyncio
+import copy
+import functools
+import inspect
+import threading
+
+import pylibbitcoin.client
+
+
+class BlockingClient:
+    """
+    A synchronous facade over one Client, usable from any number of threads.
+
+    The Client (and its sockets) lives on an event loop running in a
+    background thread; calls from other threads are handed to that loop with
+    `asyncio.run_coroutine_threadsafe()` and block until the result is in.
+    All threads share the same sockets, so requests from different threads
+    are multiplexed over them just as concurrent coroutines would be.
+
+    Every coroutine method of Client is available with the same arguments:
+
+        client = BlockingClient("mainnet.libbitcoin.net", {"query": 9091})
+        error_code, height = client.last_height()
+
+    Async iterator methods, like `history3_stream()`, return a plain
+    iterator whose every step waits for the background loop.
+
+    Queues returned by the subscription methods belong to the background
+    loop, read them with `get()`.
+    """
+
+    def __init__(self, hostname, ports, settings=None, timeout=None):
+        """`timeout` bounds how long a call waits for the background loop, on
+        top of the request timeout in `settings`."""
+        self._timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="pylibbitcoin", daemon=True)
+        self._thread.start()
+
+        # The caller's settings may be in use with another loop.
+        settings = copy.copy(settings) if settings is not None \
+            else pylibbitcoin.client.ClientSettings()
+        settings.loop = self._loop
+
+        async def create():
+            return pylibbitcoin.client.Client(hostname, ports, settings)
+        self._client = self.__run(create())
+
+    @property
+    def client(self):
+        """The underlying Client, only to be used on the background loop."""
+        return self._client
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        if inspect.isasyncgenfunction(method):
+            @functools.wraps(method)
+            def iterate(*args, **kwargs):
+                return self.__iterate(method(*args, **kwargs))
+            return iterate
+        if not asyncio.iscoroutinefunction(method):
+            return method
+
+        @functools.wraps(method)
+        def call(*args, **kwargs):
+            return self.__run(method(*args, **kwargs))
+        return call
+
+    def submit(self, name, *args, **kwargs):
+        """Starts a call without waiting for it. Returns a
+        concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(
+            getattr(self._client, name)(*args, **kwargs), self._loop)
+
+    def batch(self, calls):
+        """Makes several calls concurrently and waits for all of them.
+        `calls` are (method name, *arguments) tuples; the results come back
+        in the same order."""
+        async def gather():
+            return await asyncio.gather(*[
+                getattr(self._client, name)(*arguments)
+                for name, *arguments in calls
+            ])
+        return self.__run(gather())
+
+    def get(self, queue):
+        """Waits for the next item of a queue returned by a subscription."""
+        return self.__run(queue.get())
+
+    def close(self):
+        """Stops the Client and the background loop. Returns what
+        `Client.stop()` returns."""
+        pending = self.__run(self._client.stop())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        return pending
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iterate(self, generator):
+        async def next_item():
+            return await generator.__anext__()
+
+        try:
+            while True:
+                try:
+                    item = self.__run(next_item())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            if not self._loop.is_closed():
+                self.__run(generator.aclose())
+
+    def __run(self, coroutine):
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError(
+                "BlockingClient can't be called from its own event loop")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop) \
+            .result(self._timeout)
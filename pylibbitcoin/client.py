@@ -3,16 +3,25 @@ import struct
 import asyncio
 import functools
 import hashlib
+import logging
 from binascii import unhexlify
-import zmq
-import zmq.asyncio
-import bitcoin.core.serialize
-import bitcoin.base58
-import anytree
 import pylibbitcoin.error_code
+import pylibbitcoin.heartbeat
+import pylibbitcoin.metrics
+import pylibbitcoin.primitives
+import pylibbitcoin.scan
+import pylibbitcoin.stream
+
+logger = logging.getLogger(__name__)
+
+# anytree, bitcoin (python-bitcoinlib) and zmq are imported where they are
+# used so importing this module stays cheap; short lived scripts only pay for
+# the features they use.
 
 
 def merkle_branch(hash_, tree):
+    import anytree
+
     tree_walker = anytree.PostOrderIter(tree)
     node = next((node for node in tree_walker if node.name == hash_), None)
     if not node:
@@ -23,6 +32,8 @@ def merkle_branch(hash_, tree):
 
 
 def merkle_tree(hashes):
+    import anytree
+
     if len(hashes) == 0:
         return None
 
@@ -58,6 +69,38 @@ def merkle_tree(hashes):
     return leaves[0]
 
 
+def merkle_levels(hashes):
+    """Every level of the merkle tree of `hashes` (in internal byte order),
+    from the hashes themselves up to [root]. Unlike `merkle_tree()` this
+    doesn't need anytree and keeps the levels as plain lists."""
+    if len(hashes) == 0:
+        return []
+
+    levels = [list(hashes)]
+    while len(levels[-1]) > 1:
+        levels.append(_merkle_parents(levels[-1]))
+    return levels
+
+
+def merkle_root(hashes):
+    """The merkle root of `hashes`, None for no hashes."""
+    level = list(hashes)
+    if not level:
+        return None
+    while len(level) > 1:
+        level = _merkle_parents(level)
+    return level[0]
+
+
+def _merkle_parents(level):
+    if len(level) % 2 == 1:
+        level = level + level[-1:]
+    return [
+        pylibbitcoin.scan.double_sha256(level[i] + level[i + 1])
+        for i in range(0, len(level), 2)
+    ]
+
+
 def checksum(hash_, index):
     """
     This method takes a transaction hash and an index and returns a checksum.
@@ -66,10 +109,14 @@ def checksum(hash_, index):
     reversed hash. Combined with the last 15 bits of the 4 byte index.
     """
 
+    return point_checksum(bytes.fromhex(hash_)[::-1], index)
+
+
+def point_checksum(hash_bytes, index):
+    """ `checksum` for a hash in internal byte order."""
     mask = 0xffffffffffff8000
     magic_start_position = 12
 
-    hash_bytes = bytes.fromhex(hash_)[::-1]
     last_20_bytes = hash_bytes[magic_start_position:]
 
     assert len(hash_bytes) == 32
@@ -89,6 +136,22 @@ def to_little_endian(i):
     return struct.pack("<I", i)
 
 
+def to_bytes(data):
+    """Accepts hex strings as well as bytes-like objects."""
+    if isinstance(data, str):
+        return unhexlify(data)
+    if isinstance(data, bytes):
+        return data
+    return bytes(data)
+
+
+def server_url(hostname, port):
+    """`port` can also be a complete endpoint, like "ipc:///tmp/query"."""
+    if isinstance(port, str) and "://" in port:
+        return port
+    return "tcp://" + hostname + ":" + str(port)
+
+
 def create_random_id():
     max_uint32 = 4294967295
     return random.randint(0, max_uint32)
@@ -109,34 +172,194 @@ def unpack_table(row_fmt, data):
 
 
 def pack_block_index(index):
-    if isinstance(index, str):
-        index = unhexlify(index)
+    """A height, or a block hash in any form `primitives.internal_bytes`
+    takes, as the wire bytes of a block query."""
+    if isinstance(index, int):
+        return struct.pack('<I', index)
+    elif isinstance(index, (pylibbitcoin.primitives.Hash32, str, bytes,
+                            bytearray, memoryview)):
+        index = pylibbitcoin.primitives.internal_bytes(index)
         assert len(index) == 32
         return index
-    elif isinstance(index, int):
-        return struct.pack('<I', index)
     else:
         raise ValueError("Unknown index type, shoud be an int or a byte array")
 
 
+def _pop_first(waiting_by_key, key, waiting):
+    """Pops the oldest of the `waiting` list kept at `key`."""
+    first = waiting.pop(0)
+    if not waiting:
+        del waiting_by_key[key]
+    return first
+
+
 def decode_address(address):
     """ Turns a base58check encoded address into a plain p2sh/p2pkh address"""
+    import bitcoin.base58
+
     decoded_address = bitcoin.base58.decode(address)
     # pick the decoded bytes apart:
     # version_byte, data, checksum = decoded_address[0:1], decoded_address[1:-4], decoded_address[-4:]  # noqa: E501
     return decoded_address[1:-4]
 
 
+def decode_address_notification(data):
+    """Turns the payload of an address notification into a
+    (sequence, height, transaction hash) tuple."""
+    sequence, height, tx_hash = struct.unpack_from("<HI32s", data)
+    return sequence, height, tx_hash
+
+
+def correlate(points):
+    """Pairs the spends in history3 points with the receives they spend."""
+    transfers, checksum_to_index = _find_receives(points)
+    transfers = _correlate_spends_to_receives(
+        points,
+        transfers,
+        checksum_to_index
+    )
+
+    return transfers
+
+
+def _correlate_spends_to_receives(points, transfers, checksum_to_index):
+    for point in points:
+        if point[0] == 0:  # receive
+            continue
+
+        spent = {
+            "hash": point[1].hash,
+            "height": point[2],
+            "index": point[1].n,
+        }
+        if point[3] not in checksum_to_index:
+            transfers.append({
+                "spent": spent
+            })
+        else:
+            transfers[checksum_to_index[point[3]]]["spent"] = spent
+
+    return transfers
+
+
+def _find_receives(points):
+    transfers = []
+    checksum_to_index = {}
+
+    for point in points:
+        if point[0] == 1:  # spent
+            continue
+
+        transfers.append({
+            "received": {
+                "hash": point[1].hash,
+                "height": point[2],
+                "index": point[1].n,
+            },
+            "value": point[3],
+        })
+
+        checksum_to_index[point[4]] = len(transfers) - 1
+
+    return transfers, checksum_to_index
+
+
+def _decode_block(data):
+    import bitcoin.core
+    return bitcoin.core.CBlock.deserialize(data)
+
+
+def _decode_header(data):
+    import bitcoin.core
+    return bitcoin.core.CBlockHeader.deserialize(
+        data[:pylibbitcoin.scan.HEADER_SIZE])
+
+
+def _decode_height(data):
+    return struct.unpack("<I", data)[0]
+
+
+def _decode_outpoint(data):
+    import bitcoin.core
+
+    # An CInPoint is just an other name for COutPoint
+    return bitcoin.core.COutPoint.deserialize(data)
+
+
+def _decode_transaction(data, txid=None):
+    import bitcoin.core
+    return bitcoin.core.CTransaction.deserialize(data)
+
+
+BLOCK_DECODERS = {
+    "block": _decode_block,
+    "raw": bytes,
+    "header": _decode_header,
+    "txids": pylibbitcoin.scan.block_txids,
+}
+
+TRANSACTION_DECODERS = {
+    "transaction": _decode_transaction,
+    "raw": lambda data, txid: bytes(data),
+    "lazy": pylibbitcoin.scan.LazyTransaction,
+}
+
+
+DEFAULT_LANE = "interactive"
+
+# Where the commands go once a "bulk" lane is configured, see
+# `ClientSettings.lanes`.
+DEFAULT_COMMAND_LANES = {
+    b"blockchain.fetch_history3": "bulk",
+    b"blockchain.fetch_transaction": "bulk",
+    b"blockchain.fetch_transaction2": "bulk",
+    b"blockchain.fetch_block_transaction_hashes": "bulk",
+    b"blockchain.fetch_spend": "bulk",
+    b"blockchain.broadcast": "bulk",
+    b"blockchain.validate": "bulk",
+    b"transaction_pool.broadcast": "bulk",
+    b"transaction_pool.validate2": "bulk",
+}
+
+
+# Requests which can safely be sent again after a reconnect.
+IDEMPOTENT_COMMAND_PREFIXES = (
+    b"blockchain.fetch_",
+    b"blockchain.validate",
+    b"transaction_pool.fetch_",
+    b"transaction_pool.validate",
+    b"subscribe.",
+    b"unsubscribe.",
+)
+
+
 class ClientSettings:
 
-    def __init__(self, timeout=2, context=None, loop=None):
+    def __init__(self, timeout=2, context=None, loop=None, header_store=None,
+                 transaction_cache=None, heartbeat_interval=5,
+                 missed_heartbeats=1, heartbeat_grace=0.5, lanes=None,
+                 command_lanes=None, tracer=None, profiler=None,
+                 recorder=None, timeouts=None):
         self._timeout = timeout
         self._context = context
         self._loop = loop
+        self._header_store = header_store
+        self._transaction_cache = transaction_cache
+        self._heartbeat_interval = heartbeat_interval
+        self._missed_heartbeats = missed_heartbeats
+        self._heartbeat_grace = heartbeat_grace
+        self._lanes = lanes or {DEFAULT_LANE: None}
+        self._command_lanes = command_lanes if command_lanes is not None \
+            else dict(DEFAULT_COMMAND_LANES)
+        self._tracer = tracer
+        self._profiler = profiler
+        self._recorder = recorder
+        self._timeouts = timeouts
 
     @property
     def context(self):
         if not self._context:
+            import zmq.asyncio
             ctx = zmq.asyncio.Context()
             ctx.linger = 500  # in milliseconds
             self._context = ctx
@@ -155,6 +378,18 @@ class ClientSettings:
     def timeout(self, timeout):
         self._timeout = timeout
 
+    @property
+    def timeouts(self):
+        """A pylibbitcoin.metrics.AdaptiveTimeouts giving each command a
+        timeout from its observed latency; `timeout` applies to commands it
+        has no timeout for yet. None (the default) uses `timeout` for
+        everything."""
+        return self._timeouts
+
+    @timeouts.setter
+    def timeouts(self, timeouts):
+        self._timeouts = timeouts
+
     @property
     def loop(self):
         if not self._loop:
@@ -166,6 +401,109 @@ class ClientSettings:
     def loop(self, loop):
         self._loop = loop
 
+    @property
+    def header_store(self):
+        """A pylibbitcoin.header_store.HeaderStore to answer header lookups
+        from. Set to None to always ask the server."""
+        return self._header_store
+
+    @header_store.setter
+    def header_store(self, header_store):
+        self._header_store = header_store
+
+    @property
+    def transaction_cache(self):
+        """A pylibbitcoin.transaction_cache.TransactionCache checked before
+        fetching confirmed transactions. Set to None to disable caching."""
+        return self._transaction_cache
+
+    @transaction_cache.setter
+    def transaction_cache(self, transaction_cache):
+        self._transaction_cache = transaction_cache
+
+    @property
+    def heartbeat_interval(self):
+        """The interval in seconds at which the server publishes heartbeats.
+        Only used when the client is given a heartbeat port."""
+        return self._heartbeat_interval
+
+    @heartbeat_interval.setter
+    def heartbeat_interval(self, heartbeat_interval):
+        self._heartbeat_interval = heartbeat_interval
+
+    @property
+    def missed_heartbeats(self):
+        """The number of heartbeat intervals without a heartbeat after which
+        the client reconnects."""
+        return self._missed_heartbeats
+
+    @missed_heartbeats.setter
+    def missed_heartbeats(self, missed_heartbeats):
+        self._missed_heartbeats = missed_heartbeats
+
+    @property
+    def heartbeat_grace(self):
+        """The fraction of a heartbeat interval a heartbeat may be late on
+        top of `missed_heartbeats` before the client reconnects."""
+        return self._heartbeat_grace
+
+    @heartbeat_grace.setter
+    def heartbeat_grace(self, heartbeat_grace):
+        self._heartbeat_grace = heartbeat_grace
+
+    @property
+    def lanes(self):
+        """Request priority classes, name -> maximum number of requests in
+        flight (None for no limit), highest priority first. Each lane gets its
+        own query socket, so requests in one lane don't queue behind the
+        requests of another."""
+        return self._lanes
+
+    @lanes.setter
+    def lanes(self, lanes):
+        self._lanes = lanes
+
+    @property
+    def command_lanes(self):
+        """Command -> lane name. Commands which aren't listed, or whose lane
+        isn't in `lanes`, go to the first lane."""
+        return self._command_lanes
+
+    @command_lanes.setter
+    def command_lanes(self, command_lanes):
+        self._command_lanes = command_lanes
+
+    @property
+    def tracer(self):
+        """A pylibbitcoin.trace.Tracer recording the stages of every request.
+        None (the default) disables tracing."""
+        return self._tracer
+
+    @tracer.setter
+    def tracer(self, tracer):
+        self._tracer = tracer
+
+    @property
+    def profiler(self):
+        """A pylibbitcoin.trace.Profiler sampling the decoding of responses
+        and stream messages. None (the default) disables profiling."""
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        self._profiler = profiler
+
+    @property
+    def recorder(self):
+        """A pylibbitcoin.replay.WireRecorder logging the messages of the
+        sockets created from then on, closed when the client stops. None
+        (the default) disables recording."""
+        return self._recorder
+
+    @recorder.setter
+    def recorder(self, recorder):
+        self._recorder = recorder
+
 
 class Request:
     """
@@ -173,10 +511,13 @@ class Request:
     This is either a simple request/response affair or a subscription.
     """
 
+    __slots__ = ("id_", "command", "data", "future", "queue")
+
     def __init__(self, command):
         """ Use 'create' instead"""
         self.id_ = create_random_id()
         self.command = command
+        self.data = None
         self.future = asyncio.Future()
         self.queue = None
 
@@ -188,6 +529,7 @@ class Request:
         return request
 
     async def send(self, socket, data):
+        self.data = data
         request = [
             self.command,
             to_little_endian(self.id_),
@@ -195,6 +537,19 @@ class Request:
         ]
         await socket.send_multipart(request)
 
+    def is_idempotent(self):
+        return self.command.startswith(IDEMPOTENT_COMMAND_PREFIXES)
+
+    def fail(self, error_code):
+        """Completes the request with `error_code` as if the server answered
+        with it."""
+        if not self.future.done():
+            self.future.set_result(Response([
+                self.command,
+                to_little_endian(self.id_),
+                struct.pack("<I", error_code.value),
+            ]))
+
     def is_subscription(self):
         """ If the request is a subscription then the response to this request
         is a notification (as defined here https://github.com/libbitcoin/libbitcoin-server/wiki/Query-Service#subscribeaddress)"""  # noqa: E501
@@ -208,18 +563,30 @@ class InvalidServerResponseException(Exception):
     pass
 
 
+class HistoryError(Exception):
+    """Raised by `Client.history3_stream()`, `error_code` is the error
+    returned by the server."""
+
+    def __init__(self, error_code):
+        super().__init__(error_code)
+        self.error_code = error_code
+
+
 class Response:
+    """A response parsed from the frames of `recv_multipart()`, which can be
+    zmq.Frame objects; `data` is a memoryview into the last frame."""
 
     def __init__(self, frame):
         if len(frame) != 3:
             raise InvalidServerResponseException(
                 "Length of the frame was not 3: %d" % len(frame))
 
-        self.command = frame[0]
+        self.command = bytes(frame[0])
         self.request_id = struct.unpack("<I", frame[1])[0]
-        error_code = struct.unpack("<I", frame[2][:4])[0]
+        payload = memoryview(frame[2])
+        error_code = struct.unpack_from("<I", payload)[0]
         self.error_code = pylibbitcoin.error_code.make_error_code(error_code)
-        self.data = frame[2][4:]
+        self.data = payload[4:]
 
     def is_bound_for_queue(self):
         return len(self.data) > 0
@@ -236,9 +603,10 @@ class RequestCollection:
     to them.
     """
 
-    def __init__(self, socket, loop):
+    def __init__(self, socket, loop, tracer=None):
         self._socket = socket
         self._requests = {}
+        self._tracer = tracer
 
         self._task = asyncio.ensure_future(self._run(), loop=loop)
 
@@ -259,12 +627,23 @@ class RequestCollection:
             return len(self._requests)
 
     async def _receive(self):
-        frame = await self._socket.recv_multipart()
+        frame = await self._socket.recv_multipart(copy=False)
+        tracer = self._tracer
+        received = tracer.clock() if tracer is not None else None
         response = Response(frame)
 
         if response.request_id in self._requests:
+            if tracer is not None:
+                request = self._requests[response.request_id]
+                tracer.record(request, "received", received)
+                self._handle_response(response)
+                tracer.record(request, "matched")
+                return
             self._handle_response(response)
-        else:
+        elif response.error_code is not \
+                pylibbitcoin.error_code.ErrorCode.service_stopped:
+            # A `service_stopped` for an unknown request is the final message
+            # of a subscription we already dropped.
             print(
                 "Error: unhandled response %s:%s." %
                 (response.command, response.request_id))
@@ -274,9 +653,14 @@ class RequestCollection:
 
         if request.is_subscription():
             if response.is_bound_for_queue():
-                # TODO decode the data into something usable
-                request.queue.put_nowait(response.data)
-            else:
+                request.queue.put_nowait(
+                    decode_address_notification(response.data))
+            elif response.error_code is \
+                    pylibbitcoin.error_code.ErrorCode.service_stopped:
+                # The server ended the subscription.
+                self.delete_request(request)
+                request.fail(response.error_code)
+            elif not request.future.done():
                 request.future.set_result(response)
         else:
             self.delete_request(request)
@@ -287,7 +671,25 @@ class RequestCollection:
         self._requests[request.id_] = request
 
     def delete_request(self, request):
-        del self._requests[request.id_]
+        self._requests.pop(request.id_, None)
+
+    def requests(self):
+        return list(self._requests.values())
+
+
+class Lane:
+    """A request priority class: its own query socket and collection, an
+    in-flight budget and the latencies of its requests."""
+
+    __slots__ = ("name", "socket", "collection", "budget", "latency")
+
+    def __init__(self, name, socket, collection, in_flight=None):
+        self.name = name
+        self.socket = socket
+        self.collection = collection
+        self.budget = None if in_flight is None \
+            else asyncio.Semaphore(in_flight)
+        self.latency = pylibbitcoin.metrics.LatencyWindow()
 
 
 class Client:
@@ -301,56 +703,210 @@ class Client:
         self._hostname = hostname
         self._ports = ports
         self._settings = settings
-        self._query_socket = self._create_query_socket()
+        self._lanes = {}
+        for name, in_flight in self._settings.lanes.items():
+            socket = self._create_query_socket()
+            self._lanes[name] = Lane(
+                name,
+                socket,
+                RequestCollection(
+                    socket, self._settings.loop, self._settings.tracer),
+                in_flight)
+        self._default_lane = next(iter(self._lanes.values()))
         self._block_socket = self._create_block_socket()
-        self._request_collection = RequestCollection(
-            self._query_socket,
-            self._settings.loop)
+        self._transaction_socket = None
+        self._address_subscriptions = {}
+        # Each stream has one reader, copying its messages to every queue.
+        self._block_queues = []  # (queue, decoder)
+        self._block_sequence = pylibbitcoin.stream.SequenceTracker()
+        self._transaction_queues = []  # (queue, decoder)
+        self._transaction_sequence = pylibbitcoin.stream.SequenceTracker()
+        self._transaction_seen = None
+        self._listeners = {}  # service -> reader task
+        # Block and transaction messages dropped as malformed.
+        self.bad_messages = 0
+
+        self._heartbeat_socket = None
+        self._heartbeat = None
+        if "heartbeat" in ports:
+            self._heartbeat_socket = \
+                self._create_subscriber_socket("heartbeat")
+            self._heartbeat = pylibbitcoin.heartbeat.HeartbeatMonitor(
+                self._heartbeat_socket,
+                self._settings.heartbeat_interval,
+                self._settings.missed_heartbeats
+                + self._settings.heartbeat_grace,
+                self._reconnect,
+                self._settings.loop)
 
     async def stop(self):
-        self._query_socket.close()
+        if self._heartbeat is not None:
+            await self._heartbeat.stop()
+            self._heartbeat_socket.close()
+        for task in self._listeners.values():
+            task.cancel()
         self._block_socket.close()
-        return await self._request_collection.stop()
+        if self._transaction_socket is not None:
+            self._transaction_socket.close()
+        dropped = 0
+        for lane in self._lanes.values():
+            lane.socket.close()
+            dropped += await lane.collection.stop()
+        if self._settings.recorder is not None:
+            self._settings.recorder.close()
+        return dropped
+
+    @property
+    def _query_socket(self):
+        return self._default_lane.socket
+
+    @property
+    def _request_collection(self):
+        return self._default_lane.collection
+
+    def lane_metrics(self):
+        """Lane name -> latency snapshot ("count", "p50", "p99" and "max", in
+        seconds) of its recent requests."""
+        return {
+            name: lane.latency.snapshot()
+            for name, lane in self._lanes.items()
+        }
+
+    async def _reconnect(self):
+        """Rebuilds the sockets after the server was found dead. Pending
+        requests are sent again when that is safe (this includes address
+        subscriptions), the others fail right away."""
+        for task in self._listeners.values():
+            task.cancel()
+        self._block_socket.close()
+        self._block_socket = self._create_block_socket()
+        if self._transaction_socket is not None:
+            self._transaction_socket.close()
+            self._transaction_socket = self._create_subscriber_socket("tx")
+        if self._heartbeat is not None:
+            socket = self._heartbeat_socket
+            self._heartbeat_socket = \
+                self._create_subscriber_socket("heartbeat")
+            self._heartbeat.listen_on(self._heartbeat_socket)
+            socket.close()
+        self._listeners = {
+            service: self.__start_listener(service)
+            for service in self._listeners
+        }
+
+        for lane in self._lanes.values():
+            requests = lane.collection.requests()
+            await lane.collection.stop()
+            lane.socket.close()
+            lane.socket = self._create_query_socket()
+            lane.collection = RequestCollection(
+                lane.socket, self._settings.loop, self._settings.tracer)
+
+            for request in requests:
+                if request.is_idempotent():
+                    lane.collection.add_request(request)
+                    await request.send(lane.socket, request.data)
+                else:
+                    request.fail(
+                        pylibbitcoin.error_code.ErrorCode.network_unreachable)
 
     def _create_block_socket(self):
+        return self._create_subscriber_socket("block")
+
+    def _create_subscriber_socket(self, service):
+        import zmq
         socket = self._settings.context.socket(
             zmq.SUB, io_loop=self._settings.loop)
-        socket.connect(self.__server_url(self._hostname, self._ports["block"]))
+        socket.connect(server_url(self._hostname, self._ports[service]))
         socket.setsockopt_string(zmq.SUBSCRIBE, '')
-        return socket
+        return self.__record(socket, service)
 
     def _create_query_socket(self):
+        import zmq
         socket = self._settings.context.socket(
             zmq.DEALER, io_loop=self._settings.loop)
-        socket.connect(self.__server_url(self._hostname, self._ports["query"]))
-        return socket
+        socket.connect(server_url(self._hostname, self._ports["query"]))
+        return self.__record(socket, "query")
+
+    def __record(self, socket, service):
+        if self._settings.recorder is None:
+            return socket
+        return self._settings.recorder.wrap(socket, service)
+
+    async def _simple_request(self, command, data, decode=None):
+        """Sends a request and waits for its response. With `decode`, the
+        data of a successful response is returned decoded, and None is
+        returned on failure. Decoders are given a memoryview of the received
+        frame; without one the data is returned as bytes."""
+        budget = self._lane(command).budget
+        if budget is None:
+            request = await self._request(command, data)
+            error_code, data = await self._wait_for_response(request)
+        else:
+            async with budget:
+                request = await self._request(command, data)
+                error_code, data = await self._wait_for_response(request)
 
-    async def _subscription_request(self, command, data):
-        request = await self._request(command, data)
-        request.queue = asyncio.Queue(loop=self._settings._loop)
-        error_code, _ = await self._wait_for_response(request)
-        return error_code, request.queue
+        if decode is None:
+            return error_code, data if data is None else bytes(data)
+        if error_code:
+            return error_code, None
+
+        data = self._decode(decode, data)
+        if self._settings.tracer is not None:
+            self._settings.tracer.record(request, "decoded")
+        return error_code, data
 
-    async def _simple_request(self, command, data):
-        return await self._wait_for_response(
-            await self._request(command, data))
+    def _decode(self, decode, *arguments):
+        profiler = self._settings.profiler
+        if profiler is None:
+            return decode(*arguments)
+        return profiler.call(decode, *arguments)
 
     async def _request(self, command, data):
         """Make a generic request. Both options are byte objects specified like
         b"blockchain.fetch_block_header" as an example."""
-        request = await Request.create(self._query_socket, command, data)
-        self._request_collection.add_request(request)
+        lane = self._lane(command)
+        tracer = self._settings.tracer
+        if tracer is None:
+            request = await Request.create(lane.socket, command, data)
+        else:
+            created = tracer.clock()
+            request = await Request.create(lane.socket, command, data)
+            tracer.record(request, "created", created)
+            tracer.record(request, "sent")
+        lane.collection.add_request(request)
 
         return request
 
+    def _lane(self, command):
+        return self._lanes.get(
+            self._settings.command_lanes.get(command), self._default_lane)
+
     async def _wait_for_response(self, request):
+        lane = self._lane(request.command)
+        timeouts = self._settings.timeouts
+        timeout = self._settings.timeout if timeouts is None \
+            else timeouts.timeout(request.command, self._settings.timeout)
+        start = self._settings.loop.time()
         try:
-            response = await asyncio.wait_for(
-                request.future,
-                self._settings.timeout)
+            response = await asyncio.wait_for(request.future, timeout)
         except asyncio.TimeoutError:
-            self._request_collection.delete_request(request)
+            lane.collection.delete_request(request)
+            # Counted as taking the timeout, so a timeout that has become
+            # too short grows again.
+            if timeouts is not None:
+                timeouts.record(request.command, timeout)
             return pylibbitcoin.error_code.ErrorCode.channel_timeout, None
+        finally:
+            elapsed = self._settings.loop.time() - start
+            lane.latency.record(elapsed)
+
+        if timeouts is not None:
+            timeouts.record(request.command, elapsed)
+
+        if self._settings.tracer is not None:
+            self._settings.tracer.record(request, "delivered")
 
         assert response.command == request.command
         assert response.request_id == request.id_
@@ -359,141 +915,153 @@ class Client:
     async def last_height(self):
         """Fetches the height of the last block in our blockchain."""
         command = b"blockchain.fetch_last_height"
-        error_code, data = await self._simple_request(command, b"")
-        if error_code:
-            return error_code, None
-        # Deserialize data
-        height = struct.unpack("<I", data)[0]
-        return error_code, height
+        return await self._simple_request(command, b"", _decode_height)
+
+    async def block_header(self, index, use_store=True):
+        """Fetches the block header by height or integer index.
+        `use_store=False` asks the server even when the header store has the
+        header."""
+        raw_header = self.__stored_header(index) if use_store else None
+        if raw_header is not None:
+            return None, _decode_header(raw_header)
 
-    async def block_header(self, index):
-        """Fetches the block header by height or integer index."""
         command = b"blockchain.fetch_block_header"
         data = pack_block_index(index)
-        error_code, data = await self._simple_request(command, data)
-        if error_code:
-            return error_code, None
-        return error_code, bitcoin.core.CBlockHeader.deserialize(data)
+        return await self._simple_request(command, data, _decode_header)
 
     async def block_transaction_hashes(self, index):
         command = b"blockchain.fetch_block_transaction_hashes"
         data = pack_block_index(index)
-        error_code, data = await self._simple_request(command, data)
-        if error_code:
-            return error_code, None
-        data = unpack_table("32s", data)
-        return error_code, data
+        return await self._simple_request(
+            command, data, functools.partial(unpack_table, "32s"))
 
     async def block_height(self, hash_):
+        hash_ = pylibbitcoin.primitives.internal_bytes(hash_)
+        store = self._settings.header_store
+        if store is not None:
+            height = store.height_of(hash_)
+            if height is not None:
+                return None, height
+
         command = b"blockchain.fetch_block_height"
-        error_code, data = await self._simple_request(
-            command, bytes.fromhex(hash_)[::-1])
-        if error_code:
-            return error_code, None
-        data = struct.unpack("<I", data)[0]
-        return error_code, data
+        return await self._simple_request(command, hash_, _decode_height)
 
     async def transaction(self, hash_):
         command = b"blockchain.fetch_transaction"
-        error_code, data = await self._simple_request(
-            command, bytes.fromhex(hash_)[::-1])
-        if error_code:
-            return error_code, None
-
-        transaction = bitcoin.core.CTransaction.deserialize(data)
-        return None, transaction
+        return await self.__cached_transaction(command, hash_)
 
     async def transaction_index(self, hash_):
         """Fetch the block height that contains a transaction and its index
         within that block."""
         command = b"blockchain.fetch_transaction_index"
-        error_code, data = await self._simple_request(
-            command, bytes.fromhex(hash_)[::-1])
-        if error_code:
-            return error_code, None
-
-        data = struct.unpack("<II", data)
-        return None, data
-
-    async def spend(self, output_transaction_hash, index):
-        command = b"blockchain.fetch_spend"
-        error_code, data = await self._simple_request(
+        return await self._simple_request(
             command,
-            bitcoin.core.COutPoint(
-                bytes.fromhex(output_transaction_hash)[::-1],
-                index).serialize()
-        )
-        if error_code:
-            return error_code, None
+            pylibbitcoin.primitives.internal_bytes(hash_),
+            functools.partial(struct.unpack, "<II"))
 
-        # An CInPoint is just an other name for COutPoint
-        point = bitcoin.core.COutPoint.deserialize(data)
-        return None, point
+    async def spend(self, output_transaction_hash, index=None):
+        """`output_transaction_hash` can also be an OutPoint, then `index` is
+        left out."""
+        command = b"blockchain.fetch_spend"
+        if not isinstance(output_transaction_hash,
+                          pylibbitcoin.primitives.OutPoint):
+            output_transaction_hash = pylibbitcoin.primitives.OutPoint(
+                output_transaction_hash, index)
+        return await self._simple_request(
+            command, output_transaction_hash.serialize(), _decode_outpoint)
 
     async def mempool_transaction(self, hash_):
         command = b"transaction_pool.fetch_transaction"
-        error_code, data = await self._simple_request(
-            command, bytes.fromhex(hash_)[::-1])
-        if error_code:
-            return error_code, None
-
-        transaction = bitcoin.core.CTransaction.deserialize(data)
-        return None, transaction
+        return await self._simple_request(
+            command,
+            pylibbitcoin.primitives.internal_bytes(hash_),
+            _decode_transaction)
 
     async def transaction2(self, hash_):
         command = b"blockchain.fetch_transaction2"
-        error_code, data = await self._simple_request(
-            command, bytes.fromhex(hash_)[::-1])
-        if error_code:
-            return error_code, None
-
-        transaction = bitcoin.core.CTransaction.deserialize(data)
-        return None, transaction
+        return await self.__cached_transaction(command, hash_)
 
     async def transaction_pool_transaction2(self, hash_):
         command = b"transaction_pool.fetch_transaction"
-        error_code, data = await self._simple_request(
-            command, bytes.fromhex(hash_)[::-1])
-        if error_code:
-            return error_code, None
-
-        transaction = bitcoin.core.CTransaction.deserialize(data)
-        return None, transaction
+        return await self._simple_request(
+            command,
+            pylibbitcoin.primitives.internal_bytes(hash_),
+            _decode_transaction)
 
     async def subscribe_address(self, address):
-        """Either a p2sh or p2pkh is acceptable"""
-        command = b"subscribe.address"
-        decoded_address = decode_address(address)
-        error_code, queue = await self._subscription_request(
-            command, decoded_address)
+        """Either a p2sh or p2pkh is acceptable.
+
+        The queue, a pylibbitcoin.stream.BoundedQueue, receives (sequence,
+        height, transaction hash) tuples. Subscribing to an address again
+        before unsubscribing fails with `ErrorCode.duplicate`."""
+        queue = pylibbitcoin.stream.BoundedQueue(loop=self._settings._loop)
+        error_code = await self._subscribe_address_hash(
+            decode_address(address), queue)
         if error_code:
             return error_code, None
 
         return None, queue
 
-    # TODO this call should ideally also remove the subscription request from
-    # the RequestCollection.
-    # This call solicits a final call from the server with a
-    # `error::service_stopped` error code.
     async def unsubscribe_address(self, address):
+        return await self._unsubscribe_address_hash(decode_address(address))
+
+    async def _subscribe_address_hash(self, address_hash, queue):
+        """Subscribes to `address_hash`, notifications go to
+        `queue.put_nowait()`. Returns the error code."""
+        if address_hash in self._address_subscriptions:
+            return pylibbitcoin.error_code.ErrorCode.duplicate
+
+        command = b"subscribe.address"
+        request = await self._request(command, address_hash)
+        request.queue = queue
+        # Taken right away, so a concurrent subscription is a duplicate too.
+        self._address_subscriptions[address_hash] = request
+        error_code, _ = await self._wait_for_response(request)
+        if error_code:
+            if self._address_subscriptions.get(address_hash) is request:
+                del self._address_subscriptions[address_hash]
+            self._lane(command).collection.delete_request(request)
+        return error_code
+
+    async def _unsubscribe_address_hash(self, address_hash):
+        # This call solicits a final call from the server with a
+        # `error::service_stopped` error code; the collection ignores it once
+        # the subscription request is removed.
         command = b"unsubscribe.address"
-        decoded_address = decode_address(address)
-        return await self._simple_request(
-            command, decoded_address)
+        error_code, data = await self._simple_request(command, address_hash)
+        if not error_code:
+            request = self._address_subscriptions.pop(address_hash, None)
+            if request is not None:
+                self._lane(request.command).collection.delete_request(request)
+        return error_code, data
 
     async def broadcast(self, block):
         command = b"blockchain.broadcast"
-        return await self._simple_request(command, unhexlify(block))
+        return await self._simple_request(command, to_bytes(block))
 
     async def history3(self, address, height=0):
+        error_code, points = await self._history3_points(address, height)
+        if error_code:
+            return error_code, None
+
+        correlated_points = correlate(points)
+
+        return None, correlated_points
+
+    async def _history3_points(self, address, height=0):
+        """The uncorrelated history3 rows as
+        (kind, outpoint, height, value or checksum, checksum) tuples."""
         command = b"blockchain.fetch_history3"
         decoded_address = decode_address(address)
-        error_code, raw_points = await self._simple_request(
+        error_code, rows = await self._simple_request(
             command,
-            decoded_address + to_little_endian(height))
+            decoded_address + to_little_endian(height),
+            functools.partial(unpack_table, "<B32sIIQ"))
         if error_code:
             return error_code, None
 
+        import bitcoin.core
+
         def make_tuple(row):
             kind, tx_hash, index, height, value = row
             return (
@@ -504,24 +1072,134 @@ class Client:
                 checksum(tx_hash[::-1].hex(), index),
             )
 
-        rows = unpack_table("<B32sIIQ", raw_points)
-        points = [make_tuple(row) for row in rows]
+        return None, [make_tuple(row) for row in rows]
 
-        correlated_points = Client.__correlate(points)
+    async def history3_stream(self, address, height=0, chunk_size=1000):
+        """An async iterator over the history of `address` in lists of at
+        most `chunk_size` correlated records, shaped like the rows of
+        `history3()`.
 
-        return None, correlated_points
+        Records are yielded as soon as a receive is paired with its spend, so
+        only the unpaired rows are held in memory; receives without a spend
+        (and spends without a receive) come last. Spends only carry the
+        checksum of the point they spend, so receives whose checksums
+        collide are paired with their spends in order.
+        Raises a HistoryError if the request fails."""
+        command = b"blockchain.fetch_history3"
+        error_code, data = await self._simple_request(
+            command,
+            decode_address(address) + to_little_endian(height),
+            memoryview)
+        if error_code:
+            raise HistoryError(error_code)
+
+        row = struct.Struct("<B32sIIQ")
+        data = data[:len(data) - len(data) % row.size]
+        receives = {}  # checksum -> receive records waiting for spends
+        spends = {}  # checksum -> spends waiting for receives
+        chunk = []
+
+        for kind, tx_hash, index, height, value in row.iter_unpack(data):
+            point = {"hash": tx_hash, "height": height, "index": index}
+            if kind == 0:  # receive
+                record = {"received": point, "value": value}
+                key = point_checksum(tx_hash, index)
+                waiting = spends.get(key)
+                if waiting is None:
+                    receives.setdefault(key, []).append(record)
+                    continue
+                record["spent"] = _pop_first(spends, key, waiting)
+            else:
+                waiting = receives.get(value)
+                if waiting is None:
+                    spends.setdefault(value, []).append(point)
+                    continue
+                record = _pop_first(receives, value, waiting)
+                record["spent"] = point
+
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+                # Let other tasks run between chunks.
+                await asyncio.sleep(0)
+
+        for records in receives.values():
+            for record in records:
+                chunk.append(record)
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+        for points in spends.values():
+            for spent in points:
+                chunk.append({"spent": spent})
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
 
     async def validate(self, block):
         command = b"blockchain.validate"
-        return await self._simple_request(command, unhexlify(block))
+        return await self._simple_request(command, to_bytes(block))
 
     async def transaction_pool_broadcast(self, block):
         command = b"transaction_pool.broadcast"
-        return await self._simple_request(command, unhexlify(block))
+        return await self._simple_request(command, to_bytes(block))
 
     async def transaction_pool_validate2(self, transaction):
         command = b"transaction_pool.validate2"
-        return await self._simple_request(command, unhexlify(transaction))
+        return await self._simple_request(command, to_bytes(transaction))
+
+    async def transaction_pool_broadcast_many(
+            self, transactions, validate=False, concurrency=100):
+        """Broadcasts serialized transactions, given as bytes-like objects or
+        hex strings, with at most `concurrency` requests in flight.
+
+        Transactions are deduplicated by txid. With `validate` each one is
+        checked with `transaction_pool_validate2()` first and only broadcast
+        if that succeeds.
+        Returns a dictionary of txid (hex) -> error code, None for the
+        transactions which were broadcast."""
+        commands = [b"transaction_pool.broadcast"]
+        if validate:
+            commands.insert(0, b"transaction_pool.validate2")
+        return await self.__bulk_request(commands, transactions, concurrency)
+
+    async def transaction_pool_validate2_many(
+            self, transactions, concurrency=100):
+        """Like `transaction_pool_broadcast_many()` but only validates."""
+        return await self.__bulk_request(
+            [b"transaction_pool.validate2"], transactions, concurrency)
+
+    async def __bulk_request(self, commands, transactions, concurrency):
+        results = {}
+        unique = {}
+        for transaction in transactions:
+            data = to_bytes(transaction)
+            try:
+                end, txid = pylibbitcoin.scan.scan_transaction(data)
+            except (IndexError, struct.error):
+                end, txid = None, pylibbitcoin.scan.double_sha256(data)
+            txid = txid[::-1].hex()
+            if end != len(data):
+                results[txid] = pylibbitcoin.error_code.ErrorCode.bad_stream
+            else:
+                unique.setdefault(txid, data)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(txid, data):
+            async with semaphore:
+                for command in commands:
+                    error_code, _ = await self._simple_request(command, data)
+                    if error_code:
+                        break
+            results[txid] = error_code
+
+        await asyncio.gather(
+            *[send(txid, data) for txid, data in unique.items()])
+        return results
 
     async def balance(self, address):
         error, history = await self.history3(address)
@@ -547,77 +1225,160 @@ class Client:
 
         return None, merkle_branch(hash_, merkle_tree(hashes))
 
-    async def subscribe_to_blocks(self):
-        queue = asyncio.Queue(loop=self._settings._loop)
-        asyncio.ensure_future(self._listen_for_blocks(queue))
+    async def subscribe_to_blocks(
+            self, mode="block", maxsize=0, overflow="block"):
+        """Returns a queue of (sequence, height, block) tuples.
+
+        mode -- what `block` is:
+            "block": a bitcoin.core.CBlock.
+            "raw": the serialized block.
+            "header": a bitcoin.core.CBlockHeader.
+            "txids": the list of transaction hashes.
+        maxsize -- the bound of the queue, 0 for unbounded.
+        overflow -- what happens when the queue is full, see
+            pylibbitcoin.stream.BoundedQueue.
+
+        Every queue gets every block. A full queue with the "block" policy
+        holds up the other queues of the stream too. The queues share the
+        stream's `sequence` tracker.
+        """
+        if mode not in BLOCK_DECODERS:
+            raise ValueError("Unknown block mode %s" % mode)
+
+        queue = pylibbitcoin.stream.BoundedQueue(
+            maxsize, overflow, loop=self._settings._loop)
+        queue.sequence = self._block_sequence
+        self._block_queues.append((queue, BLOCK_DECODERS[mode]))
+        if "block" not in self._listeners:
+            self._listeners["block"] = self.__start_listener("block")
         return queue
 
-    async def _listen_for_blocks(self, queue):
-        while True:
-            frame = await self._block_socket.recv_multipart()
-            seq = struct.unpack("<H", frame[0])[0]
-            height = struct.unpack("<I", frame[1])[0]
-            block_data = frame[2]
-            queue.put_nowait(
-                (seq, height, bitcoin.core.CBlock.deserialize(block_data)))
+    async def subscribe_to_headers(self, maxsize=0, overflow="block"):
+        return await self.subscribe_to_blocks("header", maxsize, overflow)
 
-    @staticmethod
-    def __server_url(hostname, port):
-        return "tcp://" + hostname + ":" + str(port)
-
-    @staticmethod
-    def __receives_without_spends(history):
-        return (point for point in history if 'spent' not in point)
-
-    @staticmethod
-    def __correlate(points):
-        transfers, checksum_to_index = Client.__find_receives(points)
-        transfers = Client.__correlate_spends_to_receives(
-            points,
-            transfers,
-            checksum_to_index
-        )
-
-        return transfers
-
-    @staticmethod
-    def __correlate_spends_to_receives(points, transfers, checksum_to_index):
-        for point in points:
-            if point[0] == 0:  # receive
+    async def _listen_for_blocks(self):
+        while True:
+            frame = await self._block_socket.recv_multipart(copy=False)
+            try:
+                seq = struct.unpack("<H", frame[0])[0]
+                height = struct.unpack("<I", frame[1])[0]
+                data = memoryview(frame[2])
+            except (IndexError, struct.error) as error:
+                self.__drop_message("block", error)
                 continue
+            self._block_sequence.update(seq)
+            await self.__fan_out(
+                "block", self._block_queues, (seq, height), data)
+
+    async def subscribe_to_transactions(
+            self, mode="transaction", maxsize=0, overflow="block",
+            seen=100_000):
+        """Returns a queue of (sequence, txid, transaction) tuples for the
+        transactions the server accepts into its memory pool.
+
+        mode -- what `transaction` is:
+            "transaction": a bitcoin.core.CTransaction.
+            "raw": the serialized transaction.
+            "lazy": a pylibbitcoin.scan.LazyTransaction which only
+                deserializes when asked to.
+        maxsize, overflow -- see `subscribe_to_blocks`, which also
+            describes how several queues share the stream.
+        seen -- how many txids to remember to drop duplicates. The
+            duplicates are tracked for the stream, so only the first
+            subscription sets this.
+        """
+        if mode not in TRANSACTION_DECODERS:
+            raise ValueError("Unknown transaction mode %s" % mode)
+
+        if self._transaction_socket is None:
+            self._transaction_socket = self._create_subscriber_socket("tx")
+        if self._transaction_seen is None:
+            self._transaction_seen = pylibbitcoin.stream.SeenFilter(seen)
+        queue = pylibbitcoin.stream.BoundedQueue(
+            maxsize, overflow, loop=self._settings._loop)
+        queue.sequence = self._transaction_sequence
+        self._transaction_queues.append((queue, TRANSACTION_DECODERS[mode]))
+        if "tx" not in self._listeners:
+            self._listeners["tx"] = self.__start_listener("tx")
+        return queue
 
-            spent = {
-                "hash": point[1].hash,
-                "height": point[2],
-                "index": point[1].n,
-            }
-            if point[3] not in checksum_to_index:
-                transfers.append({
-                    "spent": spent
-                })
-            else:
-                transfers[checksum_to_index[point[3]]]["spent"] = spent
-
-        return transfers
+    async def _listen_for_transactions(self):
+        while True:
+            frame = await self._transaction_socket.recv_multipart(copy=False)
+            try:
+                seq = struct.unpack("<H", frame[0])[0]
+                data = memoryview(frame[1])
+                _, txid = pylibbitcoin.scan.scan_transaction(data)
+            except (IndexError, struct.error) as error:
+                self.__drop_message("transaction", error)
+                continue
+            self._transaction_sequence.update(seq)
+            if self._transaction_seen.add(txid):
+                await self.__fan_out(
+                    "transaction", self._transaction_queues, (seq, txid),
+                    data, txid)
+
+    async def __fan_out(self, service, queues, prefix, *arguments):
+        """Puts `prefix` + (decoded message,) into every queue, decoding
+        once per decoder. Queues whose decoder fails miss the message, the
+        others still get it."""
+        decoded = {}
+        failed = set()
+        for queue, decode in queues:
+            if decode in failed:
+                continue
+            if decode not in decoded:
+                try:
+                    decoded[decode] = self._decode(decode, *arguments)
+                except Exception as error:
+                    self.__drop_message(service, error)
+                    failed.add(decode)
+                    continue
+            await queue.put(prefix + (decoded[decode],))
+
+    def __drop_message(self, service, error):
+        logger.warning("Dropped a bad %s message: %r", service, error)
+        self.bad_messages += 1
+
+    async def _raw_transaction(
+            self, hash_, command=b"blockchain.fetch_transaction"):
+        """The serialized transaction (bytes from the transaction cache when
+        it is there, a memoryview of the response otherwise)."""
+        key = pylibbitcoin.primitives.internal_bytes(hash_)
+        cache = self._settings.transaction_cache
+        data = cache.get(key) if cache is not None else None
+
+        if data is None:
+            error_code, data = await self._simple_request(
+                command, key, memoryview)
+            if error_code:
+                return error_code, None
+            if cache is not None:
+                cache.put(key, data)
+        return None, data
 
-    @staticmethod
-    def __find_receives(points):
-        transfers = []
-        checksum_to_index = {}
+    async def __cached_transaction(self, command, hash_):
+        error_code, data = await self._raw_transaction(hash_, command)
+        if error_code:
+            return error_code, None
 
-        for point in points:
-            if point[0] == 1:  # spent
-                continue
+        transaction = self._decode(_decode_transaction, data)
+        return None, transaction
 
-            transfers.append({
-                "received": {
-                    "hash": point[1].hash,
-                    "height": point[2],
-                    "index": point[1].n,
-                },
-                "value": point[3],
-            })
+    def __start_listener(self, service):
+        listen = self._listen_for_blocks if service == "block" \
+            else self._listen_for_transactions
+        return asyncio.ensure_future(listen())
 
-            checksum_to_index[point[4]] = len(transfers) - 1
+    def __stored_header(self, index):
+        store = self._settings.header_store
+        if store is None:
+            return None
+        if isinstance(index, int):
+            return store.header(index)
+        return store.header_by_hash(
+            pylibbitcoin.primitives.internal_bytes(index))
 
-        return transfers, checksum_to_index
+    @staticmethod
+    def __receives_without_spends(history):
+        return (point for point in history if 'spent' not in point)
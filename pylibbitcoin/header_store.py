@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import struct
+
+import pylibbitcoin.error_code
+
+HEADER_SIZE = 80
+HASH_SIZE = 32
+
+_MAGIC = b"pylbhdrs"
+_PREAMBLE = struct.Struct("<8sQ")
+
+
+def header_hash(raw_header):
+    """Double sha256 of a serialized header, in internal byte order."""
+    return hashlib.sha256(hashlib.sha256(raw_header).digest()).digest()
+
+
+class HeaderStore:
+    """
+    A local copy of the header chain.
+
+    Headers are kept in a flat memory-mapped file (`path`) of 80-byte records
+    indexed by height. Their hashes are kept in a second flat file
+    (`path + ".hashes"`) so reopening the store only has to slice hashes into
+    the hash -> height index; no header is parsed or hashed again.
+
+    All hashes are in internal (little endian) byte order.
+    """
+
+    def __init__(self, path, growth=2016):
+        self._path = path
+        self._growth = growth
+        self._headers_file = self.__open(path)
+        self._hashes_file = self.__open(path + ".hashes")
+
+        if os.fstat(self._headers_file.fileno()).st_size == 0:
+            self._count = 0
+            self._capacity = 0
+            self.__resize(growth)
+            self.__write_count()
+        else:
+            self.__map()
+            magic, self._count = _PREAMBLE.unpack_from(self._headers, 0)
+            if magic != _MAGIC:
+                raise ValueError("%s is not a header store" % path)
+
+        self._index = {
+            bytes(self._hashes[offset:offset + HASH_SIZE]): height
+            for height, offset in enumerate(
+                range(0, self._count * HASH_SIZE, HASH_SIZE))
+        }
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def height(self):
+        """The height of the tip, None if the store is empty."""
+        return self._count - 1 if self._count else None
+
+    def header(self, height):
+        """The raw 80-byte header at `height` or None."""
+        if not 0 <= height < self._count:
+            return None
+        offset = _PREAMBLE.size + height * HEADER_SIZE
+        return self._headers[offset:offset + HEADER_SIZE]
+
+    def headers(self, start, end):
+        """The raw headers from `start` up to (not including) `end`,
+        concatenated."""
+        start = max(0, start)
+        end = min(end, self._count)
+        if start >= end:
+            return b""
+        return self._headers[_PREAMBLE.size + start * HEADER_SIZE:
+                             _PREAMBLE.size + end * HEADER_SIZE]
+
+    def hash_at(self, height):
+        if not 0 <= height < self._count:
+            return None
+        offset = height * HASH_SIZE
+        return self._hashes[offset:offset + HASH_SIZE]
+
+    def height_of(self, hash_):
+        return self._index.get(bytes(hash_))
+
+    def header_by_hash(self, hash_):
+        height = self.height_of(hash_)
+        if height is None:
+            return None
+        return self.header(height)
+
+    def append(self, raw_header):
+        """Adds a header on top of the tip.
+        Raises a ValueError if it doesn't connect to the tip."""
+        if len(raw_header) != HEADER_SIZE:
+            raise ValueError("A header is %d bytes, not %d" % (
+                HEADER_SIZE, len(raw_header)))
+        if self._count and raw_header[4:36] != self.hash_at(self.height):
+            raise ValueError("Header does not connect to the tip")
+
+        if self._count == self._capacity:
+            self.__resize(self._capacity + self._growth)
+
+        hash_ = header_hash(raw_header)
+        offset = _PREAMBLE.size + self._count * HEADER_SIZE
+        self._headers[offset:offset + HEADER_SIZE] = raw_header
+        offset = self._count * HASH_SIZE
+        self._hashes[offset:offset + HASH_SIZE] = hash_
+        self._index[hash_] = self._count
+        self._count += 1
+        self.__write_count()
+
+    def truncate(self, height):
+        """Drops every header above `height` (-1 empties the store)."""
+        for dropped in range(height + 1, self._count):
+            del self._index[self.hash_at(dropped)]
+        self._count = min(self._count, height + 1)
+        self.__write_count()
+
+    def apply(self, height, raw_header):
+        """
+        Applies a header announced at `height`, rolling back the chain if it
+        replaces headers we already have (a reorg).
+
+        Returns False if the header doesn't connect to the stored chain, in
+        which case the store has to be synced with the server.
+        """
+        existing = self.hash_at(height)
+        if existing is not None and existing == header_hash(raw_header):
+            return True
+        if height > self._count:
+            return False
+        if height > 0 and raw_header[4:36] != self.hash_at(height - 1):
+            return False
+
+        self.truncate(height - 1)
+        self.append(raw_header)
+        return True
+
+    async def sync(self, client, batch_size=500, validator=None):
+        """Fetches every header we are missing from the server.
+        Returns an error code on failure, None otherwise.
+
+        With a pylibbitcoin.validation.HeaderValidator, each batch is
+        validated before it is stored."""
+        error_code = await self._roll_back_to_fork(client)
+        if error_code:
+            return error_code
+
+        error_code, last_height = await client.last_height()
+        if error_code:
+            return error_code
+
+        for start in range(self._count, last_height + 1, batch_size):
+            end = min(start + batch_size, last_height + 1)
+            results = await asyncio.gather(*[
+                client.block_header(height, use_store=False)
+                for height in range(start, end)
+            ])
+            headers = []
+            for error_code, header in results:
+                if error_code:
+                    return error_code
+                headers.append(header.serialize())
+            if validator is not None:
+                error_code, _ = validator.validate(
+                    b"".join(headers), start, self)
+                if error_code:
+                    self.flush()
+                    return error_code
+            for header in headers:
+                self.append(header)
+        self.flush()
+        return None
+
+    async def follow(self, client, queue=None, validator=None):
+        """Keeps the store current from the block stream. Runs until
+        cancelled.
+
+        With a pylibbitcoin.validation.HeaderValidator, tips which fail
+        validation are ignored."""
+        if queue is None:
+            queue = await client.subscribe_to_blocks()
+
+        while True:
+            _, height, block = await queue.get()
+            raw_header = block.get_header().serialize()
+            if validator is not None and height <= self._count:
+                error_code, _ = validator.validate(raw_header, height, self)
+                # A header which doesn't link is handled by the sync below.
+                if error_code and error_code != \
+                        pylibbitcoin.error_code.ErrorCode \
+                        .previous_block_invalid:
+                    continue
+            if not self.apply(height, raw_header):
+                await self.sync(client, validator=validator)
+
+    async def _roll_back_to_fork(self, client):
+        height = self.height
+        while height is not None and height >= 0:
+            # The client may answer from this very store.
+            error_code, header = await client.block_header(
+                height, use_store=False)
+            if error_code:
+                return error_code
+            if header_hash(header.serialize()) == self.hash_at(height):
+                break
+            height -= 1
+
+        if height is not None:
+            self.truncate(height)
+        return None
+
+    def flush(self):
+        self._headers.flush()
+        self._hashes.flush()
+
+    def close(self):
+        self.flush()
+        self._headers.close()
+        self._hashes.close()
+        self._headers_file.close()
+        self._hashes_file.close()
+
+    def __write_count(self):
+        _PREAMBLE.pack_into(self._headers, 0, _MAGIC, self._count)
+
+    def __resize(self, capacity):
+        if self._capacity:
+            self._headers.close()
+            self._hashes.close()
+        self._headers_file.truncate(_PREAMBLE.size + capacity * HEADER_SIZE)
+        self._hashes_file.truncate(capacity * HASH_SIZE)
+        self.__map()
+
+    def __map(self):
+        self._headers = mmap.mmap(self._headers_file.fileno(), 0)
+        self._hashes = mmap.mmap(self._hashes_file.fileno(), 0)
+        self._capacity = (len(self._headers) - _PREAMBLE.size) // HEADER_SIZE
+
+    @staticmethod
+    def __open(path):
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        return open(path, mode)
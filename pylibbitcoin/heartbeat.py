@@ -0,0 +1,62 @@
+import asyncio
+
+
+class HeartbeatMonitor:
+    """
+    Tracks the liveness of a server through its heartbeat publisher.
+
+    The server is considered dead once no heartbeat arrived for `threshold`
+    heartbeat intervals, which needn't be a whole number; `on_failure` (a
+    coroutine function) is then awaited and the monitor gives the server a
+    fresh grace period.
+    """
+
+    def __init__(self, socket, interval, threshold, on_failure, loop):
+        self._socket = socket
+        self._interval = interval
+        self._threshold = threshold
+        self._on_failure = on_failure
+        self._loop = loop
+        self.last_beat = loop.time()
+        self.failures = 0
+
+        self._listener = asyncio.ensure_future(self._listen(), loop=loop)
+        self._watcher = asyncio.ensure_future(self._watch(), loop=loop)
+
+    @property
+    def alive(self):
+        return self._loop.time() - self.last_beat \
+            <= self._interval * self._threshold
+
+    def listen_on(self, socket):
+        """Takes heartbeats from `socket` from now on, e.g. after a
+        reconnect; the previous socket is left to the caller to close."""
+        self._listener.cancel()
+        self._socket = socket
+        self._listener = asyncio.ensure_future(
+            self._listen(), loop=self._loop)
+
+    async def stop(self):
+        tasks = [self._listener, self._watcher]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _listen(self):
+        while True:
+            await self._socket.recv_multipart()
+            self.last_beat = self._loop.time()
+
+    async def _watch(self):
+        while True:
+            # Sleeps until the deadline of the last heartbeat, so a dead
+            # server is noticed right when its threshold runs out.
+            deadline = self.last_beat + self._interval * self._threshold
+            delay = deadline - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            self.failures += 1
+            await self._on_failure()
+            self.last_beat = self._loop.time()
@@ -0,0 +1,59 @@
+import pylibbitcoin.client
+
+
+class HistoryCache:
+    """
+    Per-address history3 rows, refreshed incrementally.
+
+    The first refresh of an address fetches its whole history. Later refreshes
+    only ask for the rows from the last confirmed height synced minus
+    `reorg_margin` blocks; the rows below that height are kept and the result
+    is correlated over the merged rows, so spends in the new rows find the
+    receives they spend in the old ones.
+    """
+
+    def __init__(self, client, reorg_margin=6):
+        self._client = client
+        self._reorg_margin = reorg_margin
+        self._points = {}  # address -> history3 points
+        self._synced_height = {}  # address -> last confirmed height
+
+    def synced_height(self, address):
+        return self._synced_height.get(address)
+
+    def history(self, address):
+        """The correlated history from the last refresh, None if `address`
+        was never refreshed."""
+        points = self._points.get(address)
+        if points is None:
+            return None
+        return pylibbitcoin.client.correlate(points)
+
+    async def refresh(self, address):
+        """Fetches the new rows for `address`. Returns the error code and the
+        correlated history, as `Client.history3()` does."""
+        synced_height = self._synced_height.get(address)
+        from_height = 0 if synced_height is None \
+            else max(0, synced_height - self._reorg_margin)
+
+        error_code, new_points = await self._client._history3_points(
+            address, from_height)
+        if error_code:
+            return error_code, None
+
+        # Rows at or above `from_height` were sent again and unconfirmed
+        # rows (height 0) are either in the new rows or gone.
+        points = [
+            point for point in self._points.get(address, ())
+            if 0 < point[2] < from_height
+        ]
+        points.extend(new_points)
+
+        self._points[address] = points
+        self._synced_height[address] = max(
+            (point[2] for point in points), default=synced_height)
+        return None, pylibbitcoin.client.correlate(points)
+
+    def forget(self, address):
+        self._points.pop(address, None)
+        self._synced_height.pop(address, None)
@@ -0,0 +1,157 @@
+import asyncio
+import collections
+
+import pylibbitcoin.primitives
+import pylibbitcoin.scan
+import pylibbitcoin.stream
+
+EVICT_OLDEST = "oldest"
+EVICT_NEWEST = "newest"
+
+EVICTION_POLICIES = (EVICT_OLDEST, EVICT_NEWEST)
+
+
+class MempoolMirror:
+    """
+    A copy of the server's memory pool, indexed by txid and by the outpoints
+    the transactions spend.
+
+    `seed()` loads known transactions and `run()` keeps the mirror current:
+    transactions come from the transaction stream and leave when a block
+    confirms them, or a conflicting transaction. Transactions whose parents
+    are removed stay until they are confirmed or evicted.
+
+    The raw transactions are held in memory, at most `max_size` bytes of
+    them. When that is exceeded, `eviction` picks what goes:
+        "oldest": the transactions received first are dropped.
+        "newest": new transactions are refused.
+
+    Hashes are bytes in internal order; the lookups also take Hash32s and
+    hex strings.
+    """
+
+    def __init__(self, client, max_size=300_000_000, eviction=EVICT_OLDEST,
+                 confirmed=100_000):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError("Unknown eviction policy %s" % eviction)
+        self._client = client
+        self._max_size = max_size
+        self._eviction = eviction
+        self._transactions = collections.OrderedDict()  # txid -> raw, spent
+        self._spenders = {}  # (hash, index) -> txid
+        # The transaction stream can lag behind the block stream.
+        self._confirmed = pylibbitcoin.stream.SeenFilter(confirmed)
+        self.size = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def __contains__(self, txid):
+        return pylibbitcoin.primitives.internal_bytes(txid) \
+            in self._transactions
+
+    def transaction(self, txid):
+        """The raw transaction, None if it isn't in the mirror."""
+        entry = self._transactions.get(
+            pylibbitcoin.primitives.internal_bytes(txid))
+        return entry[0] if entry is not None else None
+
+    def spender(self, hash_, index=None):
+        """The txid of the transaction spending an outpoint, None if no
+        transaction in the mirror spends it. `hash_` can also be an
+        OutPoint, then `index` is left out."""
+        if isinstance(hash_, pylibbitcoin.primitives.OutPoint):
+            hash_, index = hash_.hash, hash_.index
+        return self._spenders.get(
+            (pylibbitcoin.primitives.internal_bytes(hash_), index))
+
+    def add(self, raw):
+        """Adds a raw transaction. Returns False if it was already there,
+        confirmed or refused for lack of room."""
+        raw = bytes(raw)
+        _, txid, spent, _ = pylibbitcoin.scan.parse_transaction(raw)
+        if txid in self._transactions or txid in self._confirmed:
+            return False
+
+        if self.size + len(raw) > self._max_size:
+            if self._eviction == EVICT_NEWEST or len(raw) > self._max_size:
+                self.evicted += 1
+                return False
+            while self.size + len(raw) > self._max_size:
+                self.remove(next(iter(self._transactions)))
+                self.evicted += 1
+
+        self._transactions[txid] = raw, spent
+        for outpoint in spent:
+            self._spenders[outpoint] = txid
+        self.size += len(raw)
+        return True
+
+    def remove(self, txid):
+        """Removes a transaction, returns False if it wasn't there."""
+        txid = pylibbitcoin.primitives.internal_bytes(txid)
+        entry = self._transactions.pop(txid, None)
+        if entry is None:
+            return False
+
+        raw, spent = entry
+        for outpoint in spent:
+            if self._spenders.get(outpoint) == txid:
+                del self._spenders[outpoint]
+        self.size -= len(raw)
+        return True
+
+    def confirm_block(self, block):
+        """Removes the transactions of a serialized block, and the ones
+        spending the same outputs. Returns the number removed."""
+        removed = 0
+        count, offset = pylibbitcoin.scan.read_varint(
+            block, pylibbitcoin.scan.HEADER_SIZE)
+        for _ in range(count):
+            offset, txid, spent, _ = \
+                pylibbitcoin.scan.parse_transaction(block, offset)
+            self._confirmed.add(txid)
+            removed += self.remove(txid)
+            for outpoint in spent:
+                conflict = self._spenders.get(outpoint)
+                if conflict is not None:
+                    removed += self.remove(conflict)
+        return removed
+
+    async def seed(self, txids):
+        """Fetches transactions from the server's memory pool into the
+        mirror. Returns a dictionary of txid (as given) -> error code for the
+        ones which couldn't be fetched."""
+        command = b"transaction_pool.fetch_transaction"
+        hashes = [pylibbitcoin.primitives.internal_bytes(txid)
+                  for txid in txids]
+        results = await asyncio.gather(*[
+            self._client._simple_request(command, hash_, bytes)
+            for hash_ in hashes])
+
+        errors = {}
+        for txid, (error_code, raw) in zip(txids, results):
+            if error_code:
+                errors[txid] = error_code
+            else:
+                self.add(raw)
+        return errors
+
+    async def run(self):
+        """Follows the transaction and block streams until cancelled."""
+        transactions = await self._client.subscribe_to_transactions("raw")
+        blocks = await self._client.subscribe_to_blocks("raw")
+        await asyncio.gather(
+            self.__follow_transactions(transactions),
+            self.__follow_blocks(blocks))
+
+    async def __follow_transactions(self, queue):
+        while True:
+            _, _, raw = await queue.get()
+            self.add(raw)
+
+    async def __follow_blocks(self, queue):
+        while True:
+            _, _, block = await queue.get()
+            self.confirm_block(block)
@@ -0,0 +1,86 @@
+import collections
+
+
+def _percentile(samples, percent):
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+class LatencyWindow:
+    """The latencies (in seconds) of the last `size` requests of some kind."""
+
+    def __init__(self, size=1000):
+        self._samples = collections.deque(maxlen=size)
+        self.count = 0
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+        self.count += 1
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, percent):
+        """The `percent` percentile of the window, None while it is empty."""
+        if not self._samples:
+            return None
+        return _percentile(sorted(self._samples), percent)
+
+    def snapshot(self):
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count, "p50": None, "p99": None,
+                    "max": None}
+        return {
+            "count": self.count,
+            "p50": _percentile(samples, 50),
+            "p99": _percentile(samples, 99),
+            "max": samples[-1],
+        }
+
+
+class AdaptiveTimeouts:
+    """
+    Per command timeouts from the latencies of the last `window` requests of
+    each command: the p99 latency times `factor`, kept between `floor` and
+    `ceiling` seconds. A request which timed out counts as taking its
+    timeout, so the timeouts grow again when the server slows down.
+
+    `overrides` maps commands to fixed timeouts (None for no timeout). Until a
+    command has `min_samples` latencies its timeout is the default given to
+    `timeout()`. The p99 is recomputed every `min_samples` requests, not on
+    each one.
+    """
+
+    def __init__(self, factor=3, floor=0.1, ceiling=60, overrides=None,
+                 window=1000, min_samples=20):
+        self._factor = factor
+        self._floor = floor
+        self._ceiling = ceiling
+        self._overrides = overrides or {}
+        self._window = window
+        self._min_samples = min_samples
+        self._latencies = {}  # command -> LatencyWindow
+        self._timeouts = {}  # command -> timeout
+
+    def timeout(self, command, default=None):
+        if command in self._overrides:
+            return self._overrides[command]
+        return self._timeouts.get(command, default)
+
+    def record(self, command, seconds):
+        latency = self._latencies.get(command)
+        if latency is None:
+            latency = self._latencies[command] = LatencyWindow(self._window)
+        latency.record(seconds)
+
+        if latency.count % self._min_samples == 0:
+            self._timeouts[command] = min(
+                max(latency.percentile(99) * self._factor, self._floor),
+                self._ceiling)
+
+    def snapshot(self):
+        """Command -> current timeout, for the commands seen so far."""
+        return {
+            command: self.timeout(command)
+            for command in set(self._timeouts) | set(self._overrides)
+        }
@@ -0,0 +1,209 @@
+import asyncio
+import collections
+import logging
+import os
+import struct
+import tempfile
+
+import zmq
+import zmq.asyncio
+
+import pylibbitcoin.client
+
+logger = logging.getLogger(__name__)
+
+
+class ClientFactory:
+    """
+    Hands out one Client per process.
+
+    ZMQ contexts and sockets don't survive a fork, so `get()` checks the
+    process id and builds a fresh Client, with fresh settings from
+    `settings_factory`, the first time it is called in a new process. The
+    Client inherited from the parent is dropped without being touched.
+
+    Neither does an event loop: the one inherited from the parent shares
+    its selector and still holds the parent Client's tasks. In a forked
+    process the fresh Client gets a new event loop, made the current one,
+    unless `get()` is called from a running loop.
+
+    Point `ports` at a Broker's `endpoints` to have all the processes share
+    the broker's server connections.
+    """
+
+    def __init__(self, hostname, ports,
+                 settings_factory=pylibbitcoin.client.ClientSettings):
+        self._hostname = hostname
+        self._ports = ports
+        self._settings_factory = settings_factory
+        self._pid = None
+        self._client = None
+        self._parent_pid = os.getpid()
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            settings = self._settings_factory()
+            if pid != self._parent_pid:
+                settings.loop = self.__child_loop()
+            self._client = pylibbitcoin.client.Client(
+                self._hostname, self._ports, settings)
+            self._pid = pid
+        return self._client
+
+    @staticmethod
+    def __child_loop():
+        loop = asyncio._get_running_loop()
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        return loop
+
+    async def stop(self):
+        """Stops the Client of this process, if there is one."""
+        if self._client is None or self._pid != os.getpid():
+            return 0
+        client, self._client, self._pid = self._client, None, None
+        return await client.stop()
+
+
+class Broker:
+    """
+    Keeps the server connections for any number of local clients.
+
+    The query service is proxied through a ROUTER socket: requests get a
+    broker wide unique request id on the way to the server (the ids chosen by
+    different clients may collide) and their own id back on the way in. The
+    block, transaction and heartbeat publishers are re-published as is.
+    Malformed messages are logged and dropped.
+
+    Subscriptions are routed until the server answers them with an error,
+    the other requests until they are answered or `max_pending` newer ones
+    are waiting.
+
+    The ZMQ context is made in `run()`, unless one is given, so a broker
+    built before a fork can run in the child.
+
+    `endpoints` maps each service in `ports` to the local endpoint to bind,
+    IPC sockets in the temporary directory by default.
+    """
+
+    def __init__(self, hostname, ports, endpoints=None, context=None,
+                 max_pending=100_000):
+        self._hostname = hostname
+        self._ports = ports
+        self._endpoints = endpoints or {
+            service: "ipc://" + os.path.join(
+                tempfile.gettempdir(),
+                "pylibbitcoin-%d-%s" % (os.getpid(), service))
+            for service in ports
+        }
+        self._context = context
+        self._max_pending = max_pending
+        self._pending = collections.OrderedDict()
+        self._subscriptions = {}
+        self._next_id = 0
+        self._sockets = []
+
+    @property
+    def endpoints(self):
+        """The ports to give the local clients."""
+        return dict(self._endpoints)
+
+    async def run(self):
+        """Proxies until cancelled."""
+        tasks = []
+        context = self._context or zmq.asyncio.Context()
+        try:
+            frontend = self.__socket(context, zmq.ROUTER)
+            frontend.bind(self._endpoints["query"])
+            backend = self.__socket(context, zmq.DEALER)
+            backend.connect(self.__upstream("query"))
+            tasks.append(asyncio.ensure_future(
+                self.__forward_requests(frontend, backend)))
+            tasks.append(asyncio.ensure_future(
+                self.__forward_responses(backend, frontend)))
+
+            for service in self._ports:
+                if service == "query":
+                    continue
+                subscriber = self.__socket(context, zmq.SUB)
+                subscriber.connect(self.__upstream(service))
+                subscriber.setsockopt_string(zmq.SUBSCRIBE, '')
+                publisher = self.__socket(context, zmq.PUB)
+                publisher.bind(self._endpoints[service])
+                tasks.append(asyncio.ensure_future(
+                    self.__republish(subscriber, publisher)))
+
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for socket in self._sockets:
+                socket.close(linger=0)
+            self._sockets = []
+            if context is not self._context:
+                context.term()
+
+    def run_forever(self):
+        """Runs the broker on a new event loop, the target of a broker
+        process."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self.run())
+
+    async def __forward_requests(self, frontend, backend):
+        while True:
+            frames = await frontend.recv_multipart()
+            if len(frames) != 4:
+                logger.warning(
+                    "Dropped a request of %d frames", len(frames) - 1)
+                continue
+            identity, command, request_id, data = frames
+            upstream_id = struct.pack("<I", self._next_id)
+            self._next_id = (self._next_id + 1) & 0xffffffff
+
+            if command.startswith(b"subscribe."):
+                self._subscriptions[upstream_id] = identity, request_id
+            else:
+                self._pending[upstream_id] = identity, request_id
+                if len(self._pending) > self._max_pending:
+                    # The oldest requests have timed out long ago.
+                    self._pending.popitem(last=False)
+            await backend.send_multipart([command, upstream_id, data])
+
+    async def __forward_responses(self, backend, frontend):
+        while True:
+            frames = await backend.recv_multipart()
+            if len(frames) != 3:
+                logger.warning(
+                    "Dropped a response of %d frames", len(frames))
+                continue
+            command, upstream_id, data = frames
+
+            # Subscriptions get answered many times, until they fail or
+            # are stopped.
+            pending = self._pending.pop(upstream_id, None)
+            if pending is None:
+                pending = self._subscriptions.get(upstream_id)
+                if pending is None:
+                    continue
+                if data[:4] != b"\x00\x00\x00\x00":
+                    del self._subscriptions[upstream_id]
+            identity, request_id = pending
+            await frontend.send_multipart(
+                [identity, command, request_id, data])
+
+    @staticmethod
+    async def __republish(subscriber, publisher):
+        while True:
+            await publisher.send_multipart(await subscriber.recv_multipart())
+
+    def __socket(self, context, socket_type):
+        socket = context.socket(socket_type)
+        self._sockets.append(socket)
+        return socket
+
+    def __upstream(self, service):
+        return pylibbitcoin.client.server_url(
+            self._hostname, self._ports[service])
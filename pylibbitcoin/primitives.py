@@ -0,0 +1,96 @@
+import struct
+
+
+class Hash32:
+    """
+    A 32 byte hash which keeps both byte orders and its hex form.
+
+    `internal` is the order used on the wire and in server responses,
+    `display` (and `hex`) the reversed order shown by block explorers. The
+    other forms are computed once, on first use.
+    """
+
+    __slots__ = ("_internal", "_display", "_hex")
+
+    def __init__(self, internal):
+        internal = bytes(internal)
+        if len(internal) != 32:
+            raise ValueError("A Hash32 needs 32 bytes, got %d" % len(internal))
+        self._internal = internal
+        self._display = None
+        self._hex = None
+
+    @classmethod
+    def from_hex(cls, hex_):
+        hash_ = cls(bytes.fromhex(hex_)[::-1])
+        hash_._hex = hex_
+        return hash_
+
+    @property
+    def internal(self):
+        return self._internal
+
+    @property
+    def display(self):
+        if self._display is None:
+            self._display = self._internal[::-1]
+        return self._display
+
+    @property
+    def hex(self):
+        if self._hex is None:
+            self._hex = self.display.hex()
+        return self._hex
+
+    def __bytes__(self):
+        return self._internal
+
+    def __str__(self):
+        return self.hex
+
+    def __repr__(self):
+        return "Hash32(%s)" % self.hex
+
+    def __eq__(self, other):
+        if isinstance(other, Hash32):
+            return self._internal == other._internal
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._internal)
+
+
+class OutPoint:
+    """A transaction output, the `hash` of its transaction and its `index`."""
+
+    __slots__ = ("hash", "index")
+
+    def __init__(self, hash_, index):
+        self.hash = hash_ if isinstance(hash_, Hash32) \
+            else Hash32(internal_bytes(hash_))
+        self.index = index
+
+    def serialize(self):
+        return self.hash.internal + struct.pack("<I", self.index)
+
+    def __repr__(self):
+        return "OutPoint(%s, %d)" % (self.hash.hex, self.index)
+
+    def __eq__(self, other):
+        if isinstance(other, OutPoint):
+            return self.hash == other.hash and self.index == other.index
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.hash, self.index))
+
+
+def internal_bytes(hash_):
+    """The wire order bytes of a hash given as a Hash32, as raw bytes (already
+    in wire order, like the hashes in server responses) or as a hex string in
+    display order."""
+    if isinstance(hash_, Hash32):
+        return hash_.internal
+    if isinstance(hash_, str):
+        return bytes.fromhex(hash_)[::-1]
+    return bytes(hash_)
@@ -0,0 +1,88 @@
+import asyncio
+import collections
+
+import pylibbitcoin.client
+import pylibbitcoin.error_code
+import pylibbitcoin.scan
+
+
+class BlockReconstructor:
+    """
+    Rebuilds full blocks from the query service, for servers whose block
+    publisher can't be reached.
+
+    Each block is assembled from `block_header()`,
+    `block_transaction_hashes()` and one `transaction()` per txid. Up to
+    `blocks_in_flight` blocks are reconstructed concurrently with at most
+    `transactions_in_flight` transaction requests between them, which bounds
+    the memory used. The merkle root of the txids of the transactions
+    received has to match the header before a block is handed out.
+    """
+
+    def __init__(self, client, blocks_in_flight=4, transactions_in_flight=64):
+        self._client = client
+        self._blocks_in_flight = blocks_in_flight
+        self._transactions = asyncio.Semaphore(transactions_in_flight)
+
+    async def blocks(self, heights, mode="raw"):
+        """Yields (height, error code, block) tuples in the order of
+        `heights`; `mode` is as for `Client.subscribe_to_blocks()`. A block
+        whose transactions don't match the header's merkle root comes with
+        `ErrorCode.merkle_mismatch`."""
+        decode = pylibbitcoin.client.BLOCK_DECODERS[mode]
+        heights = iter(heights)
+        pending = collections.deque()
+
+        def start_next():
+            for height in heights:
+                pending.append((
+                    height,
+                    asyncio.ensure_future(self.reconstruct(height))))
+                return
+
+        for _ in range(self._blocks_in_flight):
+            start_next()
+        try:
+            while pending:
+                height, task = pending.popleft()
+                error_code, block = await task
+                start_next()
+                yield height, error_code, \
+                    None if error_code else decode(block)
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def reconstruct(self, height):
+        """Returns the error code and the serialized block at `height`."""
+        (error_code, header), (hashes_error_code, hashes) = \
+            await asyncio.gather(
+                self._client.block_header(height),
+                self._client.block_transaction_hashes(height))
+        error_code = error_code or hashes_error_code
+        if error_code:
+            return error_code, None
+
+        results = await asyncio.gather(
+            *[self.__transaction(hash_) for hash_, in hashes])
+        transactions = []
+        for error_code, transaction in results:
+            if error_code:
+                return error_code, None
+            transactions.append(transaction)
+
+        txids = [
+            pylibbitcoin.scan.scan_transaction(transaction)[1]
+            for transaction in transactions
+        ]
+        if pylibbitcoin.client.merkle_root(txids) != header.hashMerkleRoot:
+            return pylibbitcoin.error_code.ErrorCode.merkle_mismatch, None
+
+        return None, b"".join([
+            header.serialize(),
+            pylibbitcoin.scan.write_varint(len(transactions)),
+        ] + transactions)
+
+    async def __transaction(self, hash_):
+        async with self._transactions:
+            return await self._client._raw_transaction(hash_)
@@ -0,0 +1,212 @@
+"""
+Recording of the frames a Client exchanges with a server, and a server
+replaying them.
+
+The log is a preamble followed by one record per multipart message:
+
+    timestamp (float64 seconds since the recording started), direction
+    (0 sent, 1 received), service (index into SERVICES), number of frames
+    then, for every frame, its length (uint32) and its bytes.
+"""
+import asyncio
+import collections
+import struct
+import time
+
+import pylibbitcoin.error_code
+
+SERVICES = ("query", "block", "tx", "heartbeat")
+
+SENT = 0
+RECEIVED = 1
+
+_MAGIC = b"pylbwire"
+_RECORD = struct.Struct("<dBBH")
+_LENGTH = struct.Struct("<I")
+
+
+class WireRecorder:
+    """Appends the messages of the sockets it wraps to the log at `path`.
+    Give it to `ClientSettings.recorder`."""
+
+    def __init__(self, path, clock=time.monotonic):
+        self._file = open(path, "wb")
+        self._file.write(_MAGIC)
+        self._clock = clock
+        self._start = clock()
+
+    def wrap(self, socket, service):
+        return RecordingSocket(socket, self, SERVICES.index(service))
+
+    def record(self, direction, service, frames):
+        self._file.write(_RECORD.pack(
+            self._clock() - self._start, direction, service, len(frames)))
+        for frame in frames:
+            frame = bytes(frame)
+            self._file.write(_LENGTH.pack(len(frame)))
+            self._file.write(frame)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class RecordingSocket:
+    """A socket whose messages go to a WireRecorder too."""
+
+    def __init__(self, socket, recorder, service):
+        self._socket = socket
+        self._recorder = recorder
+        self._service = service
+
+    async def send_multipart(self, frames, *args, **kwargs):
+        self._recorder.record(SENT, self._service, frames)
+        return await self._socket.send_multipart(frames, *args, **kwargs)
+
+    async def recv_multipart(self, *args, **kwargs):
+        frames = await self._socket.recv_multipart(*args, **kwargs)
+        self._recorder.record(RECEIVED, self._service, frames)
+        return frames
+
+    def __getattr__(self, name):
+        return getattr(self._socket, name)
+
+
+def read_log(path):
+    """Yields the (timestamp, direction, service name, frames) records of a
+    log."""
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:len(_MAGIC)] != _MAGIC:
+        raise ValueError("%s is not a wire log" % path)
+
+    offset = len(_MAGIC)
+    while offset < len(data):
+        timestamp, direction, service, count = \
+            _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        frames = []
+        for _ in range(count):
+            length, = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            frames.append(data[offset:offset + length])
+            offset += length
+        yield timestamp, direction, SERVICES[service], frames
+
+
+class ReplayServer:
+    """
+    Serves a wire log to local clients.
+
+    A query is answered with what the server answered to the same query
+    (command and data) in the recording, after the same delay. Repeated
+    queries get the recorded answers in turn, and the last one once they run
+    out; notifications of subscriptions follow at their recorded times.
+    Queries which weren't recorded get `ErrorCode.not_found`. The block, tx
+    and heartbeat messages are published at their recorded times, counted
+    from when the first subscriber of the service arrives.
+
+    `speed` scales time: 1 replays at the original pace, 10 ten times faster
+    and None as fast as possible. `endpoints` maps the recorded services to
+    the endpoints to bind.
+    """
+
+    def __init__(self, path, endpoints, speed=1, context=None):
+        import zmq.asyncio
+
+        self._endpoints = endpoints
+        self._speed = speed
+        self._context = context or zmq.asyncio.Context()
+        self._answers = collections.defaultdict(collections.deque)
+        self._published = collections.defaultdict(list)
+        self.__load(path)
+
+    def __load(self, path):
+        sent = {}  # request id -> (time, key)
+        answers = collections.OrderedDict()  # (request id, time) -> answer
+        for timestamp, direction, service, frames in read_log(path):
+            if service != "query":
+                if direction == RECEIVED:
+                    self._published[service].append((timestamp, frames))
+                continue
+
+            command, request_id, payload = frames
+            if direction == SENT:
+                sent[request_id] = timestamp, (command, payload)
+                answers[(request_id, timestamp)] = []
+                self._answers[(command, payload)].append(
+                    answers[(request_id, timestamp)])
+            elif request_id in sent:
+                sent_at, _ = sent[request_id]
+                answers[(request_id, sent_at)].append(
+                    (timestamp - sent_at, payload))
+
+    async def run(self):
+        """Serves until cancelled."""
+        import zmq
+
+        sockets = []
+        tasks = []
+        try:
+            router = self._context.socket(zmq.ROUTER)
+            sockets.append(router)
+            router.bind(self._endpoints["query"])
+            tasks.append(asyncio.ensure_future(self.__serve(router)))
+
+            for service, messages in self._published.items():
+                if service not in self._endpoints:
+                    continue
+                # An XPUB socket tells when the first subscriber arrives.
+                publisher = self._context.socket(zmq.XPUB)
+                sockets.append(publisher)
+                publisher.bind(self._endpoints[service])
+                tasks.append(asyncio.ensure_future(
+                    self.__publish(publisher, messages)))
+
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for socket in sockets:
+                socket.close(linger=0)
+
+    async def __serve(self, router):
+        while True:
+            identity, command, request_id, data = \
+                await router.recv_multipart()
+            recorded = self._answers.get((command, data))
+            if not recorded:
+                await router.send_multipart([
+                    identity, command, request_id, struct.pack(
+                        "<I", pylibbitcoin.error_code.ErrorCode.not_found
+                        .value)])
+                continue
+
+            answer = recorded.popleft() if len(recorded) > 1 \
+                else recorded[0]
+            asyncio.ensure_future(
+                self.__answer(router, identity, command, request_id, answer))
+
+    async def __answer(self, router, identity, command, request_id, answer):
+        elapsed = 0
+        for delay, payload in answer:
+            await self.__sleep(delay - elapsed)
+            elapsed = delay
+            await router.send_multipart(
+                [identity, command, request_id, payload])
+
+    async def __publish(self, publisher, messages):
+        await publisher.recv_multipart()
+        elapsed = 0
+        for timestamp, frames in messages:
+            await self.__sleep(timestamp - elapsed)
+            elapsed = timestamp
+            await publisher.send_multipart(frames)
+
+    async def __sleep(self, seconds):
+        if self._speed is None:
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(max(0, seconds) / self._speed)
@@ -0,0 +1,126 @@
+"""
+Scanning of serialized transactions and blocks without deserializing them.
+
+Offsets are into `data`, which can be bytes or a memoryview. Hashes are in
+internal byte order.
+"""
+import hashlib
+import struct
+
+HEADER_SIZE = 80
+
+
+def double_sha256(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def read_varint(data, offset):
+    """Returns the value of the compact size integer at `offset` and the
+    offset following it."""
+    first = data[offset]
+    if first < 0xfd:
+        return first, offset + 1
+    if first == 0xfd:
+        return struct.unpack_from("<H", data, offset + 1)[0], offset + 3
+    if first == 0xfe:
+        return struct.unpack_from("<I", data, offset + 1)[0], offset + 5
+    return struct.unpack_from("<Q", data, offset + 1)[0], offset + 9
+
+
+def write_varint(value):
+    """The compact size serialization of `value`."""
+    if value < 0xfd:
+        return bytes([value])
+    if value <= 0xffff:
+        return b"\xfd" + struct.pack("<H", value)
+    if value <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", value)
+    return b"\xff" + struct.pack("<Q", value)
+
+
+def scan_transaction(data, offset=0):
+    """Returns the end offset and the txid of the transaction at `offset`."""
+    end, txid, _, _ = parse_transaction(data, offset)
+    return end, txid
+
+
+def parse_transaction(data, offset=0):
+    """
+    Returns (end offset, txid, spent outpoints, outputs) for the transaction
+    at `offset`. Spent outpoints are (hash, index) tuples and outputs are
+    (value, script) tuples where `script` is a slice of `data`.
+    """
+    start = offset
+    offset += 4
+    segwit = data[offset] == 0 and data[offset + 1] != 0
+    if segwit:
+        offset += 2
+    body_start = offset
+
+    inputs, offset = read_varint(data, offset)
+    spent = []
+    for _ in range(inputs):
+        spent.append((
+            bytes(data[offset:offset + 32]),
+            struct.unpack_from("<I", data, offset + 32)[0]))
+        length, offset = read_varint(data, offset + 36)
+        offset += length + 4
+
+    count, offset = read_varint(data, offset)
+    outputs = []
+    for _ in range(count):
+        value = struct.unpack_from("<q", data, offset)[0]
+        length, offset = read_varint(data, offset + 8)
+        outputs.append((value, data[offset:offset + length]))
+        offset += length
+    body_end = offset
+
+    if segwit:
+        for _ in range(inputs):
+            items, offset = read_varint(data, offset)
+            for _ in range(items):
+                length, offset = read_varint(data, offset)
+                offset += length
+    end = offset + 4
+
+    if segwit:
+        sha = hashlib.sha256(data[start:start + 4])
+        sha.update(data[body_start:body_end])
+        sha.update(data[end - 4:end])
+        txid = hashlib.sha256(sha.digest()).digest()
+    else:
+        txid = double_sha256(data[start:end])
+    return end, txid, spent, outputs
+
+
+def iter_block_transactions(block_data):
+    """Yields the (start offset, end offset, txid) of every transaction in a
+    serialized block."""
+    count, offset = read_varint(block_data, HEADER_SIZE)
+    for _ in range(count):
+        end, txid = scan_transaction(block_data, offset)
+        yield offset, end, txid
+        offset = end
+
+
+def block_txids(block_data):
+    return [txid for _, _, txid in iter_block_transactions(block_data)]
+
+
+class LazyTransaction:
+    """A serialized transaction which is only deserialized on first access of
+    `transaction`."""
+
+    __slots__ = ("raw", "txid", "_transaction")
+
+    def __init__(self, raw, txid=None):
+        self.raw = bytes(raw)
+        self.txid = txid if txid is not None else scan_transaction(raw)[1]
+        self._transaction = None
+
+    @property
+    def transaction(self):
+        if self._transaction is None:
+            import bitcoin.core
+            self._transaction = bitcoin.core.CTransaction.deserialize(self.raw)
+        return self._transaction
@@ -0,0 +1,142 @@
+import asyncio
+import collections
+
+import pylibbitcoin.client
+import pylibbitcoin.error_code
+import pylibbitcoin.primitives
+import pylibbitcoin.scan
+
+
+def merkle_proof(levels, index):
+    """The sibling hashes from the leaf at `index` up to (not including)
+    the root of the tree given by `merkle_levels()`."""
+    branch = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        branch.append(level[sibling] if sibling < len(level) else level[index])
+        index //= 2
+    return branch
+
+
+def branch_root(txid, index, branch):
+    """The merkle root committed to by `txid` at `index` with `branch`."""
+    hash_ = txid
+    for sibling in branch:
+        if index & 1:
+            hash_ = pylibbitcoin.scan.double_sha256(sibling + hash_)
+        else:
+            hash_ = pylibbitcoin.scan.double_sha256(hash_ + sibling)
+        index //= 2
+    return hash_
+
+
+class InclusionVerifier:
+    """
+    Proves that transactions are confirmed.
+
+    A proof takes the transaction's position from `transaction_index()`,
+    the block's header and txids, and checks that the txid hashes up to the
+    merkle root in the header. The merkle levels of the last `cache_size`
+    blocks are kept, so further proofs in a block need no requests and only
+    the hashing of one branch.
+
+    This only shows a transaction is in the block with that header; whether
+    the header is on the best chain is for a header chain (see
+    pylibbitcoin.header_store) to tell.
+
+    Proofs are dictionaries:
+        {"height", "index", "header": CBlockHeader, "branch": [hashes]}
+    """
+
+    def __init__(self, client, cache_size=1000):
+        self._client = client
+        self._cache_size = cache_size
+        self._blocks = collections.OrderedDict()  # height -> header, levels
+
+    async def verify_inclusion(self, txid):
+        """Returns the error code and the proof for `txid` (a hex string, a
+        Hash32 or bytes in internal order). `ErrorCode.merkle_mismatch`
+        means the server's answers contradict each other."""
+        txid = pylibbitcoin.primitives.internal_bytes(txid)
+        error_code, position = await self._client.transaction_index(txid)
+        if error_code:
+            return error_code, None
+        height, index = position
+
+        error_code, block = await self.__block(height)
+        if error_code:
+            return error_code, None
+        return self.__prove(txid, height, index, *block)
+
+    async def verify_inclusion_many(self, txids):
+        """Proves several transactions, fetching each block once. Returns a
+        dictionary of txid (as given) -> (error code, proof)."""
+        hashes = [pylibbitcoin.primitives.internal_bytes(txid)
+                  for txid in txids]
+        positions = await asyncio.gather(
+            *[self._client.transaction_index(hash_) for hash_ in hashes])
+
+        by_height = collections.defaultdict(list)
+        results = {}
+        for txid, hash_, (error_code, position) in \
+                zip(txids, hashes, positions):
+            if error_code:
+                results[txid] = error_code, None
+            else:
+                by_height[position[0]].append((txid, hash_, position[1]))
+
+        heights = list(by_height)
+        blocks = await asyncio.gather(
+            *[self.__block(height) for height in heights])
+        for height, (error_code, block) in zip(heights, blocks):
+            for txid, hash_, index in by_height[height]:
+                results[txid] = (error_code, None) if error_code \
+                    else self.__prove(hash_, height, index, *block)
+        return results
+
+    def forget(self, from_height):
+        """Drops the cached blocks from `from_height` up, after a reorg."""
+        for height in [height for height in self._blocks
+                       if height >= from_height]:
+            del self._blocks[height]
+
+    def __prove(self, txid, height, index, header, levels):
+        leaves = levels[0]
+        if index >= len(leaves) or leaves[index] != txid:
+            return pylibbitcoin.error_code.ErrorCode.merkle_mismatch, None
+
+        branch = merkle_proof(levels, index)
+        if branch_root(txid, index, branch) != header.hashMerkleRoot:
+            return pylibbitcoin.error_code.ErrorCode.merkle_mismatch, None
+
+        return None, {
+            "height": height,
+            "index": index,
+            "header": header,
+            "branch": branch,
+        }
+
+    async def __block(self, height):
+        block = self._blocks.get(height)
+        if block is not None:
+            self._blocks.move_to_end(height)
+            return None, block
+
+        (error_code, header), (hashes_error_code, hashes) = \
+            await asyncio.gather(
+                self._client.block_header(height),
+                self._client.block_transaction_hashes(height))
+        error_code = error_code or hashes_error_code
+        if error_code:
+            return error_code, None
+
+        levels = pylibbitcoin.client.merkle_levels(
+            [hash_ for hash_, in hashes])
+        if not levels or levels[-1][0] != header.hashMerkleRoot:
+            return pylibbitcoin.error_code.ErrorCode.merkle_mismatch, None
+
+        block = header, levels
+        self._blocks[height] = block
+        if len(self._blocks) > self._cache_size:
+            self._blocks.popitem(last=False)
+        return None, block
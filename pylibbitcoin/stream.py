@@ -0,0 +1,129 @@
+import asyncio
+import collections
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_COALESCE = "coalesce"
+
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE)
+
+
+class SequenceTracker:
+    """Counts gaps in the 16 bit sequence numbers of a publisher."""
+
+    def __init__(self):
+        self.last = None
+        self.gaps = 0
+        self.missed = 0
+
+    def update(self, sequence):
+        """Returns the number of messages missed before `sequence`."""
+        missed = 0
+        if self.last is not None:
+            expected = (self.last + 1) & 0xffff
+            missed = (sequence - expected) & 0xffff
+            if missed:
+                self.gaps += 1
+                self.missed += missed
+        self.last = sequence
+        return missed
+
+
+class SeenFilter:
+    """
+    Remembers the last `capacity` hashes it was given.
+
+    Only the first 8 bytes of each hash are kept (as an int), which is plenty
+    to tell transactions apart and keeps the filter small.
+    """
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._seen = set()
+        self._order = collections.deque()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def __contains__(self, hash_):
+        return int.from_bytes(hash_[:8], "little") in self._seen
+
+    def add(self, hash_):
+        """Returns False if `hash_` was seen before."""
+        key = int.from_bytes(hash_[:8], "little")
+        if key in self._seen:
+            return False
+
+        self._seen.add(key)
+        self._order.append(key)
+        if len(self._order) > self._capacity:
+            self._seen.discard(self._order.popleft())
+        return True
+
+
+class BoundedQueue(asyncio.Queue):
+    """
+    An asyncio.Queue with a policy for when it is full.
+
+    overflow -- one of
+        "block": `put()` waits for room, the producer is slowed down.
+        "drop_oldest": the oldest item is dropped to make room.
+        "coalesce": every queued item is dropped, only the latest is kept.
+
+    `dropped` counts the items dropped, `sequence` tracks the sequence numbers
+    of the stream feeding the queue.
+
+    `get_many()` and `batches()` hand out the queued items in lists, so a
+    fast stream costs one wakeup per batch instead of one per item.
+    """
+
+    def __init__(self, maxsize=0, overflow=OVERFLOW_BLOCK, *, loop=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy %s" % overflow)
+        super().__init__(maxsize, loop=loop)
+        self._overflow = overflow
+        self.dropped = 0
+        self.sequence = SequenceTracker()
+
+    async def put(self, item):
+        if self._overflow == OVERFLOW_BLOCK:
+            await super().put(item)
+        else:
+            self.put_nowait(item)
+
+    def put_nowait(self, item):
+        if self.full() and self._overflow != OVERFLOW_BLOCK:
+            drop = 1 if self._overflow == OVERFLOW_DROP_OLDEST \
+                else self.qsize()
+            for _ in range(drop):
+                self.get_nowait()
+                self.task_done()
+            self.dropped += drop
+        super().put_nowait(item)
+
+    async def get_many(self, max_items=100, max_wait=None):
+        """Waits for an item and returns a list of it and the items queued
+        after it, at most `max_items`. With `max_wait` (in seconds), waits up
+        to that long after the first item for the list to fill up."""
+        items = [await self.get()]
+        loop = asyncio.get_event_loop()
+        deadline = None if max_wait is None else loop.time() + max_wait
+        while len(items) < max_items:
+            if not self.empty():
+                items.append(self.get_nowait())
+                continue
+            if deadline is None:
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def batches(self, max_items=100, max_wait=None):
+        """An async iterator over `get_many()` lists."""
+        while True:
+            yield await self.get_many(max_items, max_wait)
@@ -0,0 +1,183 @@
+import asyncio
+
+import pylibbitcoin.client
+import pylibbitcoin.error_code
+
+
+class _Route:
+    """Stands in for the queue of a subscription request and hands its
+    notifications to the dispatcher."""
+
+    __slots__ = ("_dispatcher", "_address_hash")
+
+    def __init__(self, dispatcher, address_hash):
+        self._dispatcher = dispatcher
+        self._address_hash = address_hash
+
+    def put_nowait(self, notification):
+        self._dispatcher._dispatch(self._address_hash, notification)
+
+
+class AddressSubscriptions:
+    """
+    Manages address subscriptions for large sets of addresses.
+
+    Each address is subscribed to once on the server no matter how many
+    consumers watch it. Notifications are routed by address hash to every
+    consumer queue watching that address as
+    (address hash, sequence, height, transaction hash) tuples.
+
+    Subscribe and unsubscribe requests are sent in batches of `batch_size`
+    concurrent requests, at no more than `rate` requests per second.
+
+    Consumer queues are asyncio.Queues or pylibbitcoin.stream.BoundedQueues.
+    Notifications are put without waiting, from the client's receive loop:
+    the drop_oldest and coalesce policies of a BoundedQueue make room, any
+    other full queue misses the notification, counted in `dropped`.
+    """
+
+    def __init__(self, client, batch_size=100, rate=1000):
+        self._client = client
+        self._batch_size = batch_size
+        self._rate = rate
+        # address hash -> tuple of consumer queues
+        self._consumers = {}
+        # address hash -> future of the error code of its server subscription
+        self._pending = {}
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._consumers)
+
+    def __contains__(self, address):
+        return pylibbitcoin.client.decode_address(address) in self._consumers
+
+    async def subscribe(self, addresses, queue):
+        """Routes notifications for `addresses` to `queue`.
+        Returns a dictionary of address -> error code for the addresses which
+        couldn't be subscribed to.
+
+        Addresses whose server subscription is still being made by another
+        call wait for it, and fail with it."""
+        to_subscribe = []
+        to_wait = []
+        for address in addresses:
+            address_hash = pylibbitcoin.client.decode_address(address)
+            consumers = self._consumers.get(address_hash)
+            if consumers is None:
+                # Registered before subscribing so notifications racing the
+                # confirmation aren't lost.
+                self._consumers[address_hash] = (queue,)
+                self._pending[address_hash] = \
+                    asyncio.get_event_loop().create_future()
+                to_subscribe.append((address, address_hash))
+                continue
+
+            if queue not in consumers:
+                self._consumers[address_hash] = consumers + (queue,)
+            if address_hash in self._pending:
+                to_wait.append((address, address_hash))
+
+        async def subscribe_one(address_hash):
+            error_code = await self._client._subscribe_address_hash(
+                address_hash, _Route(self, address_hash))
+            self.__settle(address_hash, error_code, queue)
+            return error_code
+
+        try:
+            failures = await self.__batched(subscribe_one, to_subscribe)
+        finally:
+            # Subscriptions left unmade, if this call was cancelled.
+            for _, address_hash in to_subscribe:
+                self.__settle(
+                    address_hash,
+                    pylibbitcoin.error_code.ErrorCode.operation_failed,
+                    queue)
+
+        for address, address_hash in to_wait:
+            pending = self._pending.get(address_hash)
+            if pending is None:
+                continue
+            error_code = await asyncio.shield(pending)
+            if error_code:
+                self.__remove(address_hash, queue)
+                failures[address] = error_code
+        return failures
+
+    async def unsubscribe(self, addresses, queue):
+        """Stops routing notifications for `addresses` to `queue`. The server
+        subscription is dropped once no consumer is left; if that fails,
+        `queue` keeps getting the address' notifications.
+        Returns a dictionary of address -> error code for failures."""
+        to_unsubscribe = []
+        for address in addresses:
+            address_hash = pylibbitcoin.client.decode_address(address)
+            consumers = self._consumers.get(address_hash)
+            if consumers is None or queue not in consumers:
+                continue
+
+            if not self.__remove(address_hash, queue):
+                to_unsubscribe.append((address, address_hash))
+
+        async def unsubscribe_one(address_hash):
+            error_code, _ = await self._client._unsubscribe_address_hash(
+                address_hash)
+            if error_code:
+                # The server subscription is still there.
+                consumers = self._consumers.get(address_hash, ())
+                self._consumers[address_hash] = (queue,) + consumers
+            return error_code
+
+        return await self.__batched(unsubscribe_one, to_unsubscribe)
+
+    def _dispatch(self, address_hash, notification):
+        item = (address_hash,) + notification
+        for queue in self._consumers.get(address_hash, ()):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def __remove(self, address_hash, queue):
+        """Removes `queue` from the consumers of `address_hash`, returns the
+        remaining consumers."""
+        remaining = tuple(
+            consumer for consumer in self._consumers.get(address_hash, ())
+            if consumer is not queue)
+        if remaining:
+            self._consumers[address_hash] = remaining
+        else:
+            self._consumers.pop(address_hash, None)
+        return remaining
+
+    def __settle(self, address_hash, error_code, queue):
+        pending = self._pending.pop(address_hash, None)
+        if pending is None:
+            return
+        if not self._pending:
+            # Dictionaries don't shrink; let a large batch's table go.
+            self._pending = {}
+        pending.set_result(error_code)
+        if error_code:
+            self.__remove(address_hash, queue)
+
+    async def __batched(self, coroutine_function, addresses):
+        loop = asyncio.get_event_loop()
+        failures = {}
+
+        for start in range(0, len(addresses), self._batch_size):
+            batch = addresses[start:start + self._batch_size]
+            started = loop.time()
+            error_codes = await asyncio.gather(*[
+                coroutine_function(address_hash)
+                for _, address_hash in batch
+            ])
+            for (address, _), error_code in zip(batch, error_codes):
+                if error_code:
+                    failures[address] = error_code
+
+            remaining = len(batch) / self._rate - (loop.time() - started)
+            if remaining > 0 and start + self._batch_size < len(addresses):
+                await asyncio.sleep(remaining)
+
+        return failures
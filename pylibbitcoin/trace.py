@@ -0,0 +1,112 @@
+import collections
+import cProfile
+import json
+import pstats
+import time
+
+# The stages of a request, in the order they happen.
+STAGES = ("created", "sent", "received", "matched", "delivered", "decoded")
+
+
+class Tracer:
+    """
+    Timestamps the stages of requests into a ring buffer of the last `size`
+    events.
+
+    created -- the Request object is made.
+    sent -- `send_multipart()` returned.
+    received -- the response came out of `recv_multipart()`.
+    matched -- the response was parsed and handed to its request.
+    delivered -- the coroutine waiting for the response resumed.
+    decoded -- the response data was decoded.
+
+    The time between "matched" and "delivered" is the event loop's backlog.
+    Give a Tracer to `ClientSettings.tracer` to enable tracing.
+    """
+
+    def __init__(self, size=100_000, clock=time.perf_counter):
+        self._events = collections.deque(maxlen=size)
+        self.clock = clock
+
+    def record(self, request, stage, timestamp=None):
+        self._events.append((
+            request.id_, request.command, stage,
+            self.clock() if timestamp is None else timestamp))
+
+    def __len__(self):
+        return len(self._events)
+
+    def clear(self):
+        self._events.clear()
+
+    def requests(self):
+        """The traced requests as a list of {"id", "command", "stages"}
+        dictionaries, "stages" mapping stage -> timestamp in seconds."""
+        requests = collections.OrderedDict()
+        for id_, command, stage, timestamp in self._events:
+            request = requests.get(id_)
+            if request is None or stage == "created":
+                request = requests[id_] = {
+                    "id": id_,
+                    "command": command.decode(),
+                    "stages": {},
+                }
+                # A reused request id starts a new request.
+                requests.move_to_end(id_)
+            request["stages"][stage] = timestamp
+        return list(requests.values())
+
+    def to_json(self):
+        return json.dumps(self.requests())
+
+    def to_chrome_trace(self):
+        """The trace in the Chrome trace event format (chrome://tracing or
+        Perfetto): one row per request, one span per stage, each span
+        starting at the previous stage."""
+        events = []
+        for request in self.requests():
+            stages = sorted(request["stages"].items(),
+                            key=lambda stage: stage[1])
+            for (_, start), (stage, end) in zip(stages, stages[1:]):
+                events.append({
+                    "name": stage,
+                    "cat": request["command"],
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": 0,
+                    "tid": request["id"],
+                })
+        return json.dumps({"traceEvents": events})
+
+
+class Profiler:
+    """
+    Profiles one in `sample_every` calls made through `call()` with
+    cProfile. Give a Profiler to `ClientSettings.profiler` to sample the
+    decoding of responses and stream messages.
+    """
+
+    def __init__(self, sample_every=100):
+        self._sample_every = sample_every
+        self._calls = 0
+        self._profile = cProfile.Profile()
+        self.samples = 0
+
+    def call(self, function, *args):
+        self._calls += 1
+        if self._calls % self._sample_every:
+            return function(*args)
+
+        self.samples += 1
+        self._profile.enable()
+        try:
+            return function(*args)
+        finally:
+            self._profile.disable()
+
+    def stats(self):
+        return pstats.Stats(self._profile)
+
+    def dump(self, path):
+        self._profile.dump_stats(path)
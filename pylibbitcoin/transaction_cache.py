@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    hash BLOB PRIMARY KEY,
+    raw BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (id, size) VALUES (0, 0);
+"""
+
+
+class TransactionCache:
+    """
+    A persistent cache of raw transactions keyed by their hash (internal byte
+    order).
+
+    Transactions are stored in an append-only sqlite table; when the total
+    size of the stored transactions exceeds `max_size` bytes the oldest ones
+    are evicted first. The database runs in WAL mode so any number of readers,
+    in this or other processes, can read while a writer appends.
+    Each thread gets its own connection.
+    """
+
+    def __init__(self, path, max_size=1 << 30):
+        self._path = path
+        self._max_size = max_size
+        self._local = threading.local()
+
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+
+    def get(self, hash_, deserialize=False):
+        """Returns the raw transaction (or a CTransaction when `deserialize`
+        is set), None if it isn't cached."""
+        row = self._connection().execute(
+            "SELECT raw FROM transactions WHERE hash = ?",
+            (bytes(hash_),)).fetchone()
+        if row is None:
+            return None
+        if deserialize:
+            import bitcoin.core
+            return bitcoin.core.CTransaction.deserialize(row[0])
+        return row[0]
+
+    def __contains__(self, hash_):
+        return self._connection().execute(
+            "SELECT 1 FROM transactions WHERE hash = ?",
+            (bytes(hash_),)).fetchone() is not None
+
+    def put(self, hash_, raw):
+        if len(raw) > self._max_size:
+            return
+
+        with self._connection() as connection:
+            inserted = connection.execute(
+                "INSERT OR IGNORE INTO transactions (hash, raw, size) "
+                "VALUES (?, ?, ?)",
+                (bytes(hash_), bytes(raw), len(raw))).rowcount
+            if not inserted:
+                return
+            connection.execute(
+                "UPDATE meta SET size = size + ? WHERE id = 0", (len(raw),))
+            self.__evict(connection)
+
+    @property
+    def size(self):
+        """The total size in bytes of the cached transactions."""
+        return self._connection().execute(
+            "SELECT size FROM meta WHERE id = 0").fetchone()[0]
+
+    def __len__(self):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def __evict(self, connection):
+        excess = connection.execute(
+            "SELECT size FROM meta WHERE id = 0").fetchone()[0] \
+            - self._max_size
+        if excess <= 0:
+            return
+
+        freed = 0
+        last_rowid = None
+        rows = connection.execute(
+            "SELECT rowid, size FROM transactions ORDER BY rowid")
+        for rowid, size in rows:
+            freed += size
+            last_rowid = rowid
+            if freed >= excess:
+                break
+        rows.close()
+
+        connection.execute(
+            "DELETE FROM transactions WHERE rowid <= ?", (last_rowid,))
+        connection.execute(
+            "UPDATE meta SET size = size - ? WHERE id = 0", (freed,))
@@ -0,0 +1,207 @@
+"""
+Header chain validation: linkage, proof of work and difficulty retargeting.
+
+Headers are handled serialized, as consecutive 80-byte records. Hashing and
+the proof of work checks of long ranges are split over processes; the checks
+which depend on the previous headers run over the hashes afterwards.
+"""
+import concurrent.futures
+import hashlib
+import itertools
+import os
+import struct
+
+import pylibbitcoin.error_code
+import pylibbitcoin.header_store
+
+HEADER_SIZE = 80
+
+# version, previous hash, merkle root, time, bits, nonce
+_HEADER = struct.Struct("<I32s32sIII")
+
+MAINNET_POW_LIMIT = (1 << 224) - 1
+REGTEST_POW_LIMIT = 0x7fffff << 232
+
+MEDIAN_TIME_SPAN = 11
+
+
+def bits_to_target(bits):
+    """The target encoded by compact `bits`, None if the encoding is
+    negative, zero or overflows."""
+    size = bits >> 24
+    word = bits & 0x007fffff
+    if size <= 3:
+        target = word >> 8 * (3 - size)
+    else:
+        target = word << 8 * (size - 3)
+
+    if target == 0 or (word and bits & 0x00800000):
+        return None
+    if word and (size > 34 or (word > 0xff and size > 33)
+                 or (word > 0xffff and size > 32)):
+        return None
+    return target
+
+
+def target_to_bits(target):
+    """The compact encoding of `target`."""
+    size = (target.bit_length() + 7) // 8
+    if size <= 3:
+        compact = target << 8 * (3 - size)
+    else:
+        compact = target >> 8 * (size - 3)
+    # The sign bit must stay clear.
+    if compact & 0x00800000:
+        compact >>= 8
+        size += 1
+    return compact | size << 24
+
+
+def retarget(bits, first_time, last_time, target_timespan, pow_limit):
+    """The bits expected after a retarget period which started at
+    `first_time` and ended at `last_time` with `bits`."""
+    timespan = min(max(last_time - first_time, target_timespan // 4),
+                   target_timespan * 4)
+    target = bits_to_target(bits) * timespan // target_timespan
+    return target_to_bits(min(target, pow_limit))
+
+
+def check_proof_of_work(headers, pow_limit):
+    """Hashes serialized `headers` and checks each hash against its bits.
+    Returns the concatenated hashes and the index of the first header failing
+    the check (None if they all pass)."""
+    hashes = bytearray()
+    first_failure = None
+    targets = {}
+    sha256 = hashlib.sha256
+    for index, offset in enumerate(range(0, len(headers), HEADER_SIZE)):
+        hash_ = sha256(
+            sha256(headers[offset:offset + HEADER_SIZE]).digest()).digest()
+        hashes += hash_
+        if first_failure is not None:
+            continue
+
+        bits = struct.unpack_from("<I", headers, offset + 72)[0]
+        target = targets.get(bits)
+        if target is None:
+            target = targets[bits] = bits_to_target(bits) or -1
+        if not 0 < target <= pow_limit \
+                or int.from_bytes(hash_, "little") > target:
+            first_failure = index
+    return bytes(hashes), first_failure
+
+
+class HeaderValidator:
+    """
+    Validates ranges of serialized headers.
+
+    A range starting above height 0 needs the headers before it for the
+    linkage, retarget and median time checks; `earlier` is anything with a
+    `header(height)` method, such as a pylibbitcoin.header_store.HeaderStore.
+
+    The defaults are mainnet's rules (testnet's minimum difficulty exception
+    isn't supported); use `retarget=False` and `REGTEST_POW_LIMIT` for
+    regtest.
+    """
+
+    def __init__(self, pow_limit=MAINNET_POW_LIMIT, retarget_interval=2016,
+                 target_timespan=14 * 24 * 60 * 60, retarget=True,
+                 processes=None, chunk_size=50_000):
+        self._pow_limit = pow_limit
+        self._retarget_interval = retarget_interval
+        self._target_timespan = target_timespan
+        self._retarget = retarget
+        self._processes = processes or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+
+    def validate(self, headers, start_height=0, earlier=None):
+        """Validates serialized `headers`, the first one being at
+        `start_height`. Returns (error code, height of the first invalid
+        header), (None, None) if they are all valid.
+
+        previous_block_invalid -- a header doesn't link to the one before.
+        proof_of_work -- a hash doesn't meet its bits, or the bits are
+            invalid or above the proof of work limit.
+        incorrect_proof_of_work -- the bits aren't the ones expected.
+        timestamp_too_early -- a timestamp isn't above the median time of
+            the previous 11 blocks.
+        """
+        headers = memoryview(headers).cast("B")
+        count = len(headers) // HEADER_SIZE
+        hashes, pow_failure = self.__check_proof_of_work(
+            headers[:count * HEADER_SIZE])
+
+        def header_at(height):
+            index = height - start_height
+            if index >= 0:
+                return headers[index * HEADER_SIZE:(index + 1) * HEADER_SIZE]
+            return earlier.header(height)
+
+        ErrorCode = pylibbitcoin.error_code.ErrorCode
+        previous_hash = previous_bits = None
+        times = []
+        if start_height > 0:
+            previous = bytes(header_at(start_height - 1))
+            previous_hash = pylibbitcoin.header_store.header_hash(previous)
+            previous_bits = _HEADER.unpack(previous)[4]
+            times = [
+                _HEADER.unpack(bytes(header_at(height)))[3]
+                for height in range(
+                    max(0, start_height - MEDIAN_TIME_SPAN), start_height)
+            ]
+
+        fields = _HEADER.iter_unpack(headers[:count * HEADER_SIZE])
+        for index, (_, previous_block, _, time, bits, _) in enumerate(fields):
+            height = start_height + index
+            if height > 0:
+                if previous_block != previous_hash:
+                    return ErrorCode.previous_block_invalid, height
+                if bits != self.__expected_bits(
+                        height, previous_bits, header_at):
+                    return ErrorCode.incorrect_proof_of_work, height
+                if times and time <= sorted(times)[len(times) // 2]:
+                    return ErrorCode.timestamp_too_early, height
+            if index == pow_failure:
+                return ErrorCode.proof_of_work, height
+
+            previous_hash = hashes[index * 32:(index + 1) * 32]
+            previous_bits = bits
+            times.append(time)
+            if len(times) > MEDIAN_TIME_SPAN:
+                del times[0]
+        return None, None
+
+    def validate_store(self, store, start_height=0):
+        """Validates the headers of a HeaderStore from `start_height` up."""
+        return self.validate(
+            store.headers(start_height, len(store)), start_height, store)
+
+    def __expected_bits(self, height, previous_bits, header_at):
+        if not self._retarget or height % self._retarget_interval:
+            return previous_bits
+
+        first = _HEADER.unpack(
+            bytes(header_at(height - self._retarget_interval)))
+        last = _HEADER.unpack(bytes(header_at(height - 1)))
+        return retarget(previous_bits, first[3], last[3],
+                        self._target_timespan, self._pow_limit)
+
+    def __check_proof_of_work(self, headers):
+        chunk = self._chunk_size * HEADER_SIZE
+        if self._processes == 1 or len(headers) <= chunk:
+            return check_proof_of_work(headers, self._pow_limit)
+
+        chunks = [bytes(headers[offset:offset + chunk])
+                  for offset in range(0, len(headers), chunk)]
+        with concurrent.futures.ProcessPoolExecutor(self._processes) \
+                as executor:
+            results = list(executor.map(
+                check_proof_of_work, chunks,
+                itertools.repeat(self._pow_limit)))
+
+        failure = next(
+            (number * self._chunk_size + first_failure
+             for number, (_, first_failure) in enumerate(results)
+             if first_failure is not None),
+            None)
+        return b"".join(hashes for hashes, _ in results), failure
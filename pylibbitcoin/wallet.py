@@ -0,0 +1,196 @@
+import asyncio
+
+import pylibbitcoin.client
+import pylibbitcoin.scan
+import pylibbitcoin.watch
+
+
+class WalletState:
+    """
+    The outputs of a set of addresses, kept current in memory.
+
+    Each address's history is loaded once with `history3()`; transactions
+    from address notifications, the transaction stream and the block stream
+    are then applied incrementally. Balances are maintained as totals so
+    `balance()` is O(1).
+
+    Entries have the shape of the `history3()` rows:
+        {"received": {"hash", "height", "index"}, "value", ["spent": {...}]}
+    with height 0 for unconfirmed transactions.
+    """
+
+    def __init__(self):
+        self._addresses = {}  # address -> hash160
+        self._entries = {}  # (hash, index) -> entry
+        self._owners = {}  # (hash, index) -> hash160
+        self._balances = {}  # hash160 -> unspent value
+        self._total = 0
+        self._height = None
+
+    @property
+    def height(self):
+        """The height of the last block applied."""
+        return self._height
+
+    async def load(self, client, addresses):
+        """Loads the history of `addresses`. Returns a dictionary of
+        address -> error code for the ones that failed to load."""
+        results = await asyncio.gather(
+            *[client.history3(address) for address in addresses])
+
+        failures = {}
+        for address, (error_code, history) in zip(addresses, results):
+            if error_code:
+                failures[address] = error_code
+                continue
+            self.__load_history(address, history)
+        return failures
+
+    def balance(self, address=None):
+        if address is None:
+            return self._total
+        return self._balances.get(self._addresses.get(address), 0)
+
+    def unspent(self, address=None):
+        hash160 = None if address is None else self._addresses.get(address)
+        return [
+            entry for outpoint, entry in self._entries.items()
+            if "spent" not in entry
+            and (address is None or self._owners[outpoint] == hash160)
+        ]
+
+    def apply_transaction(self, data, height=0):
+        """Applies a serialized transaction seen in the memory pool (height
+        0) or confirmed at `height`. Returns True if it concerns the
+        wallet."""
+        _, txid, spent, outputs = pylibbitcoin.scan.parse_transaction(data)
+        relevant = False
+
+        for index, outpoint in enumerate(spent):
+            entry = self._entries.get(outpoint)
+            if entry is None:
+                continue
+            relevant = True
+            if "spent" not in entry:
+                self.__add_to_balance(self._owners[outpoint], -entry["value"])
+            entry["spent"] = {"hash": txid, "height": height, "index": index}
+
+        for index, (value, script) in enumerate(outputs):
+            hash160 = pylibbitcoin.watch.script_hash160(script)
+            if hash160 is None or hash160 not in self._balances:
+                continue
+            relevant = True
+            entry = self._entries.get((txid, index))
+            if entry is None:
+                self.__add_entry(hash160, {
+                    "received": {"hash": txid, "height": height,
+                                 "index": index},
+                    "value": value,
+                })
+            else:
+                entry["received"]["height"] = height
+
+        return relevant
+
+    async def apply_notification(self, client, notification):
+        """Applies an address notification, a (sequence, height, transaction
+        hash) tuple as queued by `Client.subscribe_address()`."""
+        _, height, tx_hash = notification[-3:]
+        if height:
+            error_code, transaction = await client.transaction(
+                tx_hash[::-1].hex())
+        else:
+            error_code, transaction = await client.mempool_transaction(
+                tx_hash[::-1].hex())
+        if error_code:
+            return error_code
+
+        self.apply_transaction(transaction.serialize(), height)
+        return None
+
+    def apply_block(self, height, block_data):
+        """Applies a serialized block, rolling back first if it replaces a
+        block we applied before."""
+        if self._height is not None and height <= self._height:
+            self.rollback(height - 1)
+
+        for start, end, _ in \
+                pylibbitcoin.scan.iter_block_transactions(block_data):
+            self.apply_transaction(block_data[start:end], height)
+        self._height = height
+
+    def rollback(self, fork_height):
+        """Undoes everything confirmed above `fork_height`."""
+        for outpoint, entry in list(self._entries.items()):
+            spent = entry.get("spent")
+            if spent is not None and spent["height"] > fork_height:
+                del entry["spent"]
+                self.__add_to_balance(self._owners[outpoint], entry["value"])
+
+            if entry["received"]["height"] > fork_height:
+                if "spent" not in entry:
+                    self.__add_to_balance(
+                        self._owners[outpoint], -entry["value"])
+                del self._entries[outpoint]
+                del self._owners[outpoint]
+
+        if self._height is not None:
+            self._height = min(self._height, fork_height)
+
+    async def reconcile(self, client):
+        """Compares the balances with a fresh `history3()` and reloads the
+        addresses which drifted. Returns a dictionary of
+        address -> (balance in memory, balance on the server)."""
+        drifted = {}
+        for address in list(self._addresses):
+            error_code, history = await client.history3(address)
+            if error_code:
+                continue
+
+            expected = sum(
+                entry["value"] for entry in history
+                if "received" in entry and "spent" not in entry)
+            if expected != self.balance(address):
+                drifted[address] = (self.balance(address), expected)
+                self.__drop_address(address)
+                self.__load_history(address, history)
+        return drifted
+
+    async def reconcile_periodically(self, client, interval):
+        """Runs `reconcile()` every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.reconcile(client)
+
+    def __load_history(self, address, history):
+        hash160 = pylibbitcoin.client.decode_address(address)
+        self._addresses[address] = hash160
+        self._balances.setdefault(hash160, 0)
+
+        for entry in history:
+            # A spend without a receive can't affect the balance.
+            if "received" in entry:
+                self.__add_entry(hash160, entry)
+
+    def __drop_address(self, address):
+        hash160 = self._addresses[address]
+        for outpoint, owner in list(self._owners.items()):
+            if owner == hash160:
+                del self._entries[outpoint]
+                del self._owners[outpoint]
+        self._total -= self._balances[hash160]
+        self._balances[hash160] = 0
+
+    def __add_entry(self, hash160, entry):
+        received = entry["received"]
+        outpoint = (bytes(received["hash"]), received["index"])
+        if outpoint in self._entries:
+            return
+        self._entries[outpoint] = entry
+        self._owners[outpoint] = hash160
+        if "spent" not in entry:
+            self.__add_to_balance(hash160, entry["value"])
+
+    def __add_to_balance(self, hash160, value):
+        self._balances[hash160] += value
+        self._total += value
@@ -0,0 +1,162 @@
+import pylibbitcoin.client
+import pylibbitcoin.scan
+import pylibbitcoin.stream
+
+
+def script_hash160(script):
+    """Returns the hash160 paid to by a p2pkh, p2sh or p2wpkh output script,
+    None for any other script."""
+    length = len(script)
+    if length == 25 and script[0] == 0x76 and script[1] == 0xa9 \
+            and script[2] == 0x14 and script[23] == 0x88 \
+            and script[24] == 0xac:
+        return bytes(script[3:23])
+    if length == 23 and script[0] == 0xa9 and script[1] == 0x14 \
+            and script[22] == 0x87:
+        return bytes(script[2:22])
+    if length == 22 and script[0] == 0x00 and script[1] == 0x14:
+        return bytes(script[2:22])
+    return None
+
+
+class BloomFilter:
+    """
+    A Bloom filter for hash160s.
+
+    The hashes are uniformly distributed already, so the bit positions are
+    taken straight from consecutive 4 byte words of the hash (at most 5).
+    """
+
+    def __init__(self, bits, hashes=4):
+        assert 1 <= hashes <= 5
+        self._bits = bits
+        self._hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def __positions(self, hash160):
+        for i in range(self._hashes):
+            yield int.from_bytes(hash160[4 * i:4 * i + 4], "little") \
+                % self._bits
+
+    def add(self, hash160):
+        for position in self.__positions(hash160):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, hash160):
+        array = self._array
+        return all(
+            array[position >> 3] & (1 << (position & 7))
+            for position in self.__positions(hash160))
+
+
+class WatchSet:
+    """
+    Matches transactions and blocks against a set of watched addresses
+    without deserializing them.
+
+    Outputs paying to a watched hash160 are reported as
+        ("receive", hash160, txid, output index, value)
+    and the outpoint is watched from then on, so spending it is reported as
+        ("spend", hash160, (spent hash, spent index), txid, input index)
+
+    Memory pool transactions are usually seen again when a block confirms
+    them. The events of a transaction are reported once, the first time it
+    is scanned; the txids of the last `seen` reported transactions are
+    remembered for this. A spent outpoint stays watched until a block
+    spends it, so a conflicting transaction confirming instead of the one
+    from the memory pool is reported as well. Pass `confirmed=True` to
+    `scan_transaction()` for transactions from blocks, `scan_block()` does.
+
+    For sets of millions of addresses kept outside of this process, pass a
+    BloomFilter as `prefilter` and a `contains` function for the exact check;
+    only prefilter hits are then checked exactly. The hash160s are then only
+    added to the prefilter.
+    """
+
+    def __init__(self, prefilter=None, contains=None, seen=100_000):
+        self._hashes = set()
+        self._outpoints = {}
+        self._reported = pylibbitcoin.stream.SeenFilter(seen)
+        self._prefilter = prefilter
+        self._contains = contains or self._hashes.__contains__
+        self._external = contains is not None
+
+    def __len__(self):
+        """The number of hash160s held in this process."""
+        return len(self._hashes)
+
+    def __contains__(self, address):
+        return self.is_watched(pylibbitcoin.client.decode_address(address))
+
+    def add(self, address):
+        """Either a p2sh or p2pkh address is acceptable."""
+        self.add_hash160(pylibbitcoin.client.decode_address(address))
+
+    def add_hash160(self, hash160):
+        if not self._external:
+            self._hashes.add(bytes(hash160))
+        if self._prefilter is not None:
+            self._prefilter.add(hash160)
+
+    def watch_outpoint(self, hash_, index, hash160=None):
+        self._outpoints[(bytes(hash_), index)] = hash160
+
+    def is_watched(self, hash160):
+        if self._prefilter is not None and hash160 not in self._prefilter:
+            return False
+        return self._contains(hash160)
+
+    def scan_transaction(self, data, offset=0, confirmed=False):
+        """Returns the end offset of the transaction at `offset` and the list
+        of events it matches, empty if they were reported already.
+        `confirmed` tells whether the transaction is from a block."""
+        end, txid, spent, outputs = \
+            pylibbitcoin.scan.parse_transaction(data, offset)
+        events = []
+
+        if self._outpoints:
+            for index, outpoint in enumerate(spent):
+                if outpoint not in self._outpoints:
+                    continue
+                hash160 = self._outpoints.pop(outpoint) if confirmed \
+                    else self._outpoints[outpoint]
+                events.append(("spend", hash160, outpoint, txid, index))
+
+        for index, (value, script) in enumerate(outputs):
+            hash160 = script_hash160(script)
+            if hash160 is not None and self.is_watched(hash160):
+                self._outpoints[(txid, index)] = hash160
+                events.append(("receive", hash160, txid, index, value))
+
+        if events and not self._reported.add(txid):
+            return end, []
+        return end, events
+
+    def scan_block(self, block_data):
+        """Returns the events matched by every transaction of a serialized
+        block."""
+        count, offset = pylibbitcoin.scan.read_varint(
+            block_data, pylibbitcoin.scan.HEADER_SIZE)
+        events = []
+        for _ in range(count):
+            offset, matched = self.scan_transaction(
+                block_data, offset, confirmed=True)
+            events.extend(matched)
+        return events
+
+    async def match_blocks(self, queue):
+        """Yields (height, event) for a queue from
+        `Client.subscribe_to_blocks(mode="raw")`."""
+        while True:
+            _, height, block_data = await queue.get()
+            for event in self.scan_block(block_data):
+                yield height, event
+
+    async def match_transactions(self, queue):
+        """Yields events for a queue from
+        `Client.subscribe_to_transactions(mode="raw")`."""
+        while True:
+            _, _, data = await queue.get()
+            _, events = self.scan_transaction(data)
+            for event in events:
+                yield event
@@ -121,7 +121,30 @@ setup(
     #
     #   py_modules=["my_module"],
     #
-    py_modules=["examples/cli", "pylibbitcoin.client", "pylibbitcoin.error_code"],  # Required
+    py_modules=[  # Required
+        "examples/cli",
+        "pylibbitcoin.blocking",
+        "pylibbitcoin.client",
+        "pylibbitcoin.error_code",
+        "pylibbitcoin.header_store",
+        "pylibbitcoin.heartbeat",
+        "pylibbitcoin.history",
+        "pylibbitcoin.mempool",
+        "pylibbitcoin.metrics",
+        "pylibbitcoin.pool",
+        "pylibbitcoin.primitives",
+        "pylibbitcoin.reconstruct",
+        "pylibbitcoin.replay",
+        "pylibbitcoin.scan",
+        "pylibbitcoin.spv",
+        "pylibbitcoin.stream",
+        "pylibbitcoin.subscription",
+        "pylibbitcoin.trace",
+        "pylibbitcoin.transaction_cache",
+        "pylibbitcoin.validation",
+        "pylibbitcoin.wallet",
+        "pylibbitcoin.watch",
+    ],
 
     # This field lists other packages that your project depends on to run.
     # Any package you put here will be installed by pip when your project is
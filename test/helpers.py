@@ -0,0 +1,49 @@
+"""Clients on mocked ZMQ contexts, shared by the tests."""
+import contextlib
+from unittest.mock import patch
+
+from asynctest import CoroutineMock, MagicMock
+import zmq.asyncio
+
+import pylibbitcoin.client
+
+PORTS = {"query": 9091, "block": 9093}
+
+
+def mocked_socket():
+    socket = CoroutineMock()
+    socket.connect.return_value = None
+    socket.send_multipart = CoroutineMock()
+    return socket
+
+
+def mocked_settings(make_socket=None, **kwargs):
+    """ClientSettings on a mocked ZMQ context, with a 0.01 second timeout
+    unless `kwargs` has another. Every socket of the context is one
+    mocked_socket(), or a new one from `make_socket` each time."""
+    context = MagicMock(autospec=zmq.asyncio.Context)
+    if make_socket is None:
+        context.socket.return_value = mocked_socket()
+    else:
+        context.socket.side_effect = lambda *args, **kwargs: make_socket()
+    kwargs.setdefault("timeout", 0.01)
+    return pylibbitcoin.client.ClientSettings(context=context, **kwargs)
+
+
+@contextlib.contextmanager
+def mocked_request_collection():
+    """Clients built in this context get mocked request collections."""
+    with patch("pylibbitcoin.client.RequestCollection") as collection:
+        collection.return_value.stop = CoroutineMock(return_value=0)
+        yield collection
+
+
+def client_with_mocked_socket(ports=PORTS, make_socket=None,
+                              mock_collection=True, **settings):
+    """A Client on a mocked ZMQ context, see `mocked_settings()`. Its request
+    collections are mocks too, unless `mock_collection` is False."""
+    settings = mocked_settings(make_socket, **settings)
+    if not mock_collection:
+        return pylibbitcoin.client.Client('irrelevant', ports, settings)
+    with mocked_request_collection():
+        return pylibbitcoin.client.Client('irrelevant', ports, settings)
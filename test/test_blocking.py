@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import unittest
+
+from pylibbitcoin.blocking import BlockingClient
+
+from .helpers import PORTS, mocked_request_collection, mocked_settings
+
+
+class TestBlockingClient(unittest.TestCase):
+    def setUp(self):
+        settings = mocked_settings()
+        self.context = settings.context
+        with mocked_request_collection():
+            self.blocking = BlockingClient('irrelevant', PORTS, settings)
+
+        self.threads = set()
+
+        async def simple_request(command, data, decode):
+            self.threads.add(threading.current_thread())
+            await asyncio.sleep(0)
+            return None, decode(b"\xe8\x03\x00\x00")
+        self.blocking.client._simple_request = simple_request
+
+    def tearDown(self):
+        self.blocking.close()
+
+    def test_call(self):
+        self.assertEqual(self.blocking.last_height(), (None, 1000))
+        self.assertEqual(self.threads, {self.blocking._thread})
+
+    def test_many_threads_share_the_sockets(self):
+        sockets = self.context.socket.call_count
+        results = []
+
+        def work():
+            for _ in range(10):
+                results.append(self.blocking.last_height())
+        workers = [threading.Thread(target=work) for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(results, [(None, 1000)] * 80)
+        self.assertEqual(self.context.socket.call_count, sockets)
+
+    def test_batch(self):
+        self.assertEqual(
+            self.blocking.batch([("last_height",), ("last_height",)]),
+            [(None, 1000), (None, 1000)])
+
+    def test_submit(self):
+        future = self.blocking.submit("last_height")
+
+        self.assertEqual(future.result(1), (None, 1000))
+
+    def test_async_iterators(self):
+        closed = []
+
+        async def history3_stream(address, chunk_size=1000):
+            try:
+                for i in range(3):
+                    await asyncio.sleep(0)
+                    yield [i] * chunk_size
+            finally:
+                closed.append(threading.current_thread())
+        self.blocking.client.history3_stream = history3_stream
+
+        self.assertEqual(
+            list(self.blocking.history3_stream("address", chunk_size=2)),
+            [[0, 0], [1, 1], [2, 2]])
+
+        chunks = self.blocking.history3_stream("address")
+        next(chunks)
+        chunks.close()
+        self.assertEqual(closed, [self.blocking._thread] * 2)
+
+    def test_settings_are_not_changed(self):
+        settings = mocked_settings()
+        loop = settings.loop
+
+        with mocked_request_collection():
+            blocking = BlockingClient('irrelevant', PORTS, settings)
+        blocking.close()
+
+        self.assertIs(settings.loop, loop)
+        self.assertIsNot(blocking.client._settings, settings)
@@ -0,0 +1,90 @@
+import asyncio
+
+import asynctest
+import bitcoin.core
+
+from pylibbitcoin.error_code import ErrorCode
+
+from .helpers import client_with_mocked_socket
+
+
+def transaction(i):
+    return bitcoin.core.CTransaction(
+        [bitcoin.core.CTxIn(bitcoin.core.COutPoint(bytes([i]) * 32, 0))],
+        [bitcoin.core.CTxOut(1000)])
+
+
+class TestBulkBroadcast(asynctest.TestCase):
+    def setUp(self):
+        self.client = client_with_mocked_socket()
+
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def simple_request(command, data):
+            self.sent.append((command, bytes(data)))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0)
+            self.in_flight -= 1
+            if data == self.invalid:
+                return ErrorCode.validate_inputs_failed, None
+            return None, None
+        self.client._simple_request = simple_request
+        self.invalid = None
+
+    def test_dedupe_and_input_types(self):
+        first, second = transaction(1), transaction(2)
+        transactions = [
+            first.serialize(),
+            memoryview(first.serialize()),
+            first.serialize().hex(),
+            bytearray(second.serialize()),
+        ]
+
+        results = self.loop.run_until_complete(
+            self.client.transaction_pool_broadcast_many(transactions))
+
+        self.assertEqual(results, {
+            bitcoin.core.b2lx(first.GetTxid()): None,
+            bitcoin.core.b2lx(second.GetTxid()): None,
+        })
+        self.assertEqual(len(self.sent), 2)
+
+    def test_pre_validation(self):
+        good, bad = transaction(1), transaction(2)
+        self.invalid = bad.serialize()
+
+        results = self.loop.run_until_complete(
+            self.client.transaction_pool_broadcast_many(
+                [good.serialize(), bad.serialize()], validate=True))
+
+        self.assertIsNone(results[bitcoin.core.b2lx(good.GetTxid())])
+        self.assertEqual(results[bitcoin.core.b2lx(bad.GetTxid())],
+                         ErrorCode.validate_inputs_failed)
+        self.assertEqual(
+            [command for command, data in self.sent
+             if data == bad.serialize()],
+            [b"transaction_pool.validate2"])
+        self.assertEqual(
+            [command for command, data in self.sent
+             if data == good.serialize()],
+            [b"transaction_pool.validate2", b"transaction_pool.broadcast"])
+
+    def test_bounded_concurrency(self):
+        transactions = [transaction(i).serialize() for i in range(50)]
+
+        results = self.loop.run_until_complete(
+            self.client.transaction_pool_validate2_many(
+                transactions, concurrency=5))
+
+        self.assertEqual(len(results), 50)
+        self.assertEqual(self.max_in_flight, 5)
+
+    def test_malformed(self):
+        results = self.loop.run_until_complete(
+            self.client.transaction_pool_broadcast_many([b"\x01\x00"]))
+
+        self.assertEqual(list(results.values()), [ErrorCode.bad_stream])
+        self.assertEqual(self.sent, [])
@@ -0,0 +1,266 @@
+import asyncio
+import itertools
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import asynctest
+from asynctest import CoroutineMock, MagicMock
+import bitcoin.core
+import zmq
+import zmq.asyncio
+
+import pylibbitcoin.client
+from pylibbitcoin.client import RequestCollection
+from pylibbitcoin.header_store import HeaderStore, header_hash
+
+from .helpers import client_with_mocked_socket
+
+
+def make_chain(length, prev=b"\x00" * 32, nonce=0):
+    headers = []
+    for _ in range(length):
+        raw = bitcoin.core.CBlockHeader(
+            hashPrevBlock=prev, nNonce=nonce).serialize()
+        headers.append(raw)
+        prev = header_hash(raw)
+    return headers
+
+
+class TestHeaderStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "headers")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_empty_store(self):
+        store = HeaderStore(self.path)
+
+        self.assertEqual(len(store), 0)
+        self.assertIsNone(store.height)
+        self.assertIsNone(store.header(0))
+        store.close()
+
+    def test_lookups(self):
+        chain = make_chain(5)
+        store = HeaderStore(self.path)
+        for raw in chain:
+            store.append(raw)
+
+        self.assertEqual(store.height, 4)
+        self.assertEqual(store.header(3), chain[3])
+        self.assertEqual(store.height_of(header_hash(chain[2])), 2)
+        self.assertEqual(store.header_by_hash(header_hash(chain[4])), chain[4])
+        self.assertIsNone(store.height_of(b"\xff" * 32))
+        store.close()
+
+    def test_unconnected_header_is_rejected(self):
+        store = HeaderStore(self.path)
+        store.append(make_chain(1)[0])
+
+        with self.assertRaises(ValueError):
+            store.append(make_chain(1, prev=b"\xff" * 32)[0])
+        store.close()
+
+    def test_growth(self):
+        chain = make_chain(10)
+        store = HeaderStore(self.path, growth=3)
+        for raw in chain:
+            store.append(raw)
+
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store.header(9), chain[9])
+        store.close()
+
+    def test_reopen(self):
+        chain = make_chain(7)
+        store = HeaderStore(self.path, growth=4)
+        for raw in chain:
+            store.append(raw)
+        store.close()
+
+        store = HeaderStore(self.path)
+        self.assertEqual(store.height, 6)
+        self.assertEqual(store.header(6), chain[6])
+        self.assertEqual(store.height_of(header_hash(chain[5])), 5)
+        store.close()
+
+    def test_apply_reorg(self):
+        chain = make_chain(5)
+        store = HeaderStore(self.path)
+        for raw in chain:
+            store.append(raw)
+
+        fork = make_chain(2, prev=header_hash(chain[2]), nonce=1)
+        self.assertTrue(store.apply(3, fork[0]))
+
+        self.assertEqual(store.height, 3)
+        self.assertEqual(store.header(3), fork[0])
+        self.assertIsNone(store.height_of(header_hash(chain[4])))
+        self.assertTrue(store.apply(4, fork[1]))
+        self.assertEqual(store.height, 4)
+        store.close()
+
+    def test_apply_gap(self):
+        chain = make_chain(5)
+        store = HeaderStore(self.path)
+        store.append(chain[0])
+
+        self.assertFalse(store.apply(3, chain[3]))
+        self.assertEqual(store.height, 0)
+        store.close()
+
+
+class TestHeaderStoreSync(asynctest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = HeaderStore(os.path.join(self.directory, "headers"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_sync_fills_store(self):
+        chain = make_chain(6)
+        client = MagicMock()
+        client.last_height = CoroutineMock(return_value=(None, 5))
+        client.block_header = CoroutineMock(
+            side_effect=lambda height, use_store: (
+                None, bitcoin.core.CBlockHeader.deserialize(chain[height])))
+
+        error_code = self.loop.run_until_complete(
+            self.store.sync(client, batch_size=4))
+
+        self.assertIsNone(error_code)
+        self.assertEqual(self.store.height, 5)
+        self.assertEqual(self.store.header(5), chain[5])
+
+    def test_sync_rolls_back_stale_tip(self):
+        chain = make_chain(4)
+        for raw in chain:
+            self.store.append(raw)
+        fork = chain[:2] + make_chain(3, prev=header_hash(chain[1]), nonce=1)
+        client = MagicMock()
+        client.last_height = CoroutineMock(return_value=(None, 4))
+        client.block_header = CoroutineMock(
+            side_effect=lambda height, use_store: (
+                None, bitcoin.core.CBlockHeader.deserialize(fork[height])))
+
+        self.loop.run_until_complete(self.store.sync(client))
+
+        self.assertEqual(self.store.height, 4)
+        self.assertEqual(self.store.header(2), fork[2])
+        self.assertIsNone(self.store.height_of(header_hash(chain[3])))
+
+
+class TestClientWithHeaderStore(asynctest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = HeaderStore(os.path.join(self.directory, "headers"))
+        self.chain = make_chain(3)
+        for raw in self.chain:
+            self.store.append(raw)
+
+        self.client = client_with_mocked_socket(header_store=self.store)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_block_header_by_height(self):
+        error_code, header = self.loop.run_until_complete(
+            self.client.block_header(1))
+
+        self.assertIsNone(error_code)
+        self.assertEqual(header.serialize(), self.chain[1])
+        self.client._query_socket.send_multipart.assert_not_called()
+
+    def test_block_header_by_hash(self):
+        hash_ = header_hash(self.chain[2])[::-1].hex()
+        error_code, header = self.loop.run_until_complete(
+            self.client.block_header(hash_))
+
+        self.assertIsNone(error_code)
+        self.assertEqual(header.serialize(), self.chain[2])
+        self.client._query_socket.send_multipart.assert_not_called()
+
+    def test_block_height(self):
+        hash_ = header_hash(self.chain[2])[::-1].hex()
+        error_code, height = self.loop.run_until_complete(
+            self.client.block_height(hash_))
+
+        self.assertIsNone(error_code)
+        self.assertEqual(height, 2)
+        self.client._query_socket.send_multipart.assert_not_called()
+
+    def test_unknown_height_goes_to_the_server(self):
+        self.loop.run_until_complete(self.client.block_header(200_000))
+
+        self.client._query_socket.send_multipart.assert_called_once()
+
+
+class TestSyncThroughClient(asynctest.TestCase):
+    """The store is the client's header store and the server reorgs."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = HeaderStore(os.path.join(self.directory, "headers"))
+        self.context = zmq.asyncio.Context()
+        self.server = self.context.socket(zmq.ROUTER)
+        self.server.bind("inproc://headers-query")
+        settings = pylibbitcoin.client.ClientSettings(
+            context=self.context, timeout=1, header_store=self.store)
+        with patch("pylibbitcoin.client.RequestCollection",
+                   RequestCollection):
+            self.client = pylibbitcoin.client.Client(
+                'irrelevant',
+                {"query": "inproc://headers-query",
+                 "block": "inproc://headers-block"},
+                settings)
+        self.serving = asyncio.ensure_future(self.serve())
+        # Requests go out concurrently and need their own ids.
+        patcher = patch("pylibbitcoin.client.create_random_id",
+                        itertools.count().__next__)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.serving.cancel()
+        self.loop.run_until_complete(
+            asyncio.gather(self.serving, return_exceptions=True))
+        self.loop.run_until_complete(self.client.stop())
+        self.server.close(linger=0)
+        self.context.term()
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    async def serve(self):
+        while True:
+            identity, command, request_id, data = \
+                await self.server.recv_multipart()
+            if command == b"blockchain.fetch_last_height":
+                payload = struct.pack("<I", len(self.chain) - 1)
+            else:
+                payload = self.chain[struct.unpack("<I", data)[0]]
+            await self.server.send_multipart([
+                identity, command, request_id, b"\x00" * 4 + payload])
+
+    def test_reorg(self):
+        self.chain = make_chain(4)
+        self.assertIsNone(
+            self.loop.run_until_complete(self.store.sync(self.client)))
+        self.chain = self.chain[:2] + make_chain(
+            3, prev=header_hash(self.chain[1]), nonce=1)
+
+        error_code = self.loop.run_until_complete(
+            self.store.sync(self.client))
+
+        self.assertIsNone(error_code)
+        self.assertEqual(self.store.height, 4)
+        self.assertEqual(self.store.header(2), self.chain[2])
+        self.assertEqual(self.store.header(4), self.chain[4])
@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+from unittest.mock import patch
+
+import asynctest
+from asynctest import CoroutineMock, MagicMock
+
+import pylibbitcoin.client
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.heartbeat import HeartbeatMonitor
+
+from .helpers import PORTS, client_with_mocked_socket
+
+
+def silent_socket():
+    socket = MagicMock()
+    socket.recv_multipart = lambda **kwargs: asyncio.Future()
+    socket.send_multipart = CoroutineMock()
+    return socket
+
+
+def default_threshold():
+    settings = pylibbitcoin.client.ClientSettings()
+    return settings.missed_heartbeats + settings.heartbeat_grace
+
+
+class TestHeartbeatMonitor(asynctest.TestCase):
+    def test_missing_heartbeats(self):
+        on_failure = CoroutineMock()
+        monitor = HeartbeatMonitor(
+            silent_socket(), 0.01, 2, on_failure, self.loop)
+
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.loop.run_until_complete(monitor.stop())
+
+        self.assertGreaterEqual(monitor.failures, 1)
+        on_failure.assert_called()
+
+    def test_heartbeats(self):
+        socket = MagicMock()
+
+        async def beat():
+            await asyncio.sleep(0.005)
+            return [b"\x01\x00"]
+
+        socket.recv_multipart = beat
+        on_failure = CoroutineMock()
+        monitor = HeartbeatMonitor(socket, 0.01, 2, on_failure, self.loop)
+
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.loop.run_until_complete(monitor.stop())
+
+        self.assertTrue(monitor.alive)
+        on_failure.assert_not_called()
+
+    def test_a_late_heartbeat_is_tolerated_by_default(self):
+        socket = MagicMock()
+
+        async def late_beat():
+            await asyncio.sleep(0.025)
+            return [b"\x01\x00"]
+
+        socket.recv_multipart = late_beat
+        on_failure = CoroutineMock()
+        monitor = HeartbeatMonitor(
+            socket, 0.02, default_threshold(), on_failure, self.loop)
+
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+        self.loop.run_until_complete(monitor.stop())
+
+        on_failure.assert_not_called()
+
+    def test_failure_is_detected_within_the_grace_period(self):
+        on_failure = CoroutineMock()
+        monitor = HeartbeatMonitor(
+            silent_socket(), 0.02, default_threshold(), on_failure,
+            self.loop)
+
+        self.loop.run_until_complete(asyncio.sleep(0.038))
+        self.loop.run_until_complete(monitor.stop())
+
+        on_failure.assert_called_once()
+
+    def test_listen_on(self):
+        socket = MagicMock()
+
+        async def beat():
+            await asyncio.sleep(0.005)
+            return [b"\x01\x00"]
+
+        socket.recv_multipart = beat
+        on_failure = CoroutineMock()
+        monitor = HeartbeatMonitor(
+            silent_socket(), 0.02, 1, on_failure, self.loop)
+
+        monitor.listen_on(socket)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.loop.run_until_complete(monitor.stop())
+
+        self.assertTrue(monitor.alive)
+        on_failure.assert_not_called()
+
+
+class TestReconnect(asynctest.TestCase):
+    def setUp(self):
+        unique_ids = patch(
+            "pylibbitcoin.client.create_random_id", itertools.count().__next__)
+        with unique_ids:
+            self.client = client_with_mocked_socket(
+                dict(PORTS, heartbeat=9092), make_socket=silent_socket,
+                mock_collection=False)
+            self.old_heartbeat_socket = self.client._heartbeat_socket
+            self.old_socket = self.client._query_socket
+            self.idempotent = self.loop.run_until_complete(
+                self.client._request(b"blockchain.fetch_last_height", b""))
+            self.broadcast = self.loop.run_until_complete(
+                self.client._request(b"transaction_pool.broadcast", b"\x01"))
+            self.queue = self.loop.run_until_complete(
+                self.client.subscribe_to_blocks())
+            self.loop.run_until_complete(self.client._reconnect())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.stop())
+
+    def test_sockets_are_rebuilt(self):
+        self.assertIsNot(self.client._query_socket, self.old_socket)
+        self.old_socket.close.assert_called_once()
+
+    def test_heartbeats_come_from_the_new_socket(self):
+        self.assertIsNot(
+            self.client._heartbeat_socket, self.old_heartbeat_socket)
+        self.old_heartbeat_socket.close.assert_called_once()
+        self.assertIs(
+            self.client._heartbeat._socket, self.client._heartbeat_socket)
+
+    def test_idempotent_requests_are_sent_again(self):
+        self.client._query_socket.send_multipart.assert_called_once_with([
+            b"blockchain.fetch_last_height",
+            pylibbitcoin.client.to_little_endian(self.idempotent.id_),
+            b"",
+        ])
+        self.assertFalse(self.idempotent.future.done())
+        self.assertIn(
+            self.idempotent, self.client._request_collection.requests())
+
+    def test_other_requests_fail(self):
+        self.assertTrue(self.broadcast.future.done())
+        self.assertEqual(
+            self.broadcast.future.result().error_code,
+            ErrorCode.network_unreachable)
+
+    def test_block_listeners_are_restarted(self):
+        [task] = self.client._listeners.values()
+        [(queue, _)] = self.client._block_queues
+
+        self.assertIs(queue, self.queue)
+        self.assertFalse(task.done())
@@ -0,0 +1,173 @@
+import struct
+
+import asynctest
+from asynctest import CoroutineMock, MagicMock
+import bitcoin.core
+
+from pylibbitcoin.client import checksum, Client, HistoryError
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.history import HistoryCache
+
+ADDRESS = "mngSWw2NC9M1ctqZQxz65DwVomCjm7TWPJ"
+
+
+def receive(hash_, index, height, value):
+    return (
+        0,
+        bitcoin.core.COutPoint(hash_, index),
+        height,
+        value,
+        checksum(hash_[::-1].hex(), index),
+    )
+
+
+def spend(hash_, index, height, spent):
+    return (
+        1,
+        bitcoin.core.COutPoint(hash_, index),
+        height,
+        spent[4],
+        checksum(hash_[::-1].hex(), index),
+    )
+
+
+class TestHistoryCache(asynctest.TestCase):
+    first = receive(b"\x01" * 32, 0, 100, 1000)
+    second = receive(b"\x02" * 32, 1, 200, 500)
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.client._history3_points = CoroutineMock(
+            return_value=(None, [self.first, self.second]))
+        self.cache = HistoryCache(self.client, reorg_margin=6)
+
+    def test_first_refresh_fetches_everything(self):
+        error_code, history = self.loop.run_until_complete(
+            self.cache.refresh(ADDRESS))
+
+        self.assertIsNone(error_code)
+        self.assertEqual(len(history), 2)
+        self.client._history3_points.assert_called_once_with(ADDRESS, 0)
+        self.assertEqual(self.cache.synced_height(ADDRESS), 200)
+
+    def test_incremental_refresh(self):
+        self.loop.run_until_complete(self.cache.refresh(ADDRESS))
+        new_spend = spend(b"\x03" * 32, 0, 210, self.first)
+        self.client._history3_points = CoroutineMock(
+            return_value=(None, [self.second, new_spend]))
+
+        error_code, history = self.loop.run_until_complete(
+            self.cache.refresh(ADDRESS))
+
+        self.assertIsNone(error_code)
+        self.client._history3_points.assert_called_once_with(ADDRESS, 194)
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history[0]["received"]["height"], 100)
+        self.assertEqual(history[0]["spent"]["height"], 210)
+        self.assertNotIn("spent", history[1])
+        self.assertEqual(self.cache.synced_height(ADDRESS), 210)
+
+    def test_reorged_rows_are_replaced(self):
+        self.loop.run_until_complete(self.cache.refresh(ADDRESS))
+        self.client._history3_points = CoroutineMock(return_value=(None, []))
+
+        _, history = self.loop.run_until_complete(self.cache.refresh(ADDRESS))
+
+        self.assertEqual(len(history), 1)
+        self.assertEqual(self.cache.history(ADDRESS), history)
+
+    def test_error_keeps_cache(self):
+        self.loop.run_until_complete(self.cache.refresh(ADDRESS))
+        self.client._history3_points = CoroutineMock(
+            return_value=(ErrorCode.channel_timeout, None))
+
+        error_code, history = self.loop.run_until_complete(
+            self.cache.refresh(ADDRESS))
+
+        self.assertEqual(error_code, ErrorCode.channel_timeout)
+        self.assertIsNone(history)
+        self.assertEqual(len(self.cache.history(ADDRESS)), 2)
+
+
+def row(kind, hash_, index, height, value):
+    return struct.pack("<B32sIIQ", kind, hash_, index, height, value)
+
+
+class TestHistory3Stream(asynctest.TestCase):
+    def setUp(self):
+        # `history3_stream()` only needs `_simple_request()` from the client.
+        self.client = MagicMock()
+
+    def stream(self, rows, chunk_size):
+        self.client._simple_request = CoroutineMock(
+            return_value=(None, b"".join(rows)))
+
+        async def collect():
+            return [
+                chunk async for chunk in Client.history3_stream(
+                    self.client, ADDRESS, chunk_size=chunk_size)
+            ]
+        return self.loop.run_until_complete(collect())
+
+    def test_correlates_on_the_fly(self):
+        first, second, third = b"\x01" * 32, b"\x02" * 32, b"\x03" * 32
+        first_checksum = checksum(first[::-1].hex(), 0)
+        chunks = self.stream([
+            row(0, first, 0, 100, 1000),
+            row(0, second, 1, 101, 500),
+            row(1, third, 0, 102, first_checksum),
+            # A spend whose receive comes after it.
+            row(1, third, 1, 103, checksum(second[::-1].hex(), 2)),
+            row(0, second, 2, 103, 20),
+        ], chunk_size=2)
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        paired, late, unspent = [record for chunk in chunks
+                                 for record in chunk]
+        self.assertEqual(paired["received"]["hash"], first)
+        self.assertEqual(paired["value"], 1000)
+        self.assertEqual(paired["spent"],
+                         {"hash": third, "height": 102, "index": 0})
+        self.assertEqual(late["received"]["index"], 2)
+        self.assertEqual(late["spent"]["index"], 1)
+        self.assertEqual(unspent, {
+            "received": {"hash": second, "height": 101, "index": 1},
+            "value": 500,
+        })
+
+    def test_colliding_checksums(self):
+        # Indices 32768 apart share the lower 15 bits of the checksum.
+        received, spender = b"\x01" * 32, b"\x02" * 32
+        key = checksum(received[::-1].hex(), 0)
+        self.assertEqual(key, checksum(received[::-1].hex(), 32768))
+
+        [records] = self.stream([
+            row(0, received, 0, 100, 1000),
+            row(0, received, 32768, 100, 2000),
+            row(1, spender, 0, 101, key),
+            row(1, spender, 1, 102, key),
+        ], chunk_size=10)
+
+        self.assertEqual(
+            [(record["value"], record["spent"]["index"])
+             for record in records],
+            [(1000, 0), (2000, 1)])
+
+    def test_orphan_spend(self):
+        [[orphan]] = self.stream(
+            [row(1, b"\x01" * 32, 0, 100, 12345)], chunk_size=10)
+
+        self.assertEqual(orphan, {
+            "spent": {"hash": b"\x01" * 32, "height": 100, "index": 0}})
+
+    def test_error(self):
+        self.client._simple_request = CoroutineMock(
+            return_value=(ErrorCode.not_found, None))
+
+        async def first_chunk():
+            async for chunk in Client.history3_stream(self.client, ADDRESS):
+                return chunk
+
+        with self.assertRaises(HistoryError) as context:
+            self.loop.run_until_complete(first_chunk())
+        self.assertEqual(context.exception.error_code, ErrorCode.not_found)
@@ -0,0 +1,40 @@
+import subprocess
+import sys
+import unittest
+
+# Cumulative import time of pylibbitcoin.client in microseconds, best of a
+# few runs. Most of it is asyncio.
+IMPORT_TIME_BUDGET = 150_000
+
+
+def run_python(*arguments):
+    return subprocess.run(
+        [sys.executable] + list(arguments),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+
+
+def import_time(module):
+    output = run_python("-X", "importtime", "-c", "import " + module).stderr
+    for line in output.splitlines():
+        # import time: <self> | <cumulative> | <name>
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return int(cumulative)
+    raise AssertionError("%s is not in the -X importtime output" % module)
+
+
+class TestImportTime(unittest.TestCase):
+    def test_heavy_dependencies_are_lazy(self):
+        loaded = run_python(
+            "-c",
+            "import sys, pylibbitcoin.client\n"
+            "for name in ('anytree', 'bitcoin', 'zmq'):\n"
+            "    if name in sys.modules: print(name)").stdout
+
+        self.assertEqual(loaded, "")
+
+    def test_budget(self):
+        best = min(import_time("pylibbitcoin.client") for _ in range(3))
+
+        self.assertLess(best, IMPORT_TIME_BUDGET)
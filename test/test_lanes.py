@@ -0,0 +1,74 @@
+import asyncio
+
+import asynctest
+from asynctest import CoroutineMock
+
+from .helpers import client_with_mocked_socket, mocked_request_collection, \
+    mocked_socket
+
+
+class TestLanes(asynctest.TestCase):
+    def setUp(self):
+        self.sockets = []
+
+        def socket():
+            socket = mocked_socket()
+            self.sockets.append(socket)
+            return socket
+        self.client = client_with_mocked_socket(
+            make_socket=socket, timeout=0.05,
+            lanes={"interactive": None, "bulk": 2})
+        self.interactive, self.bulk = self.sockets[:2]
+
+    def test_commands_go_to_their_lane(self):
+        self.loop.run_until_complete(asyncio.gather(
+            self.client.last_height(),
+            self.client._simple_request(b"blockchain.fetch_history3", b"")))
+
+        self.assertEqual(
+            self.interactive.send_multipart.call_args[0][0][0],
+            b"blockchain.fetch_last_height")
+        self.assertEqual(
+            self.bulk.send_multipart.call_args[0][0][0],
+            b"blockchain.fetch_history3")
+
+    def test_in_flight_budget(self):
+        async def run():
+            bulk = [
+                asyncio.ensure_future(self.client._simple_request(
+                    b"blockchain.fetch_transaction", b""))
+                for _ in range(5)
+            ]
+            await asyncio.sleep(0.01)
+            in_flight = self.bulk.send_multipart.call_count
+
+            # The interactive lane isn't held up by the bulk requests.
+            await asyncio.wait_for(
+                asyncio.ensure_future(self.client.last_height()), 0.1)
+            await asyncio.gather(*bulk)
+            return in_flight
+
+        self.assertEqual(self.loop.run_until_complete(run()), 2)
+        self.assertEqual(self.bulk.send_multipart.call_count, 5)
+
+    def test_lane_metrics(self):
+        self.loop.run_until_complete(self.client.last_height())
+
+        metrics = self.client.lane_metrics()
+
+        self.assertEqual(metrics["interactive"]["count"], 1)
+        self.assertGreaterEqual(metrics["interactive"]["p99"], 0.05)
+        self.assertEqual(metrics["bulk"]["count"], 0)
+
+    def test_reconnect_rebuilds_every_lane(self):
+        with mocked_request_collection():
+            self.client._default_lane.collection.stop = CoroutineMock()
+            self.client._lanes["bulk"].collection.stop = CoroutineMock()
+            self.loop.run_until_complete(self.client._reconnect())
+
+        self.assertNotIn(self.interactive, [
+            lane.socket for lane in self.client._lanes.values()])
+        self.assertNotIn(self.bulk, [
+            lane.socket for lane in self.client._lanes.values()])
+        self.interactive.close.assert_called_once()
+        self.bulk.close.assert_called_once()
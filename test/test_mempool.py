@@ -0,0 +1,171 @@
+import asyncio
+import os
+import struct
+
+import asynctest
+import bitcoin.core
+from asynctest import CoroutineMock, MagicMock
+
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.mempool import MempoolMirror
+from pylibbitcoin.primitives import OutPoint
+
+from .helpers import PORTS, client_with_mocked_socket
+
+
+def transaction(spent, outputs=1):
+    return bitcoin.core.CTransaction(
+        [bitcoin.core.CTxIn(bitcoin.core.COutPoint(hash_, index))
+         for hash_, index in spent],
+        [bitcoin.core.CTxOut(1000) for _ in range(outputs)])
+
+
+def block(transactions):
+    return bitcoin.core.CBlock(vtx=transactions).serialize()
+
+
+class TestMempoolMirror(asynctest.TestCase):
+    def setUp(self):
+        self.parent = os.urandom(32)
+        self.spending = transaction([(self.parent, 0)])
+        self.mirror = MempoolMirror(MagicMock())
+
+    def test_indexes(self):
+        self.assertTrue(self.mirror.add(self.spending.serialize()))
+        self.assertFalse(self.mirror.add(self.spending.serialize()))
+
+        txid = self.spending.GetTxid()
+        self.assertIn(txid, self.mirror)
+        self.assertIn(bitcoin.core.b2lx(txid), self.mirror)
+        self.assertEqual(
+            self.mirror.transaction(txid), self.spending.serialize())
+        self.assertEqual(self.mirror.spender(self.parent, 0), txid)
+        self.assertEqual(self.mirror.spender(OutPoint(self.parent, 0)), txid)
+        self.assertIsNone(self.mirror.spender(self.parent, 1))
+        self.assertEqual(self.mirror.size, len(self.spending.serialize()))
+
+        self.assertTrue(self.mirror.remove(bitcoin.core.b2lx(txid)))
+        self.assertNotIn(txid, self.mirror)
+        self.assertIsNone(self.mirror.spender(self.parent, 0))
+        self.assertEqual(self.mirror.size, 0)
+
+    def test_confirmation(self):
+        other = transaction([(os.urandom(32), 0)])
+        conflict = transaction([(self.parent, 0)], outputs=2)
+        for transaction_ in (self.spending, other):
+            self.mirror.add(transaction_.serialize())
+
+        removed = self.mirror.confirm_block(block([other, conflict]))
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(len(self.mirror), 0)
+        self.assertEqual(self.mirror.size, 0)
+        # Confirmed transactions arriving late aren't added.
+        self.assertFalse(self.mirror.add(other.serialize()))
+
+    def test_evict_oldest(self):
+        transactions = [transaction([(os.urandom(32), 0)]) for _ in range(3)]
+        size = len(transactions[0].serialize())
+        mirror = MempoolMirror(MagicMock(), max_size=2 * size)
+
+        for transaction_ in transactions:
+            self.assertTrue(mirror.add(transaction_.serialize()))
+
+        self.assertNotIn(transactions[0].GetTxid(), mirror)
+        self.assertIn(transactions[2].GetTxid(), mirror)
+        self.assertEqual(mirror.evicted, 1)
+        self.assertEqual(mirror.size, 2 * size)
+
+    def test_evict_newest(self):
+        transactions = [transaction([(os.urandom(32), 0)]) for _ in range(3)]
+        size = len(transactions[0].serialize())
+        mirror = MempoolMirror(
+            MagicMock(), max_size=2 * size, eviction="newest")
+
+        added = [mirror.add(transaction_.serialize())
+                 for transaction_ in transactions]
+
+        self.assertEqual(added, [True, True, False])
+        self.assertIn(transactions[0].GetTxid(), mirror)
+        self.assertEqual(mirror.evicted, 1)
+
+    def test_unknown_eviction(self):
+        with self.assertRaises(ValueError):
+            MempoolMirror(MagicMock(), eviction="random")
+
+    def test_seed(self):
+        client = MagicMock()
+        client._simple_request = CoroutineMock(side_effect=[
+            (None, self.spending.serialize()),
+            (ErrorCode.not_found, None),
+        ])
+        mirror = MempoolMirror(client)
+        missing = os.urandom(32)
+
+        errors = self.loop.run_until_complete(
+            mirror.seed([self.spending.GetTxid(), missing]))
+
+        self.assertEqual(errors, {missing: ErrorCode.not_found})
+        self.assertIn(self.spending.GetTxid(), mirror)
+
+    def test_run(self):
+        transactions = asyncio.Queue()
+        blocks = asyncio.Queue()
+        client = MagicMock()
+        client.subscribe_to_transactions = CoroutineMock(
+            return_value=transactions)
+        client.subscribe_to_blocks = CoroutineMock(return_value=blocks)
+        mirror = MempoolMirror(client)
+        task = asyncio.ensure_future(mirror.run())
+
+        async def run():
+            await transactions.put(
+                (1, self.spending.GetTxid(), self.spending.serialize()))
+            await asyncio.sleep(0.01)
+            self.assertIn(self.spending.GetTxid(), mirror)
+
+            await blocks.put((1, 100, block([self.spending])))
+            await asyncio.sleep(0.01)
+            self.assertNotIn(self.spending.GetTxid(), mirror)
+
+        try:
+            self.loop.run_until_complete(run())
+        finally:
+            task.cancel()
+            self.loop.run_until_complete(
+                asyncio.gather(task, return_exceptions=True))
+        client.subscribe_to_transactions.assert_called_with("raw")
+        client.subscribe_to_blocks.assert_called_with("raw")
+
+    def test_run_beside_another_block_subscriber(self):
+        client = client_with_mocked_socket(dict(PORTS, tx=9094))
+        blocks = asyncio.Queue()
+        client._block_socket.recv_multipart = lambda copy: blocks.get()
+        client._transaction_socket = MagicMock()
+        client._transaction_socket.recv_multipart = CoroutineMock(
+            side_effect=[
+                [struct.pack("<H", 1), self.spending.serialize()],
+                asyncio.Future()])
+        mirror = MempoolMirror(client)
+
+        async def run():
+            other = await client.subscribe_to_blocks("raw")
+            task = asyncio.ensure_future(mirror.run())
+            await asyncio.sleep(0.01)
+            self.assertIn(self.spending.GetTxid(), mirror)
+
+            blocks.put_nowait([
+                struct.pack("<H", 1),
+                struct.pack("<I", 100),
+                block([self.spending])])
+            await asyncio.sleep(0.01)
+            task.cancel()
+            return other
+
+        other = self.loop.run_until_complete(run())
+        for task in client._listeners.values():
+            task.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertNotIn(self.spending.GetTxid(), mirror)
+        self.assertEqual(other.get_nowait()[1], 100)
@@ -2,7 +2,8 @@ import unittest
 import binascii
 import hashlib
 from anytree import PreOrderIter
-from pylibbitcoin.client import merkle_tree, merkle_branch
+from pylibbitcoin.client import merkle_tree, merkle_branch, \
+    merkle_levels, merkle_root
 
 
 class TestMerkleTree(unittest.TestCase):
@@ -75,3 +76,30 @@ class TestMerkleBranch(unittest.TestCase):
         branch = merkle_branch(b'01', self.tree)
 
         self.assertIsNotNone(branch)
+
+
+class TestMerkleLevels(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(merkle_levels([]), [])
+        self.assertIsNone(merkle_root([]))
+
+    def test_matches_merkle_tree(self):
+        hashes = [bytes([i]) * 32 for i in range(5)]
+
+        levels = merkle_levels(hashes)
+
+        self.assertEqual([len(level) for level in levels], [5, 3, 2, 1])
+        self.assertEqual(levels[-1][0], merkle_tree(hashes).name)
+        self.assertEqual(merkle_root(hashes), levels[-1][0])
+
+    def test_real_world_example(self):
+        with open('test/transactions-of-525285-merkle-root-8694fe0d737b26b49bf7fc906b90c19aeadfe37c6082a95968825cbdbc183a94.txt') as f:  # noqa: E501
+            hashes = [
+                binascii.unhexlify(hash_.strip())[::-1]
+                for hash_ in f.readlines()
+            ]
+
+        self.assertEqual(
+            merkle_root(hashes),
+            binascii.unhexlify('8694fe0d737b26b49bf7fc906b90c19aeadfe37c6082a95968825cbdbc183a94')[::-1]  # noqa: E501
+        )
@@ -0,0 +1,123 @@
+import struct
+import time
+import unittest
+
+import asynctest
+
+import pylibbitcoin.client
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.metrics import AdaptiveTimeouts, LatencyWindow
+
+from .helpers import client_with_mocked_socket
+
+
+class TestLatencyWindow(unittest.TestCase):
+    def test_percentiles(self):
+        window = LatencyWindow()
+        for i in range(1, 101):
+            window.record(i / 1000)
+
+        self.assertEqual(window.percentile(50), 0.051)
+        self.assertEqual(window.snapshot(), {
+            "count": 100, "p50": 0.051, "p99": 0.1, "max": 0.1})
+
+    def test_window(self):
+        window = LatencyWindow(size=2)
+        for latency in (5, 1, 2):
+            window.record(latency)
+
+        self.assertEqual(len(window), 2)
+        self.assertEqual(window.count, 3)
+        self.assertEqual(window.percentile(100), 2)
+
+    def test_empty(self):
+        self.assertIsNone(LatencyWindow().percentile(99))
+        self.assertIsNone(LatencyWindow().snapshot()["p99"])
+
+
+class TestAdaptiveTimeouts(unittest.TestCase):
+    def test_p99_times_factor(self):
+        timeouts = AdaptiveTimeouts(factor=2, min_samples=10)
+        for i in range(1, 10):
+            timeouts.record(b"blockchain.fetch_history3", i / 10)
+        self.assertEqual(timeouts.timeout(b"blockchain.fetch_history3", 5), 5)
+
+        timeouts.record(b"blockchain.fetch_history3", 1)
+        self.assertEqual(timeouts.timeout(b"blockchain.fetch_history3", 5), 2)
+        self.assertIsNone(timeouts.timeout(b"blockchain.fetch_last_height"))
+
+    def test_floor_and_ceiling(self):
+        timeouts = AdaptiveTimeouts(floor=0.5, ceiling=10, min_samples=1)
+
+        timeouts.record(b"blockchain.fetch_last_height", 0.001)
+        timeouts.record(b"blockchain.broadcast", 100)
+
+        self.assertEqual(timeouts.snapshot(), {
+            b"blockchain.fetch_last_height": 0.5,
+            b"blockchain.broadcast": 10,
+        })
+
+    def test_overrides(self):
+        timeouts = AdaptiveTimeouts(
+            min_samples=1, overrides={b"blockchain.broadcast": None})
+
+        timeouts.record(b"blockchain.broadcast", 1)
+
+        self.assertIsNone(timeouts.timeout(b"blockchain.broadcast", 2))
+
+
+class TestClientTimeouts(asynctest.TestCase):
+    def client(self, timeouts):
+        return client_with_mocked_socket(timeout=1, timeouts=timeouts)
+
+    def test_dead_requests_fail_fast(self):
+        client = self.client(AdaptiveTimeouts(
+            overrides={b"blockchain.fetch_last_height": 0.01}))
+
+        start = time.perf_counter()
+        error_code, _ = self.loop.run_until_complete(client.last_height())
+
+        self.assertEqual(error_code, ErrorCode.channel_timeout)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_answered_requests_are_recorded(self):
+        timeouts = AdaptiveTimeouts(min_samples=1, floor=0.25)
+        client = self.client(timeouts)
+        request = pylibbitcoin.client.Request(b"blockchain.fetch_last_height")
+        request.future.set_result(pylibbitcoin.client.Response([
+            request.command, struct.pack("<I", request.id_),
+            b"\x00" * 8]))
+
+        self.loop.run_until_complete(client._wait_for_response(request))
+
+        self.assertEqual(
+            timeouts.timeout(b"blockchain.fetch_last_height"), 0.25)
+
+    def test_timeouts_grow_with_latency(self):
+        timeouts = AdaptiveTimeouts(factor=2, floor=0.01, min_samples=1)
+        timeouts.record(b"blockchain.fetch_last_height", 0.005)
+        client = self.client(timeouts)
+
+        async def request():
+            # The server has slowed down past the current timeout.
+            request = pylibbitcoin.client.Request(
+                b"blockchain.fetch_last_height")
+
+            def answer():
+                if not request.future.done():
+                    request.future.set_result(pylibbitcoin.client.Response([
+                        request.command, struct.pack("<I", request.id_),
+                        b"\x00" * 8]))
+
+            self.loop.call_later(0.05, answer)
+            return await client._wait_for_response(request)
+
+        error_codes = []
+        while not error_codes or error_codes[-1] is not None:
+            self.assertLess(len(error_codes), 10)
+            error_codes.append(
+                self.loop.run_until_complete(request())[0])
+
+        self.assertEqual(error_codes[0], ErrorCode.channel_timeout)
+        self.assertGreater(
+            timeouts.timeout(b"blockchain.fetch_last_height"), 0.05)
@@ -0,0 +1,234 @@
+import asyncio
+import os
+import struct
+import unittest
+from unittest.mock import patch
+
+import asynctest
+import zmq
+import zmq.asyncio
+
+import pylibbitcoin.client
+from pylibbitcoin.client import RequestCollection
+from pylibbitcoin.pool import Broker, ClientFactory
+
+from .helpers import mocked_request_collection, mocked_settings
+
+
+class TestClientFactory(asynctest.TestCase):
+    def settings(self):
+        settings = mocked_settings()
+        self.contexts.append(settings.context)
+        return settings
+
+    def setUp(self):
+        self.contexts = []
+        self.factory = ClientFactory(
+            'irrelevant', {"query": 9091, "block": 9093}, self.settings)
+
+    def test_one_client_per_process(self):
+        with mocked_request_collection():
+            with patch("os.getpid", return_value=100):
+                factory = ClientFactory(
+                    'irrelevant', {"query": 9091, "block": 9093},
+                    self.settings)
+                client = factory.get()
+                self.assertIs(factory.get(), client)
+
+            with patch("os.getpid", return_value=101):
+                forked = factory.get()
+        self.addCleanup(asyncio.set_event_loop, self.loop)
+        self.addCleanup(forked._settings.loop.close)
+
+        self.assertIsNot(forked, client)
+        self.assertEqual(len(self.contexts), 2)
+        self.assertIs(forked._settings.context, self.contexts[1])
+        self.assertIsNot(forked._settings.loop, client._settings.loop)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork()")
+    def test_fork(self):
+        with mocked_request_collection():
+            parent = self.factory.get()
+            read, write = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    child = self.factory.get()
+                    loop = child._settings.loop
+                    fresh = child is not parent \
+                        and loop is not parent._settings.loop \
+                        and loop is asyncio.get_event_loop() \
+                        and not loop.is_closed()
+                    os.write(write, b"1" if fresh else b"0")
+                finally:
+                    os._exit(0)
+
+            os.close(write)
+            with os.fdopen(read, "rb") as pipe:
+                result = pipe.read()
+            os.waitpid(pid, 0)
+
+        self.assertIs(self.factory.get(), parent)
+        self.assertEqual(result, b"1")
+
+
+class TestBrokerContext(asynctest.TestCase):
+    def test_context_is_made_when_run(self):
+        with patch("zmq.asyncio.Context") as context:
+            broker = Broker('irrelevant', {"query": 9091})
+            context.assert_not_called()
+
+            task = asyncio.ensure_future(broker.run())
+            self.loop.run_until_complete(asyncio.sleep(0))
+            task.cancel()
+            self.loop.run_until_complete(
+                asyncio.gather(task, return_exceptions=True))
+
+        context.assert_called_once_with()
+        context.return_value.term.assert_called_once_with()
+
+
+class TestBroker(asynctest.TestCase):
+    def setUp(self):
+        self.context = zmq.asyncio.Context()
+        self.server = self.context.socket(zmq.ROUTER)
+        self.server.bind("inproc://server-query")
+        self.publisher = self.context.socket(zmq.PUB)
+        self.publisher.bind("inproc://server-block")
+
+        self.broker = Broker(
+            'irrelevant',
+            {"query": "inproc://server-query",
+             "block": "inproc://server-block"},
+            {"query": "inproc://broker-query",
+             "block": "inproc://broker-block"},
+            context=self.context)
+        self.broker_task = asyncio.ensure_future(self.broker.run())
+        self.dealers = []
+
+    def tearDown(self):
+        self.broker_task.cancel()
+        self.loop.run_until_complete(
+            asyncio.gather(self.broker_task, return_exceptions=True))
+        for dealer in self.dealers:
+            dealer.close(linger=0)
+        self.server.close(linger=0)
+        self.publisher.close(linger=0)
+        self.context.term()
+
+    async def serve(self, count):
+        seen_ids = set()
+        for _ in range(count):
+            identity, command, request_id, data = \
+                await self.server.recv_multipart()
+            seen_ids.add(request_id)
+            await self.server.send_multipart([
+                identity, command, request_id,
+                b"\x00\x00\x00\x00" + data])
+        return seen_ids
+
+    def client(self):
+        settings = pylibbitcoin.client.ClientSettings(
+            context=self.context, timeout=1)
+        with patch("pylibbitcoin.client.RequestCollection",
+                   RequestCollection):
+            return pylibbitcoin.client.Client(
+                'irrelevant', self.broker.endpoints, settings)
+
+    def test_request_ids_are_rewritten(self):
+        # Both clients use the same request id.
+        with patch("pylibbitcoin.client.create_random_id", lambda: 2):
+            clients = [self.client(), self.client()]
+
+            async def run():
+                server = asyncio.ensure_future(self.serve(2))
+                results = await asyncio.gather(*[
+                    client._simple_request(
+                        b"blockchain.fetch_last_height",
+                        struct.pack("<I", height))
+                    for client, height in zip(clients, (1, 2))
+                ])
+                return results, await server
+
+            results, upstream_ids = self.loop.run_until_complete(run())
+
+        self.assertEqual(results, [
+            (None, struct.pack("<I", 1)), (None, struct.pack("<I", 2))])
+        self.assertEqual(len(upstream_ids), 2)
+        for client in clients:
+            self.loop.run_until_complete(client.stop())
+
+    def test_publishers_are_forwarded(self):
+        subscriber = self.context.socket(zmq.SUB)
+        subscriber.connect(self.broker.endpoints["block"])
+        subscriber.setsockopt_string(zmq.SUBSCRIBE, '')
+
+        async def run():
+            # PUB/SUB drops messages until the subscriptions have arrived.
+            while True:
+                await self.publisher.send_multipart([b"\x01\x00", b"block"])
+                try:
+                    return await asyncio.wait_for(
+                        subscriber.recv_multipart(), 0.05)
+                except asyncio.TimeoutError:
+                    pass
+
+        self.assertEqual(
+            self.loop.run_until_complete(run()), [b"\x01\x00", b"block"])
+        subscriber.close(linger=0)
+
+    def dealer(self):
+        dealer = self.context.socket(zmq.DEALER)
+        dealer.connect(self.broker.endpoints["query"])
+        self.dealers.append(dealer)
+        return dealer
+
+    async def answer(self, data=b"\x00\x00\x00\x00"):
+        identity, command, request_id, _ = \
+            await self.server.recv_multipart()
+        await self.server.send_multipart(
+            [identity, command, request_id, data])
+        return identity, command, request_id
+
+    def test_subscriptions_outlive_pending_requests(self):
+        self.broker._max_pending = 1
+        dealer = self.dealer()
+
+        async def run():
+            await dealer.send_multipart(
+                [b"subscribe.address", b"\x01\x00\x00\x00", b""])
+            subscription = await self.answer()
+            await dealer.recv_multipart()
+
+            # Unanswered requests push each other out.
+            for request_id in (b"\x02\x00\x00\x00", b"\x03\x00\x00\x00"):
+                await dealer.send_multipart(
+                    [b"blockchain.fetch_last_height", request_id, b""])
+                await self.server.recv_multipart()
+
+            await self.server.send_multipart(
+                list(subscription) + [b"\x00\x00\x00\x00notification"])
+            return await asyncio.wait_for(dealer.recv_multipart(), 1)
+
+        self.assertEqual(
+            self.loop.run_until_complete(run()),
+            [b"subscribe.address", b"\x01\x00\x00\x00",
+             b"\x00\x00\x00\x00notification"])
+        self.assertEqual(len(self.broker._pending), 1)
+        self.assertEqual(len(self.broker._subscriptions), 1)
+
+    def test_malformed_requests_are_dropped(self):
+        dealer = self.dealer()
+
+        async def run():
+            await dealer.send_multipart([b"blockchain.fetch_last_height"])
+            await dealer.send_multipart(
+                [b"blockchain.fetch_last_height", b"\x01\x00\x00\x00", b""])
+            await self.answer()
+            return await asyncio.wait_for(dealer.recv_multipart(), 1)
+
+        with self.assertLogs("pylibbitcoin.pool", "WARNING"):
+            response = self.loop.run_until_complete(run())
+
+        self.assertEqual(response[1], b"\x01\x00\x00\x00")
+        self.assertFalse(self.broker_task.done())
@@ -0,0 +1,43 @@
+import unittest
+
+from pylibbitcoin.primitives import Hash32, OutPoint, internal_bytes
+
+HEX = "0530375a5bf4ea9a82494fcb5ef4a61076c2af807982076fa810851f4bc31c09"
+
+
+class TestHash32(unittest.TestCase):
+    def test_byte_orders(self):
+        hash_ = Hash32.from_hex(HEX)
+
+        self.assertEqual(hash_.internal, bytes.fromhex(HEX)[::-1])
+        self.assertEqual(hash_.display, bytes.fromhex(HEX))
+        self.assertEqual(hash_.hex, HEX)
+        self.assertEqual(str(hash_), HEX)
+        self.assertEqual(bytes(hash_), hash_.internal)
+
+    def test_equality(self):
+        hash_ = Hash32(bytes.fromhex(HEX)[::-1])
+
+        self.assertEqual(hash_, Hash32.from_hex(HEX))
+        self.assertEqual(len({hash_, Hash32.from_hex(HEX)}), 1)
+
+    def test_wrong_length(self):
+        with self.assertRaises(ValueError):
+            Hash32(b"\x00" * 31)
+
+    def test_internal_bytes(self):
+        internal = bytes.fromhex(HEX)[::-1]
+
+        for hash_ in (HEX, internal, memoryview(internal), Hash32(internal)):
+            self.assertEqual(internal_bytes(hash_), internal)
+
+
+class TestOutPoint(unittest.TestCase):
+    def test_serialize(self):
+        outpoint = OutPoint(HEX, 1)
+
+        self.assertEqual(outpoint.hash, Hash32.from_hex(HEX))
+        self.assertEqual(
+            outpoint.serialize(),
+            bytes.fromhex(HEX)[::-1] + b"\x01\x00\x00\x00")
+        self.assertEqual(outpoint, OutPoint(Hash32.from_hex(HEX), 1))
@@ -0,0 +1,101 @@
+import asyncio
+
+import asynctest
+from asynctest import MagicMock
+import bitcoin.core
+
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.reconstruct import BlockReconstructor
+
+
+def block(height, transactions=3):
+    vtx = [
+        bitcoin.core.CTransaction(
+            [bitcoin.core.CTxIn(
+                bitcoin.core.COutPoint(bytes([height, i]) * 16, 0))],
+            [bitcoin.core.CTxOut(1000)])
+        for i in range(transactions)
+    ]
+    block = bitcoin.core.CBlock(nTime=height, vtx=vtx)
+    return bitcoin.core.CBlock(
+        nTime=height, hashMerkleRoot=block.calc_merkle_root(), vtx=vtx)
+
+
+class FakeClient:
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.transactions = {
+            transaction.GetTxid(): transaction.serialize()
+            for block in blocks.values() for transaction in block.vtx
+        }
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def block_header(self, height):
+        return None, self.blocks[height].get_header()
+
+    async def block_transaction_hashes(self, height):
+        return None, [
+            (transaction.GetTxid(),) for transaction in self.blocks[height].vtx
+        ]
+
+    async def _raw_transaction(self, hash_):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        if hash_ not in self.transactions:
+            return ErrorCode.not_found, None
+        return None, self.transactions[hash_]
+
+
+class TestBlockReconstructor(asynctest.TestCase):
+    def setUp(self):
+        self.client = FakeClient({height: block(height) for height in
+                                  range(10)})
+
+    def collect(self, reconstructor, heights, mode="raw"):
+        async def run():
+            return [result async for result in
+                    reconstructor.blocks(heights, mode)]
+        return self.loop.run_until_complete(run())
+
+    def test_blocks_in_order(self):
+        results = self.collect(
+            BlockReconstructor(self.client, blocks_in_flight=3,
+                               transactions_in_flight=4),
+            range(10))
+
+        self.assertEqual([height for height, _, _ in results],
+                         list(range(10)))
+        for height, error_code, data in results:
+            self.assertIsNone(error_code)
+            self.assertEqual(data, self.client.blocks[height].serialize())
+        self.assertLessEqual(self.client.max_in_flight, 4)
+
+    def test_decoded(self):
+        [(_, _, decoded)] = self.collect(
+            BlockReconstructor(self.client), [4], mode="block")
+
+        self.assertEqual(decoded.GetHash(), self.client.blocks[4].GetHash())
+
+    def test_merkle_mismatch(self):
+        # The server leaves out a transaction.
+        tampered = self.client.blocks[2]
+        self.client.blocks[2] = MagicMock(vtx=tampered.vtx[:2])
+        self.client.blocks[2].get_header.return_value = tampered.get_header()
+
+        results = self.collect(BlockReconstructor(self.client), [1, 2, 3])
+
+        self.assertEqual([error_code for _, error_code, _ in results],
+                         [None, ErrorCode.merkle_mismatch, None])
+        self.assertIsNone(results[1][2])
+
+    def test_missing_transaction(self):
+        del self.client.transactions[self.client.blocks[5].vtx[1].GetTxid()]
+
+        [(_, error_code, data)] = self.collect(
+            BlockReconstructor(self.client), [5])
+
+        self.assertEqual(error_code, ErrorCode.not_found)
+        self.assertIsNone(data)
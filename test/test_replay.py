@@ -0,0 +1,167 @@
+import asyncio
+import os
+import shutil
+import struct
+import tempfile
+from unittest.mock import patch
+
+import asynctest
+import zmq
+import zmq.asyncio
+
+import pylibbitcoin.client
+from pylibbitcoin.client import RequestCollection
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.replay import ReplayServer, WireRecorder, read_log
+
+FETCH_LAST_HEIGHT = b"blockchain.fetch_last_height"
+
+
+class TestReplay(asynctest.TestCase):
+    def setUp(self):
+        self.context = zmq.asyncio.Context()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "wire.log")
+
+    def tearDown(self):
+        self.context.term()
+
+    def client(self, endpoints, recorder=None):
+        settings = pylibbitcoin.client.ClientSettings(
+            context=self.context, timeout=1, recorder=recorder)
+        with patch("pylibbitcoin.client.RequestCollection",
+                   RequestCollection):
+            return pylibbitcoin.client.Client(
+                'irrelevant', endpoints, settings)
+
+    async def serve(self, server, count):
+        for _ in range(count):
+            identity, command, request_id, data = \
+                await server.recv_multipart()
+            await server.send_multipart([
+                identity, command, request_id,
+                b"\x00\x00\x00\x00" + data * 2])
+
+    def record(self, queries):
+        server = self.context.socket(zmq.ROUTER)
+        server.bind("inproc://server-query")
+        recorder = WireRecorder(self.path)
+        client = self.client(
+            {"query": "inproc://server-query",
+             "block": "inproc://server-block"},
+            recorder)
+
+        async def run():
+            serving = asyncio.ensure_future(self.serve(server, len(queries)))
+            results = [await client._simple_request(FETCH_LAST_HEIGHT, data)
+                       for data in queries]
+            await serving
+            return results
+
+        results = self.loop.run_until_complete(run())
+        self.loop.run_until_complete(client.stop())
+        server.close(linger=0)
+        recorder.close()
+        return results
+
+    def replay(self, queries, speed=None):
+        endpoints = {"query": "inproc://replay-query",
+                     "block": "inproc://replay-block"}
+        replay_server = ReplayServer(
+            self.path, endpoints, speed, context=self.context)
+        serving = asyncio.ensure_future(replay_server.run())
+        # Let the server bind before connecting.
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        client = self.client(endpoints)
+
+        async def run():
+            return [await client._simple_request(FETCH_LAST_HEIGHT, data)
+                    for data in queries]
+
+        results = self.loop.run_until_complete(run())
+        self.loop.run_until_complete(client.stop())
+        serving.cancel()
+        self.loop.run_until_complete(
+            asyncio.gather(serving, return_exceptions=True))
+        return results
+
+    def test_log(self):
+        self.record([b"\x01"])
+
+        records = list(read_log(self.path))
+
+        self.assertEqual(
+            [(direction, service) for _, direction, service, _ in records],
+            [(0, "query"), (1, "query")])
+        _, _, _, sent = records[0]
+        _, _, _, received = records[1]
+        self.assertEqual(sent[0], FETCH_LAST_HEIGHT)
+        self.assertEqual(sent[2], b"\x01")
+        self.assertEqual(received, [
+            FETCH_LAST_HEIGHT, sent[1], b"\x00\x00\x00\x00\x01\x01"])
+        self.assertLessEqual(records[0][0], records[1][0])
+
+    def test_replay(self):
+        recorded = self.record([b"\x01", b"\x02"])
+
+        self.assertEqual(self.replay([b"\x02", b"\x01"]), recorded[::-1])
+
+    def test_replay_accelerated(self):
+        recorded = self.record([b"\x01"])
+
+        self.assertEqual(self.replay([b"\x01"], speed=10), recorded)
+
+    def test_unrecorded_query(self):
+        self.record([b"\x01"])
+
+        self.assertEqual(
+            self.replay([b"\x03"]), [(ErrorCode.not_found, b"")])
+
+    def test_not_a_log(self):
+        with open(self.path, "wb") as file:
+            file.write(b"garbage")
+
+        with self.assertRaises(ValueError):
+            list(read_log(self.path))
+
+    def test_published_messages(self):
+        # Recorded 0.05 seconds after the recording started.
+        recorder = WireRecorder(self.path, clock=iter([0, 0.05]).__next__)
+        recorder.record(1, 1, [struct.pack("<H", 1), b"block"])
+        recorder.close()
+        endpoints = {"query": "inproc://replay-query",
+                     "block": "inproc://replay-block"}
+        subscriber = self.context.socket(zmq.SUB)
+        subscriber.setsockopt_string(zmq.SUBSCRIBE, '')
+
+        async def run():
+            serving = asyncio.ensure_future(ReplayServer(
+                self.path, endpoints, context=self.context).run())
+            # Publishing waits for the subscriber.
+            await asyncio.sleep(0.01)
+            subscriber.connect(endpoints["block"])
+            subscribed = self.loop.time()
+            frames = await asyncio.wait_for(subscriber.recv_multipart(), 1)
+            elapsed = self.loop.time() - subscribed
+            serving.cancel()
+            await asyncio.gather(serving, return_exceptions=True)
+            return frames, elapsed
+
+        frames, elapsed = self.loop.run_until_complete(run())
+        subscriber.close(linger=0)
+
+        self.assertEqual(frames, [struct.pack("<H", 1), b"block"])
+        self.assertGreaterEqual(elapsed, 0.04)
+
+    def test_stop_closes_the_recorder(self):
+        recorder = WireRecorder(self.path)
+        client = self.client(
+            {"query": "inproc://server-query",
+             "block": "inproc://server-block"},
+            recorder)
+
+        self.loop.run_until_complete(client.stop())
+
+        self.assertTrue(recorder._file.closed)
+        self.assertEqual(list(read_log(self.path)), [])
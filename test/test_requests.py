@@ -2,12 +2,16 @@ import asyncio
 import struct
 from binascii import unhexlify
 import asynctest
-from asynctest import CoroutineMock, MagicMock
+from asynctest import CoroutineMock
 import bitcoin.core.serialize
 import zmq
 import zmq.asyncio
 
 import pylibbitcoin.client
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.primitives import Hash32, OutPoint
+
+from .helpers import client_with_mocked_socket
 
 """
 api_interactions has all API calls.
@@ -24,12 +28,12 @@ api_interactions = {
     },
     "block_header": {
         "request_with_height": [b"blockchain.fetch_block_header", b"\x02\x00\x00\x00", b'@\r\x03\x00'],  # noqa: E501
-        "request_with_hash": [b"blockchain.fetch_block_header", b"\x02\x00\x00\x00", unhexlify("0000000000000000000aea04dcbdd6a8f16e7ddcc9c43e3701c99308343f493c")],  # noqa: E501
+        "request_with_hash": [b"blockchain.fetch_block_header", b"\x02\x00\x00\x00", unhexlify("0000000000000000000aea04dcbdd6a8f16e7ddcc9c43e3701c99308343f493c")[::-1]],  # noqa: E501
         "response": [b"blockchain.fetch_block_header", b"\x02\x00\x00\x00", b"\x00\x00\x00\x00" + bitcoin.core.CBlockHeader().serialize()],  # noqa: E501
     },
     "block_transaction_hashes": {
         "request_with_height": [b"blockchain.fetch_block_transaction_hashes", b"\x02\x00\x00\x00", b'@\r\x03\x00'],  # noqa: E501
-        "request_with_hash": [b"blockchain.fetch_block_transaction_hashes", b"\x02\x00\x00\x00", unhexlify("0000000000000000000aea04dcbdd6a8f16e7ddcc9c43e3701c99308343f493c")],  # noqa: E501
+        "request_with_hash": [b"blockchain.fetch_block_transaction_hashes", b"\x02\x00\x00\x00", unhexlify("0000000000000000000aea04dcbdd6a8f16e7ddcc9c43e3701c99308343f493c")[::-1]],  # noqa: E501
         "response": [b"blockchain.fetch_block_transaction_hashes", b"\x02\x00\x00\x00", b"\x00\x00\x00\x00" + unhexlify("a"*64 + "b"*64)],  # noqa: E501
     },
     "block_height": {
@@ -89,31 +93,27 @@ api_interactions = {
 pylibbitcoin.client.create_random_id = lambda: 2
 
 
-def client_with_mocked_socket():
-    pylibbitcoin.client.RequestCollection = MagicMock()
-
-    mock_zmq_socket = CoroutineMock()
-    mock_zmq_socket.connect.return_value = None
-    mock_zmq_socket.send_multipart = CoroutineMock()
-
-    mock_zmq_context = MagicMock(autospec=zmq.asyncio.Context)
-    mock_zmq_context.socket.return_value = mock_zmq_socket
-
-    settings = pylibbitcoin.client.ClientSettings(
-        context=mock_zmq_context,
-        timeout=0.01)
-
-    return pylibbitcoin.client.Client(
-        'irrelevant',
-        {"query": 9091, "block": 9093},
-        settings)
-
-
 def raw_response_to_return_type(response):
     resp = pylibbitcoin.client.Response(response)
     return resp.error_code, resp.data
 
 
+class TestResponse(asynctest.TestCase):
+    def test_data_is_not_copied(self):
+        payload = zmq.Frame(b"\x03\x00\x00\x00" + b"\x01" * 1000)
+        response = pylibbitcoin.client.Response([
+            zmq.Frame(b"blockchain.fetch_block"),
+            zmq.Frame(struct.pack("<I", 7)),
+            payload])
+
+        self.assertEqual(response.command, b"blockchain.fetch_block")
+        self.assertEqual(response.request_id, 7)
+        self.assertEqual(response.error_code.name, "not_found")
+        self.assertIsInstance(response.data, memoryview)
+        self.assertIs(response.data.obj, payload)
+        self.assertEqual(response.data, b"\x01" * 1000)
+
+
 class TestLastHeight(asynctest.TestCase):
     def test_correctness_of_request(self):
         c = client_with_mocked_socket()
@@ -156,6 +156,20 @@ class TestBlockHeader(asynctest.TestCase):
             api_interactions["block_header"]["request_with_hash"]
         )
 
+    def test_every_hash_form_sends_the_same_frame(self):
+        header_hash = Hash32.from_hex(
+            "0000000000000000000aea04dcbdd6a8f16e7ddcc9c43e3701c99308343f493c")
+
+        for hash_ in (header_hash.hex, header_hash, header_hash.internal,
+                      bytearray(header_hash.internal),
+                      memoryview(header_hash.internal)):
+            c = client_with_mocked_socket()
+            self.loop.run_until_complete(c.block_header(hash_))
+
+            c._query_socket.send_multipart.assert_called_with(
+                api_interactions["block_header"]["request_with_hash"]
+            )
+
     def test_response_handling(self):
         c = client_with_mocked_socket()
         c._wait_for_response = CoroutineMock(
@@ -183,6 +197,17 @@ class TestBlockTransactionHashes(asynctest.TestCase):
             api_interactions["block_transaction_hashes"]["request_with_hash"]
         )
 
+    def test_block_transaction_hashes_by_typed_hash(self):
+        c = client_with_mocked_socket()
+        header_hash = Hash32.from_hex(
+            "0000000000000000000aea04dcbdd6a8f16e7ddcc9c43e3701c99308343f493c")
+
+        self.loop.run_until_complete(c.block_transaction_hashes(header_hash))
+
+        c._query_socket.send_multipart.assert_called_with(
+            api_interactions["block_transaction_hashes"]["request_with_hash"]
+        )
+
     def test_block_transaction_hashes_by_height(self):
         c = client_with_mocked_socket()
 
@@ -277,6 +302,18 @@ class TestTransactionIndex(asynctest.TestCase):
             api_interactions["transaction_index"]["request"]
         )
 
+    def test_typed_and_raw_hashes(self):
+        transaction_hash = Hash32.from_hex(
+            "e400712f48693950b78aef3e298b590cfd4bc9a1a91beb0547fb25bc73d220b9")
+
+        for hash_ in (transaction_hash, transaction_hash.internal):
+            c = client_with_mocked_socket()
+            self.loop.run_until_complete(c.transaction_index(hash_))
+
+            c._query_socket.send_multipart.assert_called_with(
+                api_interactions["transaction_index"]["request"]
+            )
+
     def test_response_handling(self):
         c = client_with_mocked_socket()
         c._wait_for_response = CoroutineMock(
@@ -294,6 +331,17 @@ class TestTransactionIndex(asynctest.TestCase):
 
 
 class TestSpend(asynctest.TestCase):
+    def test_spend_with_outpoint(self):
+        c = client_with_mocked_socket()
+        outpoint = OutPoint(
+            "0530375a5bf4ea9a82494fcb5ef4a61076c2af807982076fa810851f4bc31c09",
+            0)
+        self.loop.run_until_complete(c.spend(outpoint))
+
+        c._query_socket.send_multipart.assert_called_with(
+            api_interactions["spend"]["request"]
+        )
+
     def test_spend(self):
         c = client_with_mocked_socket()
         transaction_hash = \
@@ -591,3 +639,33 @@ class TestSubscribeAddress(asynctest.TestCase):
         c._query_socket.send_multipart.assert_called_with(
             api_interactions["subscribe_address"]["request"]
         )
+
+    def test_duplicate_subscription(self):
+        c = client_with_mocked_socket()
+        c._wait_for_response = CoroutineMock(return_value=(None, b""))
+        address = "mngSWw2NC9M1ctqZQxz65DwVomCjm7TWPJ"
+
+        error_code, queue = self.loop.run_until_complete(
+            c.subscribe_address(address))
+        self.assertIsNone(error_code)
+        error_code, _ = self.loop.run_until_complete(
+            c.subscribe_address(address))
+
+        self.assertEqual(error_code, ErrorCode.duplicate)
+        self.assertEqual(c._query_socket.send_multipart.call_count, 1)
+
+    def test_failed_subscription_is_dropped(self):
+        c = client_with_mocked_socket()
+        c._wait_for_response = CoroutineMock(
+            return_value=(ErrorCode.channel_timeout, None))
+        address = "mngSWw2NC9M1ctqZQxz65DwVomCjm7TWPJ"
+
+        for _ in range(2):
+            error_code, _ = self.loop.run_until_complete(
+                c.subscribe_address(address))
+            self.assertEqual(error_code, ErrorCode.channel_timeout)
+
+        self.assertEqual(c._query_socket.send_multipart.call_count, 2)
+        self.assertEqual(
+            c._request_collection.delete_request.call_count, 2)
+        self.assertEqual(c._address_subscriptions, {})
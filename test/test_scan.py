@@ -0,0 +1,98 @@
+import unittest
+
+import bitcoin.core
+from bitcoin.core.script import CScript, CScriptWitness
+
+from pylibbitcoin.scan import LazyTransaction, \
+    block_txids, iter_block_transactions, read_varint, scan_transaction, \
+    write_varint
+
+
+def legacy_transaction(n=0):
+    return bitcoin.core.CTransaction(
+        [bitcoin.core.CTxIn(
+            bitcoin.core.COutPoint(bytes([n]) * 32, n), CScript([b"sig"]))],
+        [bitcoin.core.CTxOut(50_000, CScript([b"\x00" * 20]))])
+
+
+def segwit_transaction():
+    transaction = bitcoin.core.CMutableTransaction(
+        [bitcoin.core.CTxIn(bitcoin.core.COutPoint(b"\x01" * 32, 1))],
+        [bitcoin.core.CTxOut(5, CScript([0, b"\x02" * 20])),
+         bitcoin.core.CTxOut(6, CScript([0, b"\x03" * 20]))])
+    transaction.wit = bitcoin.core.CTxWitness([
+        bitcoin.core.CTxInWitness(CScriptWitness([b"sig", b"pubkey"]))])
+    return bitcoin.core.CTransaction.from_tx(transaction)
+
+
+def make_block(transactions):
+    return bitcoin.core.CBlock(vtx=transactions)
+
+
+class TestReadVarint(unittest.TestCase):
+    def test_sizes(self):
+        self.assertEqual(read_varint(b"\x05", 0), (5, 1))
+        self.assertEqual(read_varint(b"\xfd\x00\x01", 0), (256, 3))
+        self.assertEqual(read_varint(b"\xfe\x00\x00\x01\x00", 0), (65536, 5))
+        self.assertEqual(
+            read_varint(b"\xff" + b"\x00" * 4 + b"\x01\x00\x00\x00", 0),
+            (1 << 32, 9))
+
+    def test_round_trip(self):
+        for value in (5, 0xfc, 0xfd, 256, 65536, 1 << 32):
+            data = write_varint(value)
+            self.assertEqual(read_varint(data, 0), (value, len(data)))
+
+
+class TestScanTransaction(unittest.TestCase):
+    def test_legacy(self):
+        transaction = legacy_transaction()
+        data = transaction.serialize()
+
+        self.assertEqual(
+            scan_transaction(data), (len(data), transaction.GetTxid()))
+
+    def test_segwit(self):
+        transaction = segwit_transaction()
+        data = transaction.serialize()
+
+        self.assertEqual(
+            scan_transaction(data), (len(data), transaction.GetTxid()))
+
+    def test_offset_and_memoryview(self):
+        transaction = segwit_transaction()
+        data = memoryview(b"padding" + transaction.serialize())
+
+        end, txid = scan_transaction(data, 7)
+        self.assertEqual(end, len(data))
+        self.assertEqual(txid, transaction.GetTxid())
+
+
+class TestBlockTransactions(unittest.TestCase):
+    def test_block_txids(self):
+        transactions = [
+            legacy_transaction(0), segwit_transaction(), legacy_transaction(1)]
+        data = make_block(transactions).serialize()
+
+        self.assertEqual(
+            block_txids(data),
+            [transaction.GetTxid() for transaction in transactions])
+
+    def test_boundaries(self):
+        transactions = [legacy_transaction(0), segwit_transaction()]
+        data = make_block(transactions).serialize()
+
+        for (start, end, _), transaction in zip(
+                iter_block_transactions(data), transactions):
+            self.assertEqual(data[start:end], transaction.serialize())
+
+
+class TestLazyTransaction(unittest.TestCase):
+    def test_deserializes_on_access(self):
+        transaction = segwit_transaction()
+        lazy = LazyTransaction(memoryview(transaction.serialize()))
+
+        self.assertEqual(lazy.txid, transaction.GetTxid())
+        self.assertIsNone(lazy._transaction)
+        self.assertEqual(lazy.transaction, transaction)
+        self.assertIs(lazy.transaction, lazy.transaction)
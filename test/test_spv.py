@@ -0,0 +1,95 @@
+import unittest
+
+import asynctest
+from asynctest import CoroutineMock, MagicMock
+import bitcoin.core
+
+from pylibbitcoin.client import merkle_levels, merkle_root
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.spv import InclusionVerifier, branch_root, merkle_proof
+
+TXIDS = [bytes([i]) * 32 for i in range(7)]
+
+
+class TestMerkleProof(unittest.TestCase):
+    def test_every_leaf(self):
+        levels = merkle_levels(TXIDS)
+
+        for index, txid in enumerate(TXIDS):
+            branch = merkle_proof(levels, index)
+            self.assertEqual(len(branch), 3)
+            self.assertEqual(branch_root(txid, index, branch),
+                             merkle_root(TXIDS))
+
+    def test_wrong_index(self):
+        branch = merkle_proof(merkle_levels(TXIDS), 2)
+
+        self.assertNotEqual(branch_root(TXIDS[2], 3, branch),
+                            merkle_root(TXIDS))
+
+
+class TestInclusionVerifier(asynctest.TestCase):
+    def setUp(self):
+        header = bitcoin.core.CBlockHeader(
+            hashMerkleRoot=merkle_root(TXIDS))
+        self.client = MagicMock()
+        self.client.transaction_index = CoroutineMock(
+            side_effect=lambda txid: (None, (100, TXIDS.index(txid))))
+        self.client.block_header = CoroutineMock(return_value=(None, header))
+        self.client.block_transaction_hashes = CoroutineMock(
+            return_value=(None, [(txid,) for txid in TXIDS]))
+        self.verifier = InclusionVerifier(self.client)
+
+    def test_verify_inclusion(self):
+        error_code, proof = self.loop.run_until_complete(
+            self.verifier.verify_inclusion(TXIDS[3][::-1].hex()))
+
+        self.assertIsNone(error_code)
+        self.assertEqual(proof["height"], 100)
+        self.assertEqual(proof["index"], 3)
+        self.assertEqual(
+            branch_root(TXIDS[3], 3, proof["branch"]),
+            proof["header"].hashMerkleRoot)
+
+    def test_block_is_cached(self):
+        for txid in TXIDS[:3]:
+            self.loop.run_until_complete(
+                self.verifier.verify_inclusion(txid))
+
+        self.client.block_transaction_hashes.assert_called_once_with(100)
+        self.client.block_header.assert_called_once_with(100)
+
+    def test_wrong_position(self):
+        self.client.transaction_index = CoroutineMock(
+            return_value=(None, (100, 1)))
+
+        error_code, proof = self.loop.run_until_complete(
+            self.verifier.verify_inclusion(TXIDS[3]))
+
+        self.assertEqual(error_code, ErrorCode.merkle_mismatch)
+        self.assertIsNone(proof)
+
+    def test_hashes_dont_match_header(self):
+        self.client.block_transaction_hashes = CoroutineMock(
+            return_value=(None, [(txid,) for txid in TXIDS[:-1]]))
+
+        error_code, _ = self.loop.run_until_complete(
+            self.verifier.verify_inclusion(TXIDS[3]))
+
+        self.assertEqual(error_code, ErrorCode.merkle_mismatch)
+
+    def test_verify_inclusion_many(self):
+        unknown = b"\xff" * 32
+        self.client.transaction_index = CoroutineMock(
+            side_effect=lambda txid: (ErrorCode.not_found, None)
+            if txid == unknown else (None, (100, TXIDS.index(txid))))
+
+        results = self.loop.run_until_complete(
+            self.verifier.verify_inclusion_many(TXIDS + [unknown]))
+
+        self.assertEqual(results[unknown], (ErrorCode.not_found, None))
+        for index, txid in enumerate(TXIDS):
+            error_code, proof = results[txid]
+            self.assertIsNone(error_code)
+            self.assertEqual(proof["index"], index)
+        self.client.block_transaction_hashes.assert_called_once_with(100)
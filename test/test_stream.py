@@ -0,0 +1,346 @@
+import asyncio
+import struct
+import unittest
+
+import asynctest
+from asynctest import CoroutineMock, MagicMock
+import bitcoin.core
+
+from pylibbitcoin.scan import LazyTransaction
+from pylibbitcoin.stream import BoundedQueue, SeenFilter, SequenceTracker
+
+from .helpers import PORTS, client_with_mocked_socket
+
+
+class TestSequenceTracker(unittest.TestCase):
+    def test_no_gap(self):
+        tracker = SequenceTracker()
+        for sequence in (5, 6, 7):
+            self.assertEqual(tracker.update(sequence), 0)
+
+        self.assertEqual(tracker.gaps, 0)
+
+    def test_gap(self):
+        tracker = SequenceTracker()
+        tracker.update(5)
+
+        self.assertEqual(tracker.update(9), 3)
+        self.assertEqual(tracker.gaps, 1)
+        self.assertEqual(tracker.missed, 3)
+
+    def test_wrap_around(self):
+        tracker = SequenceTracker()
+        tracker.update(0xffff)
+
+        self.assertEqual(tracker.update(0), 0)
+        self.assertEqual(tracker.update(2), 1)
+
+
+class TestSeenFilter(unittest.TestCase):
+    def test_duplicates(self):
+        seen = SeenFilter(10)
+
+        self.assertTrue(seen.add(b"\x01" * 32))
+        self.assertFalse(seen.add(b"\x01" * 32))
+        self.assertIn(b"\x01" * 32, seen)
+
+    def test_capacity(self):
+        seen = SeenFilter(2)
+        for i in range(3):
+            seen.add(bytes([i]) * 32)
+
+        self.assertEqual(len(seen), 2)
+        self.assertNotIn(b"\x00" * 32, seen)
+        self.assertTrue(seen.add(b"\x00" * 32))
+
+
+class TestBoundedQueue(asynctest.TestCase):
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            BoundedQueue(1, "explode")
+
+    def test_drop_oldest(self):
+        queue = BoundedQueue(2, "drop_oldest")
+        for item in range(4):
+            self.loop.run_until_complete(queue.put(item))
+
+        self.assertEqual(queue.dropped, 2)
+        self.assertEqual([queue.get_nowait(), queue.get_nowait()], [2, 3])
+
+    def test_coalesce(self):
+        queue = BoundedQueue(3, "coalesce")
+        for item in range(4):
+            queue.put_nowait(item)
+
+        self.assertEqual(queue.dropped, 3)
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get_nowait(), 3)
+
+    def test_block(self):
+        queue = BoundedQueue(1, "block")
+        queue.put_nowait(0)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(
+                asyncio.wait_for(queue.put(1), 0.01))
+        self.assertEqual(queue.dropped, 0)
+
+    def test_get_many(self):
+        queue = BoundedQueue()
+        for item in range(5):
+            queue.put_nowait(item)
+
+        self.assertEqual(
+            self.loop.run_until_complete(queue.get_many(3)), [0, 1, 2])
+        self.assertEqual(
+            self.loop.run_until_complete(queue.get_many(3)), [3, 4])
+
+    def test_get_many_waits(self):
+        queue = BoundedQueue()
+
+        async def produce():
+            for item in range(3):
+                await asyncio.sleep(0.005)
+                queue.put_nowait(item)
+
+        async def consume():
+            asyncio.ensure_future(produce())
+            return await queue.get_many(10, max_wait=0.1)
+
+        self.assertEqual(self.loop.run_until_complete(consume()), [0, 1, 2])
+
+    def test_get_many_gives_up(self):
+        queue = BoundedQueue()
+        queue.put_nowait(0)
+
+        self.assertEqual(
+            self.loop.run_until_complete(
+                queue.get_many(10, max_wait=0.01)),
+            [0])
+        queue.put_nowait(1)
+        self.assertEqual(queue.get_nowait(), 1)
+
+    def test_batches(self):
+        queue = BoundedQueue()
+        for item in range(5):
+            queue.put_nowait(item)
+
+        async def consume():
+            batches = []
+            async for batch in queue.batches(2):
+                batches.append(batch)
+                if len(batches) == 3:
+                    return batches
+
+        self.assertEqual(
+            self.loop.run_until_complete(consume()), [[0, 1], [2, 3], [4]])
+
+
+def block_frame(sequence, height, block):
+    return [
+        struct.pack("<H", sequence),
+        struct.pack("<I", height),
+        block.serialize(),
+    ]
+
+
+class TestBlockModes(asynctest.TestCase):
+    block = bitcoin.core.CBlock(
+        nVersion=2,
+        vtx=[bitcoin.core.CTransaction(
+            [bitcoin.core.CTxIn()], [bitcoin.core.CTxOut(50)])])
+
+    def client(self, frames):
+        client = client_with_mocked_socket()
+        self.clients.append(client)
+        self.pending = asyncio.Future()
+        client._block_socket.recv_multipart = CoroutineMock(
+            side_effect=frames + [self.pending])
+        return client
+
+    def subscribe(self, frames, **kwargs):
+        queue = self.loop.run_until_complete(
+            self.client(frames).subscribe_to_blocks(**kwargs))
+        # Let the listener drain the frames.
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        return queue
+
+    def setUp(self):
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            for task in client._listeners.values():
+                task.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_modes(self):
+        expectations = {
+            "block": lambda block: block.GetHash() == self.block.GetHash(),
+            "raw": lambda block: block == self.block.serialize(),
+            "header": lambda block: isinstance(
+                block, bitcoin.core.CBlockHeader) and block.nVersion == 2,
+            "txids": lambda txids: txids == [self.block.vtx[0].GetTxid()],
+        }
+        for mode, expectation in expectations.items():
+            queue = self.subscribe(
+                [block_frame(1, 100, self.block)], mode=mode)
+            _, height, block = queue.get_nowait()
+
+            self.assertEqual(height, 100)
+            self.assertTrue(expectation(block), mode)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            self.subscribe([], mode="compressed")
+
+    def test_gaps_and_overflow(self):
+        frames = [
+            block_frame(sequence, 100 + sequence, self.block)
+            for sequence in (1, 2, 5, 6)
+        ]
+        queue = self.subscribe(
+            frames, mode="raw", maxsize=2, overflow="drop_oldest")
+
+        self.assertEqual(queue.sequence.gaps, 1)
+        self.assertEqual(queue.sequence.missed, 2)
+        self.assertEqual(queue.dropped, 2)
+        self.assertEqual(queue.get_nowait()[1], 105)
+
+    def test_concurrent_subscribers(self):
+        frames = [
+            block_frame(sequence, 100 + sequence, self.block)
+            for sequence in range(6)
+        ]
+        client = self.client(frames)
+
+        async def subscribe():
+            first = await client.subscribe_to_blocks(mode="raw")
+            second = await client.subscribe_to_blocks(mode="header")
+            await asyncio.sleep(0.01)
+            return first, second
+
+        for queue in self.loop.run_until_complete(subscribe()):
+            self.assertEqual(
+                [queue.get_nowait()[1] for _ in range(queue.qsize())],
+                list(range(100, 106)))
+        self.assertEqual(len(client._listeners), 1)
+
+    def test_bad_frames_are_dropped(self):
+        frames = [
+            [b"\x01", struct.pack("<I", 101), self.block.serialize()],
+            [struct.pack("<H", 2)],
+            block_frame(3, 103, self.block),
+        ]
+        with self.assertLogs("pylibbitcoin.client", "WARNING"):
+            queue = self.subscribe(frames, mode="raw")
+
+        self.assertEqual(queue.get_nowait()[1], 103)
+        self.assertEqual(self.clients[0].bad_messages, 2)
+
+    def test_decoder_errors_stay_in_their_mode(self):
+        client = self.client([
+            [struct.pack("<H", 1), struct.pack("<I", 101), b"\x02" * 10],
+            block_frame(2, 102, self.block),
+        ])
+
+        async def subscribe():
+            block = await client.subscribe_to_blocks(mode="block")
+            raw = await client.subscribe_to_blocks(mode="raw")
+            await asyncio.sleep(0.01)
+            return block, raw
+
+        block, raw = self.loop.run_until_complete(subscribe())
+        self.assertEqual(block.get_nowait()[1], 102)
+        self.assertTrue(block.empty())
+        self.assertEqual(
+            [raw.get_nowait()[1] for _ in range(raw.qsize())], [101, 102])
+        self.assertEqual(client.bad_messages, 1)
+
+
+class TestTransactionStream(asynctest.TestCase):
+    transaction = bitcoin.core.CTransaction(
+        [bitcoin.core.CTxIn()], [bitcoin.core.CTxOut(50)])
+
+    def setUp(self):
+        self.client = client_with_mocked_socket(dict(PORTS, tx=9094))
+
+    def tearDown(self):
+        for task in self.client._listeners.values():
+            task.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+    def subscribe(self, frames, modes=("transaction",)):
+        self.client._transaction_socket = MagicMock()
+        self.client._transaction_socket.recv_multipart = CoroutineMock(
+            side_effect=frames + [asyncio.Future()])
+        # Subscribed together, before the listener reads a frame.
+        queues = self.loop.run_until_complete(asyncio.gather(*[
+            self.client.subscribe_to_transactions(mode) for mode in modes]))
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        return queues
+
+    def frame(self, sequence):
+        return [struct.pack("<H", sequence), self.transaction.serialize()]
+
+    def test_duplicates_are_dropped(self):
+        [queue] = self.subscribe([self.frame(1), self.frame(2)])
+
+        sequence, txid, transaction = queue.get_nowait()
+        self.assertEqual(sequence, 1)
+        self.assertEqual(txid, self.transaction.GetTxid())
+        self.assertEqual(transaction, self.transaction)
+        self.assertTrue(queue.empty())
+        self.assertEqual(queue.sequence.last, 2)
+
+    def test_modes(self):
+        raw_queue, lazy_queue = self.subscribe(
+            [self.frame(1)], modes=("raw", "lazy"))
+
+        _, _, raw = raw_queue.get_nowait()
+        self.assertEqual(raw, self.transaction.serialize())
+        _, _, lazy = lazy_queue.get_nowait()
+        self.assertIsInstance(lazy, LazyTransaction)
+        self.assertEqual(lazy.transaction, self.transaction)
+
+    def test_every_queue_gets_every_transaction(self):
+        other = bitcoin.core.CTransaction(
+            [bitcoin.core.CTxIn()], [bitcoin.core.CTxOut(60)])
+        frames = [
+            self.frame(1),
+            [struct.pack("<H", 2), other.serialize()],
+            self.frame(3),
+            [struct.pack("<H", 4), other.serialize()],
+        ]
+        queues = self.subscribe(frames, modes=("raw", "raw"))
+
+        for queue in queues:
+            self.assertEqual(
+                [queue.get_nowait()[0] for _ in range(queue.qsize())],
+                [1, 2])
+            self.assertEqual(queue.sequence.last, 4)
+            self.assertEqual(queue.sequence.gaps, 0)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            self.subscribe([], modes=("compressed",))
+
+    def test_bad_frames_are_dropped(self):
+        frames = [
+            [b"\x01", self.transaction.serialize()],
+            [struct.pack("<H", 2), b"\x01"],
+            self.frame(3),
+        ]
+        [queue] = self.subscribe(frames)
+
+        self.assertEqual(queue.get_nowait()[0], 3)
+        self.assertEqual(self.client.bad_messages, 2)
+
+    def test_decoder_errors_stay_in_their_mode(self):
+        padded = [struct.pack("<H", 1), self.transaction.serialize() + b"\x00"]
+        transaction_queue, raw_queue = self.subscribe(
+            [padded], modes=("transaction", "raw"))
+
+        self.assertTrue(transaction_queue.empty())
+        self.assertEqual(raw_queue.get_nowait()[0], 1)
+        self.assertEqual(self.client.bad_messages, 1)
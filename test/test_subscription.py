@@ -0,0 +1,313 @@
+import asyncio
+import itertools
+import struct
+import tracemalloc
+from unittest.mock import patch
+
+import asynctest
+from asynctest import CoroutineMock, MagicMock
+import bitcoin.base58
+
+import pylibbitcoin.client
+from pylibbitcoin.client import Request, RequestCollection, Response
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.subscription import AddressSubscriptions, _Route
+
+from .helpers import client_with_mocked_socket
+
+
+def make_address(i):
+    return bitcoin.base58.encode(
+        b"\x00" + struct.pack("<I", i) * 5 + b"\x00" * 4)
+
+
+def echoing_socket():
+    """A socket which confirms every request sent on it."""
+    responses = asyncio.Queue()
+
+    async def send_multipart(frames):
+        command, request_id, _ = frames
+        responses.put_nowait([command, request_id, b"\x00" * 4])
+
+    socket = MagicMock()
+    socket.send_multipart = send_multipart
+    socket.recv_multipart = lambda **kwargs: responses.get()
+    return socket
+
+
+def mocked_client():
+    client = MagicMock()
+    client._subscribe_address_hash = CoroutineMock(return_value=None)
+    client._unsubscribe_address_hash = CoroutineMock(
+        return_value=(None, b""))
+    return client
+
+
+class TestAddressSubscriptions(asynctest.TestCase):
+    def test_shared_subscription(self):
+        client = mocked_client()
+        subscriptions = AddressSubscriptions(client)
+        first, second = asyncio.Queue(), asyncio.Queue()
+
+        self.loop.run_until_complete(
+            subscriptions.subscribe([make_address(1)], first))
+        self.loop.run_until_complete(
+            subscriptions.subscribe([make_address(1)], second))
+
+        self.assertEqual(client._subscribe_address_hash.call_count, 1)
+        self.assertIn(make_address(1), subscriptions)
+
+    def test_routing(self):
+        client = mocked_client()
+        subscriptions = AddressSubscriptions(client)
+        first, second = asyncio.Queue(), asyncio.Queue()
+        self.loop.run_until_complete(
+            subscriptions.subscribe([make_address(1)], first))
+        self.loop.run_until_complete(
+            subscriptions.subscribe([make_address(1), make_address(2)],
+                                    second))
+        routes = {
+            call[0][0]: call[0][1]
+            for call in client._subscribe_address_hash.call_args_list
+        }
+
+        address_hash = pylibbitcoin.client.decode_address(make_address(2))
+        routes[address_hash].put_nowait((1, 100, b"\xaa" * 32))
+
+        self.assertTrue(first.empty())
+        self.assertEqual(
+            second.get_nowait(), (address_hash, 1, 100, b"\xaa" * 32))
+
+    def test_unsubscribe_last_consumer(self):
+        client = mocked_client()
+        subscriptions = AddressSubscriptions(client)
+        first, second = asyncio.Queue(), asyncio.Queue()
+        for queue in (first, second):
+            self.loop.run_until_complete(
+                subscriptions.subscribe([make_address(1)], queue))
+
+        self.loop.run_until_complete(
+            subscriptions.unsubscribe([make_address(1)], first))
+        client._unsubscribe_address_hash.assert_not_called()
+
+        self.loop.run_until_complete(
+            subscriptions.unsubscribe([make_address(1)], second))
+        client._unsubscribe_address_hash.assert_called_once_with(
+            pylibbitcoin.client.decode_address(make_address(1)))
+        self.assertEqual(len(subscriptions), 0)
+
+    def test_failures_are_reported(self):
+        client = mocked_client()
+        client._subscribe_address_hash = CoroutineMock(
+            return_value=ErrorCode.channel_timeout)
+        subscriptions = AddressSubscriptions(client)
+
+        failures = self.loop.run_until_complete(
+            subscriptions.subscribe([make_address(1)], asyncio.Queue()))
+
+        self.assertEqual(
+            failures, {make_address(1): ErrorCode.channel_timeout})
+        self.assertEqual(len(subscriptions), 0)
+
+    def test_concurrent_subscribers_share_the_outcome(self):
+        client = mocked_client()
+        outcome = asyncio.Future()
+
+        async def subscribe_address_hash(address_hash, route):
+            return await outcome
+
+        client._subscribe_address_hash = subscribe_address_hash
+        subscriptions = AddressSubscriptions(client)
+        first, second = asyncio.Queue(), asyncio.Queue()
+
+        async def run():
+            subscribing = [
+                asyncio.ensure_future(
+                    subscriptions.subscribe([make_address(1)], queue))
+                for queue in (first, second)
+            ]
+            await asyncio.sleep(0)
+            self.assertFalse(subscribing[1].done())
+            outcome.set_result(ErrorCode.channel_timeout)
+            return await asyncio.gather(*subscribing)
+
+        failures = self.loop.run_until_complete(run())
+
+        self.assertEqual(
+            failures, [{make_address(1): ErrorCode.channel_timeout}] * 2)
+        self.assertEqual(len(subscriptions), 0)
+
+    def test_failure_keeps_other_consumers(self):
+        client = mocked_client()
+        subscriptions = AddressSubscriptions(client)
+        first, second = asyncio.Queue(), asyncio.Queue()
+        self.loop.run_until_complete(
+            subscriptions.subscribe([make_address(1)], first))
+        client._subscribe_address_hash = CoroutineMock(
+            return_value=ErrorCode.channel_timeout)
+
+        failures = self.loop.run_until_complete(subscriptions.subscribe(
+            [make_address(1), make_address(2)], second))
+
+        self.assertEqual(
+            failures, {make_address(2): ErrorCode.channel_timeout})
+        address_hash = pylibbitcoin.client.decode_address(make_address(1))
+        subscriptions._dispatch(address_hash, (1, 100, b"\xaa" * 32))
+        self.assertEqual(first.qsize(), 1)
+        self.assertEqual(second.qsize(), 1)
+        self.assertNotIn(make_address(2), subscriptions)
+
+    def test_failed_unsubscribe_is_undone(self):
+        client = mocked_client()
+        client._unsubscribe_address_hash = CoroutineMock(
+            return_value=(ErrorCode.channel_timeout, None))
+        subscriptions = AddressSubscriptions(client)
+        queue = asyncio.Queue()
+        self.loop.run_until_complete(
+            subscriptions.subscribe([make_address(1)], queue))
+
+        failures = self.loop.run_until_complete(
+            subscriptions.unsubscribe([make_address(1)], queue))
+
+        self.assertEqual(
+            failures, {make_address(1): ErrorCode.channel_timeout})
+        self.assertIn(make_address(1), subscriptions)
+        address_hash = pylibbitcoin.client.decode_address(make_address(1))
+        subscriptions._dispatch(address_hash, (1, 100, b"\xaa" * 32))
+        self.assertEqual(queue.qsize(), 1)
+
+    def test_rate_control(self):
+        client = mocked_client()
+        subscriptions = AddressSubscriptions(client, batch_size=2, rate=100)
+        addresses = [make_address(i) for i in range(5)]
+
+        started = self.loop.time()
+        self.loop.run_until_complete(
+            subscriptions.subscribe(addresses, asyncio.Queue()))
+
+        # Two pauses of 2 / 100 seconds between the three batches.
+        self.assertGreaterEqual(self.loop.time() - started, 0.04)
+        self.assertEqual(client._subscribe_address_hash.call_count, 5)
+
+    def test_full_queue_misses_the_notification(self):
+        subscriptions = AddressSubscriptions(mocked_client())
+        full, other = asyncio.Queue(1), asyncio.Queue()
+        full.put_nowait(None)
+        for queue in (full, other):
+            self.loop.run_until_complete(
+                subscriptions.subscribe([make_address(1)], queue))
+
+        address_hash = pylibbitcoin.client.decode_address(make_address(1))
+        subscriptions._dispatch(address_hash, (7, 500_000, b"\xbb" * 32))
+
+        self.assertEqual(subscriptions.dropped, 1)
+        self.assertEqual(full.qsize(), 1)
+        self.assertEqual(
+            other.get_nowait(), (address_hash, 7, 500_000, b"\xbb" * 32))
+
+    def test_memory_per_subscription(self):
+        client = client_with_mocked_socket(
+            make_socket=echoing_socket, mock_collection=False)
+        subscriptions = AddressSubscriptions(client, batch_size=250)
+        addresses = [make_address(i) for i in range(1_000)]
+        queue = asyncio.Queue()
+
+        with patch("pylibbitcoin.client.create_random_id",
+                   itertools.count().__next__):
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            failures = self.loop.run_until_complete(
+                subscriptions.subscribe(addresses, queue))
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        self.assertEqual(failures, {})
+        self.assertEqual(len(client._address_subscriptions), 1_000)
+        retained = sum(
+            stat.size_diff for stat in after.compare_to(before, "filename"))
+        self.assertLess(retained / len(addresses), 2_500)
+        self.loop.run_until_complete(client.stop())
+
+
+class TestAddressNotifications(asynctest.TestCase):
+    def setUp(self):
+        socket = MagicMock()
+        socket.recv_multipart = lambda copy: asyncio.Future()
+        self.collection = RequestCollection(socket, self.loop)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.collection.stop())
+
+    def subscription(self):
+        request = Request(b"subscribe.address")
+        request.queue = asyncio.Queue()
+        self.collection.add_request(request)
+        self.collection._handle_response(Response([
+            b"subscribe.address",
+            struct.pack("<I", request.id_),
+            b"\x00\x00\x00\x00"]))
+        return request
+
+    def test_notification_is_decoded(self):
+        request = self.subscription()
+
+        self.collection._handle_response(Response([
+            b"subscribe.address",
+            struct.pack("<I", request.id_),
+            b"\x00\x00\x00\x00" + struct.pack("<HI", 7, 500_000)
+            + b"\xbb" * 32]))
+
+        self.assertEqual(
+            request.queue.get_nowait(), (7, 500_000, b"\xbb" * 32))
+
+    def test_service_stopped_removes_subscription(self):
+        request = self.subscription()
+
+        self.collection._handle_response(Response([
+            b"subscribe.address",
+            struct.pack("<I", request.id_),
+            struct.pack("<I", ErrorCode.service_stopped.value)]))
+
+        self.assertNotIn(request.id_, self.collection._requests)
+
+    def test_full_queue_keeps_the_collection_running(self):
+        subscriptions = AddressSubscriptions(mocked_client())
+        full = asyncio.Queue(1)
+        full.put_nowait(None)
+        self.loop.run_until_complete(
+            subscriptions.subscribe([make_address(1)], full))
+        address_hash = pylibbitcoin.client.decode_address(make_address(1))
+        self.addCleanup(patch.stopall)
+        patch("pylibbitcoin.client.create_random_id",
+              itertools.count().__next__).start()
+        request = self.subscription()
+        request.queue = _Route(subscriptions, address_hash)
+
+        self.collection._handle_response(Response([
+            b"subscribe.address",
+            struct.pack("<I", request.id_),
+            b"\x00\x00\x00\x00" + struct.pack("<HI", 7, 500_000)
+            + b"\xbb" * 32]))
+
+        self.assertEqual(subscriptions.dropped, 1)
+        other = Request(b"fetch_last_height")
+        self.collection.add_request(other)
+        self.collection._handle_response(Response([
+            b"fetch_last_height",
+            struct.pack("<I", other.id_),
+            b"\x00\x00\x00\x00" + struct.pack("<I", 1)]))
+        self.assertTrue(other.future.done())
+
+
+class TestUnsubscribeAddress(asynctest.TestCase):
+    def test_request_is_removed(self):
+        client = client_with_mocked_socket()
+        client._wait_for_response = CoroutineMock(return_value=(None, b""))
+        address = "mngSWw2NC9M1ctqZQxz65DwVomCjm7TWPJ"
+
+        self.loop.run_until_complete(client.subscribe_address(address))
+        self.assertEqual(len(client._address_subscriptions), 1)
+
+        self.loop.run_until_complete(client.unsubscribe_address(address))
+        self.assertEqual(len(client._address_subscriptions), 0)
+        client._request_collection.delete_request.assert_called_once()
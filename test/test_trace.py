@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+import json
+import struct
+import unittest
+from unittest.mock import patch
+
+import asynctest
+from asynctest import CoroutineMock
+
+from pylibbitcoin.trace import Profiler, STAGES, Tracer
+
+from .helpers import client_with_mocked_socket
+
+
+class FakeRequest:
+    def __init__(self, id_, command=b"blockchain.fetch_last_height"):
+        self.id_ = id_
+        self.command = command
+
+
+class TestTracer(unittest.TestCase):
+    def test_ring_buffer(self):
+        tracer = Tracer(size=4)
+        for id_ in range(3):
+            tracer.record(FakeRequest(id_), "created", id_)
+            tracer.record(FakeRequest(id_), "sent", id_ + 0.5)
+
+        self.assertEqual(len(tracer), 4)
+        self.assertEqual([request["id"] for request in tracer.requests()],
+                         [1, 2])
+
+    def test_dumps(self):
+        tracer = Tracer()
+        request = FakeRequest(7)
+        for timestamp, stage in enumerate(STAGES):
+            tracer.record(request, stage, timestamp / 1000)
+
+        [traced] = json.loads(tracer.to_json())
+        self.assertEqual(traced["command"], "blockchain.fetch_last_height")
+        self.assertEqual(list(traced["stages"]), list(STAGES))
+
+        events = json.loads(tracer.to_chrome_trace())["traceEvents"]
+        self.assertEqual([event["name"] for event in events],
+                         list(STAGES[1:]))
+        self.assertEqual(events[0]["ts"], 0)
+        self.assertAlmostEqual(events[0]["dur"], 1000)
+        self.assertEqual(events[0]["tid"], 7)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_sampling(self):
+        profiler = Profiler(sample_every=2)
+
+        results = [profiler.call(sum, [i, 1]) for i in range(4)]
+
+        self.assertEqual(results, [1, 2, 3, 4])
+        self.assertEqual(profiler.samples, 2)
+        self.assertTrue(profiler.stats().stats)
+
+
+class TestClientTracing(asynctest.TestCase):
+    def setUp(self):
+        responses = asyncio.Queue()
+
+        async def send_multipart(frame):
+            command, request_id, _ = frame
+            await responses.put([
+                command, request_id,
+                b"\x00\x00\x00\x00" + struct.pack("<I", 1000)])
+
+        socket = CoroutineMock()
+        socket.send_multipart = send_multipart
+        socket.recv_multipart = lambda copy: responses.get()
+        self.tracer = Tracer()
+        self.profiler = Profiler(sample_every=1)
+        self.client = client_with_mocked_socket(
+            make_socket=lambda: socket, mock_collection=False, timeout=1,
+            tracer=self.tracer, profiler=self.profiler)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.stop())
+
+    def test_every_stage_is_traced(self):
+        with patch("pylibbitcoin.client.create_random_id",
+                   itertools.count().__next__):
+            self.assertEqual(
+                self.loop.run_until_complete(self.client.last_height()),
+                (None, 1000))
+
+        [traced] = self.tracer.requests()
+        self.assertEqual(list(traced["stages"]), list(STAGES))
+        timestamps = list(traced["stages"].values())
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(self.profiler.samples, 1)
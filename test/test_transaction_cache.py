@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import asynctest
+from asynctest import CoroutineMock
+import bitcoin.core
+
+import pylibbitcoin.client
+import pylibbitcoin.error_code
+from pylibbitcoin.transaction_cache import TransactionCache
+
+from .helpers import client_with_mocked_socket
+
+
+class TestTransactionCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "transactions.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_miss(self):
+        cache = TransactionCache(self.path)
+
+        self.assertIsNone(cache.get(b"\x01" * 32))
+        self.assertNotIn(b"\x01" * 32, cache)
+        cache.close()
+
+    def test_raw_and_deserialized_lookup(self):
+        raw = bitcoin.core.CTransaction().serialize()
+        cache = TransactionCache(self.path)
+        cache.put(b"\x01" * 32, raw)
+
+        self.assertEqual(cache.get(b"\x01" * 32), raw)
+        self.assertIsInstance(
+            cache.get(b"\x01" * 32, deserialize=True),
+            bitcoin.core.CTransaction)
+        cache.close()
+
+    def test_persistence(self):
+        cache = TransactionCache(self.path)
+        cache.put(b"\x01" * 32, b"raw")
+        cache.close()
+
+        cache = TransactionCache(self.path)
+        self.assertEqual(cache.get(b"\x01" * 32), b"raw")
+        self.assertEqual(cache.size, 3)
+        cache.close()
+
+    def test_duplicate_put(self):
+        cache = TransactionCache(self.path)
+        cache.put(b"\x01" * 32, b"raw")
+        cache.put(b"\x01" * 32, b"raw")
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, 3)
+        cache.close()
+
+    def test_eviction_of_oldest(self):
+        cache = TransactionCache(self.path, max_size=25)
+        for i in range(5):
+            cache.put(bytes([i]) * 32, b"x" * 10)
+
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.size, 25)
+        self.assertIsNone(cache.get(b"\x00" * 32))
+        self.assertEqual(cache.get(b"\x04" * 32), b"x" * 10)
+        cache.close()
+
+    def test_readers_in_other_threads(self):
+        cache = TransactionCache(self.path)
+        cache.put(b"\x01" * 32, b"raw")
+        results = []
+
+        def read():
+            results.append(cache.get(b"\x01" * 32))
+            cache.close()
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [b"raw"] * 4)
+        cache.close()
+
+
+class TestClientWithTransactionCache(asynctest.TestCase):
+    transaction_hash = \
+        "e400712f48693950b78aef3e298b590cfd4bc9a1a91beb0547fb25bc73d220b9"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = TransactionCache(
+            os.path.join(self.directory, "transactions.sqlite"))
+
+        self.client = client_with_mocked_socket(
+            transaction_cache=self.cache)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def test_fetched_transaction_is_cached(self):
+        raw = bitcoin.core.CTransaction().serialize()
+        self.client._wait_for_response = CoroutineMock(
+            return_value=(None, raw))
+
+        self.loop.run_until_complete(
+            self.client.transaction(self.transaction_hash))
+
+        self.assertEqual(
+            self.cache.get(bytes.fromhex(self.transaction_hash)[::-1]), raw)
+
+    def test_cached_transaction_skips_the_server(self):
+        self.cache.put(
+            bytes.fromhex(self.transaction_hash)[::-1],
+            bitcoin.core.CTransaction().serialize())
+
+        for method in (self.client.transaction, self.client.transaction2):
+            error_code, transaction = self.loop.run_until_complete(
+                method(self.transaction_hash))
+
+            self.assertIsNone(error_code)
+            self.assertIsInstance(transaction, bitcoin.core.CTransaction)
+        self.client._query_socket.send_multipart.assert_not_called()
+
+    def test_errors_are_not_cached(self):
+        self.client._wait_for_response = CoroutineMock(return_value=(
+            pylibbitcoin.error_code.ErrorCode.not_found, None))
+
+        error_code, _ = self.loop.run_until_complete(
+            self.client.transaction(self.transaction_hash))
+
+        self.assertEqual(
+            error_code, pylibbitcoin.error_code.ErrorCode.not_found)
+        self.assertEqual(len(self.cache), 0)
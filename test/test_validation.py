@@ -0,0 +1,204 @@
+import asyncio
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import asynctest
+from asynctest import CoroutineMock, MagicMock
+import bitcoin.core
+
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.header_store import HeaderStore, header_hash
+from pylibbitcoin.validation import HeaderValidator, REGTEST_POW_LIMIT, \
+    bits_to_target, retarget, target_to_bits
+
+GENESIS = bytes.fromhex("0100000000000000000000000000000000000000000000000000000000000000000000003ba3edfd7a7b12b27ac72c3e67768f617fc81bc3888a51323a9fb8aa4b1e5e4a29ab5f49ffff001d1dac2b7c")  # noqa: E501
+BLOCK_1 = bytes.fromhex("010000006fe28c0ab6f1b372c1a6a246ae63f74f931e8365e15a089c68d6190000000000982051fd1e4ba744bbbe680e1fee14677ba1a3c3540bf7b1cdb606e857233e0e61bc6649ffff001d01e36299")  # noqa: E501
+
+EASY_BITS = 0x207fffff
+
+
+def mine(prev, time, bits=EASY_BITS, valid=True):
+    """A header meeting (or, without `valid`, failing) `bits`."""
+    target = bits_to_target(bits)
+    nonce = 0
+    while True:
+        raw = struct.pack(
+            "<I32s32sIII", 1, prev, b"\x01" * 32, time, bits, nonce)
+        if (int.from_bytes(header_hash(raw), "little") <= target) == valid:
+            return raw
+        nonce += 1
+
+
+def make_chain(length, times=None, bits=None):
+    headers = []
+    prev = b"\x00" * 32
+    for height in range(length):
+        raw = mine(prev, times[height] if times else 1000 + height * 600,
+                   bits[height] if bits else EASY_BITS)
+        headers.append(raw)
+        prev = header_hash(raw)
+    return headers
+
+
+def regtest_validator(**kwargs):
+    return HeaderValidator(pow_limit=REGTEST_POW_LIMIT, retarget=False,
+                           **kwargs)
+
+
+class TestCompactBits(unittest.TestCase):
+    def test_round_trip(self):
+        for bits in (0x1d00ffff, 0x1b0404cb, 0x207fffff, 0x17053894):
+            self.assertEqual(target_to_bits(bits_to_target(bits)), bits)
+
+    def test_invalid(self):
+        self.assertIsNone(bits_to_target(0x1d800000 | 0xffff))
+        self.assertIsNone(bits_to_target(0))
+        self.assertIsNone(bits_to_target(0xff00ffff))
+
+    def test_retarget(self):
+        timespan = 14 * 24 * 60 * 60
+        limit = (1 << 224) - 1
+
+        self.assertEqual(
+            retarget(0x1d00ffff, 0, timespan // 2, timespan, limit),
+            target_to_bits(bits_to_target(0x1d00ffff) // 2))
+        # Clamped to a quarter of the timespan, and to the limit.
+        self.assertEqual(retarget(0x1d00ffff, 0, 1, timespan, limit),
+                         retarget(0x1d00ffff, 0, timespan // 4, timespan,
+                                  limit))
+        self.assertEqual(retarget(0x1d00ffff, 0, timespan * 2, timespan,
+                                  limit), 0x1d00ffff)
+
+
+class TestHeaderValidator(unittest.TestCase):
+    def test_mainnet(self):
+        self.assertEqual(HeaderValidator().validate(GENESIS + BLOCK_1),
+                         (None, None))
+
+    def test_mainnet_bad_pow(self):
+        tampered = BLOCK_1[:76] + b"\x00\x00\x00\x00"
+
+        self.assertEqual(HeaderValidator().validate(GENESIS + tampered),
+                         (ErrorCode.proof_of_work, 1))
+
+    def test_broken_link(self):
+        chain = make_chain(4)
+        chain[2] = mine(b"\xff" * 32, 3000)
+
+        self.assertEqual(regtest_validator().validate(b"".join(chain)),
+                         (ErrorCode.previous_block_invalid, 2))
+
+    def test_hash_above_target(self):
+        chain = make_chain(3)
+        chain.append(mine(header_hash(chain[-1]), 5000, valid=False))
+
+        self.assertEqual(regtest_validator().validate(b"".join(chain)),
+                         (ErrorCode.proof_of_work, 3))
+
+    def test_timestamp_too_early(self):
+        times = [1000 + height * 600 for height in range(13)]
+        times[12] = times[6]
+
+        self.assertEqual(
+            regtest_validator().validate(b"".join(make_chain(13, times))),
+            (ErrorCode.timestamp_too_early, 12))
+
+    def test_unexpected_bits(self):
+        bits = [EASY_BITS] * 5
+        bits[3] = 0x2000ffff
+
+        self.assertEqual(
+            regtest_validator().validate(b"".join(make_chain(5, bits=bits))),
+            (ErrorCode.incorrect_proof_of_work, 3))
+
+    def test_retarget(self):
+        # Blocks came twice as fast as they should have.
+        validator = HeaderValidator(
+            pow_limit=REGTEST_POW_LIMIT, retarget_interval=4,
+            target_timespan=4 * 600)
+        times = [1000 + height * 300 for height in range(6)]
+        harder = target_to_bits(bits_to_target(EASY_BITS) * 900 // 2400)
+        good = make_chain(6, times, [EASY_BITS] * 4 + [harder] * 2)
+        bad = make_chain(6, times)
+
+        self.assertEqual(validator.validate(b"".join(good)), (None, None))
+        self.assertEqual(validator.validate(b"".join(bad)),
+                         (ErrorCode.incorrect_proof_of_work, 4))
+
+    def test_range_on_top_of_earlier_headers(self):
+        chain = make_chain(20)
+        earlier = MagicMock()
+        earlier.header.side_effect = lambda height: chain[height]
+
+        self.assertEqual(
+            regtest_validator().validate(b"".join(chain[15:]), 15, earlier),
+            (None, None))
+        self.assertEqual(
+            regtest_validator().validate(b"".join(chain[16:]), 15, earlier),
+            (ErrorCode.previous_block_invalid, 15))
+
+    def test_processes(self):
+        chain = make_chain(30)
+        chain.append(mine(header_hash(chain[-1]), 30000, valid=False))
+        validator = regtest_validator(processes=2, chunk_size=7)
+
+        self.assertEqual(validator.validate(b"".join(chain)),
+                         (ErrorCode.proof_of_work, 30))
+
+
+class TestHeaderStoreValidation(asynctest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = HeaderStore(os.path.join(self.directory, "headers"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_validate_store(self):
+        for raw in make_chain(10):
+            self.store.append(raw)
+
+        self.assertEqual(regtest_validator().validate_store(self.store, 4),
+                         (None, None))
+
+    def test_sync_rejects_invalid_headers(self):
+        chain = make_chain(5)
+        chain.append(mine(header_hash(chain[-1]), 9000, valid=False))
+        client = MagicMock()
+        client.last_height = CoroutineMock(return_value=(None, 5))
+        client.block_header = CoroutineMock(
+            side_effect=lambda height, use_store: (
+                None, bitcoin.core.CBlockHeader.deserialize(chain[height])))
+
+        error_code = self.loop.run_until_complete(self.store.sync(
+            client, batch_size=3, validator=regtest_validator()))
+
+        self.assertEqual(error_code, ErrorCode.proof_of_work)
+        self.assertEqual(self.store.height, 2)
+
+    def test_follow_ignores_invalid_tips(self):
+        chain = make_chain(3)
+        for raw in chain:
+            self.store.append(raw)
+        invalid = mine(header_hash(chain[-1]), 9000, valid=False)
+        valid = mine(header_hash(chain[-1]), 9000)
+        queue = asyncio.Queue()
+        for raw in (invalid, valid):
+            queue.put_nowait((0, 3, MagicMock(**{
+                "get_header.return_value":
+                    bitcoin.core.CBlockHeader.deserialize(raw)})))
+
+        async def follow():
+            task = asyncio.ensure_future(self.store.follow(
+                MagicMock(), queue, validator=regtest_validator()))
+            while not queue.empty():
+                await asyncio.sleep(0)
+            task.cancel()
+        self.loop.run_until_complete(follow())
+
+        self.assertEqual(self.store.height, 3)
+        self.assertEqual(self.store.header(3), valid)
@@ -0,0 +1,130 @@
+import asynctest
+from asynctest import CoroutineMock, MagicMock
+import bitcoin.base58
+import bitcoin.core
+from bitcoin.core.script import CScript, OP_DUP, OP_HASH160, \
+    OP_EQUALVERIFY, OP_CHECKSIG
+
+from pylibbitcoin.error_code import ErrorCode
+from pylibbitcoin.wallet import WalletState
+
+HASH160 = b"\x11" * 20
+ADDRESS = bitcoin.base58.encode(b"\x00" + HASH160 + b"\x00" * 4)
+OTHER = b"\x22" * 20
+
+
+def p2pkh(hash160):
+    return CScript([OP_DUP, OP_HASH160, hash160, OP_EQUALVERIFY, OP_CHECKSIG])
+
+
+def pay(outputs, spends=()):
+    inputs = [
+        bitcoin.core.CTxIn(bitcoin.core.COutPoint(hash_, index))
+        for hash_, index in spends
+    ] or [bitcoin.core.CTxIn()]
+    return bitcoin.core.CTransaction(
+        inputs,
+        [bitcoin.core.CTxOut(value, p2pkh(hash160))
+         for value, hash160 in outputs])
+
+
+def history():
+    return [
+        {
+            "received": {"hash": b"\x01" * 32, "height": 100, "index": 0},
+            "value": 1000,
+        },
+        {
+            "received": {"hash": b"\x02" * 32, "height": 101, "index": 1},
+            "value": 500,
+            "spent": {"hash": b"\x03" * 32, "height": 102, "index": 0},
+        },
+    ]
+
+
+class TestWalletState(asynctest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.history3 = CoroutineMock(return_value=(None, history()))
+        self.wallet = WalletState()
+        self.loop.run_until_complete(self.wallet.load(self.client, [ADDRESS]))
+
+    def test_load(self):
+        self.assertEqual(self.wallet.balance(), 1000)
+        self.assertEqual(self.wallet.balance(ADDRESS), 1000)
+        self.assertEqual(len(self.wallet.unspent(ADDRESS)), 1)
+
+    def test_load_failure(self):
+        self.client.history3 = CoroutineMock(
+            return_value=(ErrorCode.not_found, None))
+
+        failures = self.loop.run_until_complete(
+            WalletState().load(self.client, [ADDRESS]))
+
+        self.assertEqual(failures, {ADDRESS: ErrorCode.not_found})
+
+    def test_receive_spend_and_confirm(self):
+        receive = pay([(300, HASH160), (5, OTHER)])
+        self.assertTrue(self.wallet.apply_transaction(receive.serialize()))
+        self.assertEqual(self.wallet.balance(), 1300)
+
+        spend = pay([(900, OTHER)], spends=[(b"\x01" * 32, 0)])
+        self.wallet.apply_transaction(spend.serialize())
+        self.assertEqual(self.wallet.balance(), 300)
+
+        block = bitcoin.core.CBlock(vtx=[receive, spend])
+        self.wallet.apply_block(110, block.serialize())
+        self.assertEqual(self.wallet.balance(), 300)
+        [unspent] = self.wallet.unspent()
+        self.assertEqual(unspent["received"]["height"], 110)
+
+    def test_unrelated_transaction(self):
+        transaction = pay([(5, OTHER)])
+
+        self.assertFalse(
+            self.wallet.apply_transaction(transaction.serialize()))
+        self.assertEqual(self.wallet.balance(), 1000)
+
+    def test_reorg(self):
+        receive = pay([(300, HASH160)])
+        spend = pay([(900, OTHER)], spends=[(b"\x01" * 32, 0)])
+        self.wallet.apply_block(
+            110, bitcoin.core.CBlock(vtx=[receive, spend]).serialize())
+        self.assertEqual(self.wallet.balance(), 300)
+
+        self.wallet.apply_block(110, bitcoin.core.CBlock(vtx=[]).serialize())
+
+        self.assertEqual(self.wallet.balance(), 1000)
+        self.assertEqual(self.wallet.height, 110)
+
+    def test_notification(self):
+        receive = pay([(300, HASH160)])
+        self.client.mempool_transaction = CoroutineMock(
+            return_value=(None, receive))
+
+        error_code = self.loop.run_until_complete(
+            self.wallet.apply_notification(
+                self.client, (1, 0, receive.GetTxid())))
+
+        self.assertIsNone(error_code)
+        self.assertEqual(self.wallet.balance(), 1300)
+        self.client.mempool_transaction.assert_called_once_with(
+            receive.GetTxid()[::-1].hex())
+
+    def test_reconcile(self):
+        self.assertEqual(
+            self.loop.run_until_complete(self.wallet.reconcile(self.client)),
+            {})
+
+        drifted_history = history()[:1] + [{
+            "received": {"hash": b"\x04" * 32, "height": 105, "index": 0},
+            "value": 50,
+        }]
+        self.client.history3 = CoroutineMock(
+            return_value=(None, drifted_history))
+
+        drifted = self.loop.run_until_complete(
+            self.wallet.reconcile(self.client))
+
+        self.assertEqual(drifted, {ADDRESS: (1000, 1050)})
+        self.assertEqual(self.wallet.balance(), 1050)
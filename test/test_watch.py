@@ -0,0 +1,182 @@
+import asyncio
+import unittest
+
+import asynctest
+import bitcoin.base58
+import bitcoin.core
+from bitcoin.core.script import CScript, OP_DUP, OP_HASH160, \
+    OP_EQUALVERIFY, OP_CHECKSIG, OP_EQUAL
+
+from pylibbitcoin.scan import parse_transaction
+from pylibbitcoin.watch import BloomFilter, WatchSet, script_hash160
+
+WATCHED = b"\x11" * 20
+OTHER = b"\x22" * 20
+
+
+def p2pkh(hash160):
+    return CScript([OP_DUP, OP_HASH160, hash160, OP_EQUALVERIFY, OP_CHECKSIG])
+
+
+def p2sh(hash160):
+    return CScript([OP_HASH160, hash160, OP_EQUAL])
+
+
+def p2wpkh(hash160):
+    return CScript([0, hash160])
+
+
+def pay(outputs, spends=()):
+    inputs = [
+        bitcoin.core.CTxIn(bitcoin.core.COutPoint(hash_, index))
+        for hash_, index in spends
+    ] or [bitcoin.core.CTxIn()]
+    return bitcoin.core.CTransaction(
+        inputs,
+        [bitcoin.core.CTxOut(value, script) for value, script in outputs])
+
+
+class TestScriptHash160(unittest.TestCase):
+    def test_standard_scripts(self):
+        for script in (p2pkh(WATCHED), p2sh(WATCHED), p2wpkh(WATCHED)):
+            self.assertEqual(script_hash160(script), WATCHED)
+
+    def test_other_scripts(self):
+        self.assertIsNone(script_hash160(CScript([b"\x11" * 33, 0xac])))
+        self.assertIsNone(script_hash160(b""))
+
+
+class TestParseTransaction(unittest.TestCase):
+    def test_points(self):
+        transaction = pay(
+            [(5, p2pkh(WATCHED)), (6, p2sh(OTHER))],
+            spends=[(b"\x01" * 32, 3)])
+
+        end, txid, spent, outputs = \
+            parse_transaction(transaction.serialize())
+
+        self.assertEqual(end, len(transaction.serialize()))
+        self.assertEqual(txid, transaction.GetTxid())
+        self.assertEqual(spent, [(b"\x01" * 32, 3)])
+        self.assertEqual(
+            [(value, bytes(script)) for value, script in outputs],
+            [(5, p2pkh(WATCHED)), (6, p2sh(OTHER))])
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_membership(self):
+        bloom = BloomFilter(1 << 16)
+        bloom.add(WATCHED)
+
+        self.assertIn(WATCHED, bloom)
+        self.assertNotIn(OTHER, bloom)
+
+
+class TestWatchSet(unittest.TestCase):
+    def test_add_address(self):
+        watch_set = WatchSet()
+        address = bitcoin.base58.encode(b"\x00" + WATCHED + b"\x00" * 4)
+        watch_set.add(address)
+
+        self.assertIn(address, watch_set)
+        self.assertTrue(watch_set.is_watched(WATCHED))
+        self.assertFalse(watch_set.is_watched(OTHER))
+
+    def test_receive_then_spend(self):
+        watch_set = WatchSet()
+        watch_set.add_hash160(WATCHED)
+        receive = pay([(5, p2pkh(OTHER)), (7, p2wpkh(WATCHED))])
+        spend = pay([(6, p2pkh(OTHER))], spends=[(receive.GetTxid(), 1)])
+
+        _, events = watch_set.scan_transaction(receive.serialize())
+        self.assertEqual(
+            events, [("receive", WATCHED, receive.GetTxid(), 1, 7)])
+
+        _, events = watch_set.scan_transaction(spend.serialize())
+        self.assertEqual(events, [(
+            "spend", WATCHED, (receive.GetTxid(), 1), spend.GetTxid(), 0)])
+
+    def test_watched_outpoint(self):
+        watch_set = WatchSet()
+        watch_set.watch_outpoint(b"\x01" * 32, 0)
+        spend = pay([(6, p2pkh(OTHER))], spends=[(b"\x01" * 32, 0)])
+
+        _, events = watch_set.scan_transaction(spend.serialize())
+        self.assertEqual(events[0][0], "spend")
+
+    def test_scan_block(self):
+        watch_set = WatchSet()
+        watch_set.add_hash160(WATCHED)
+        transactions = [
+            pay([(50, p2pkh(OTHER))]),
+            pay([(1, p2sh(WATCHED))], spends=[(b"\x03" * 32, 0)]),
+            pay([(2, p2pkh(WATCHED))], spends=[(b"\x04" * 32, 0)]),
+        ]
+        block = bitcoin.core.CBlock(vtx=transactions)
+
+        events = watch_set.scan_block(block.serialize())
+
+        self.assertEqual([event[4] for event in events], [1, 2])
+
+    def test_confirmation_is_not_reported_again(self):
+        watch_set = WatchSet()
+        watch_set.add_hash160(WATCHED)
+        receive = pay([(7, p2pkh(WATCHED))])
+        spend = pay([(6, p2pkh(OTHER))], spends=[(receive.GetTxid(), 0)])
+
+        for transaction in (receive, spend):
+            _, events = watch_set.scan_transaction(transaction.serialize())
+            self.assertEqual(len(events), 1)
+
+        block = bitcoin.core.CBlock(vtx=[receive, spend])
+        self.assertEqual(watch_set.scan_block(block.serialize()), [])
+        self.assertEqual(watch_set._outpoints, {})
+
+    def test_conflicting_spend_is_reported(self):
+        watch_set = WatchSet()
+        watch_set.watch_outpoint(b"\x01" * 32, 0, WATCHED)
+        spend = pay([(6, p2pkh(OTHER))], spends=[(b"\x01" * 32, 0)])
+        conflict = pay([(5, p2pkh(OTHER))], spends=[(b"\x01" * 32, 0)])
+
+        _, events = watch_set.scan_transaction(spend.serialize())
+        self.assertEqual(events[0][3], spend.GetTxid())
+
+        block = bitcoin.core.CBlock(vtx=[conflict])
+        events = watch_set.scan_block(block.serialize())
+        self.assertEqual(events, [(
+            "spend", WATCHED, (b"\x01" * 32, 0), conflict.GetTxid(), 0)])
+
+    def test_external_contains(self):
+        bloom = BloomFilter(1 << 16)
+        external = {WATCHED}
+        watch_set = WatchSet(prefilter=bloom, contains=external.__contains__)
+        watch_set.add_hash160(WATCHED)
+
+        self.assertEqual(len(watch_set), 0)
+        self.assertTrue(watch_set.is_watched(WATCHED))
+
+    def test_prefilter(self):
+        bloom = BloomFilter(1 << 16)
+        watch_set = WatchSet(prefilter=bloom)
+        watch_set.add_hash160(WATCHED)
+
+        self.assertIn(WATCHED, bloom)
+        self.assertTrue(watch_set.is_watched(WATCHED))
+        self.assertFalse(watch_set.is_watched(OTHER))
+
+
+class TestMatchStreams(asynctest.TestCase):
+    def test_match_blocks(self):
+        watch_set = WatchSet()
+        watch_set.add_hash160(WATCHED)
+        block = bitcoin.core.CBlock(vtx=[pay([(1, p2pkh(WATCHED))])])
+        queue = asyncio.Queue()
+        queue.put_nowait((0, 100, block.serialize()))
+
+        async def first():
+            async for height, event in watch_set.match_blocks(queue):
+                return height, event
+
+        height, event = self.loop.run_until_complete(first())
+        self.assertEqual(height, 100)
+        self.assertEqual(event[0], "receive")